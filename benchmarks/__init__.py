@@ -0,0 +1,6 @@
+"""Load tests and micro-benchmarks for the Bob web application.
+
+Run ``python -m benchmarks.run`` from the project root to drive the real
+routes with a deterministic fake agent and compare against the stored
+baseline.
+"""
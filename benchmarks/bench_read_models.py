@@ -0,0 +1,130 @@
+"""Compare ORM instances and read models when rendering a long conversation.
+
+Usage::
+
+    python -m benchmarks.bench_read_models --messages 5000 --repeat 5
+
+A conversation with ``--messages`` messages is seeded into a temporary SQLite
+database.  It is then loaded and rendered through ``partials/message_item.html``
+in two ways: as ORM instances loaded with ``selectinload``, the way
+``get_conversation`` used to load them, and as the view tuples that
+:func:`bob.conversations.middleware.get_conversation` returns.  For each way
+the best wall and CPU time over ``--repeat`` runs is reported, along with the
+peak memory of one run measured with :mod:`tracemalloc`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from bob.conversations.middleware import get_conversation
+from bob.models import Base, Conversation, Message, User
+from bob.shared import templates
+from bob.token_expander import expand_many
+
+PAGE = templates.env.from_string(
+    "{% for msg in messages %}{% include 'partials/message_item.html' %}{% endfor %}"
+)
+
+
+async def seed(session_factory, messages: int) -> tuple[User, int]:
+    start = datetime(2025, 1, 1)
+    async with session_factory() as session:
+        user = User(name="Bench", username="bench", password="bench")
+        session.add(user)
+        await session.flush()
+        conv = Conversation(title="Long", user_id=user.id, created_at=start, message_count=messages)
+        session.add(conv)
+        await session.flush()
+        session.add_all(
+            Message(
+                conversation_id=conv.id,
+                sender="user" if m % 2 == 0 else "bob",
+                # one message in ten carries a component
+                text=f"Message {m} " + ("[[component:emoji name=thumbs_up]]" if m % 10 == 0 else "lorem ipsum " * 8),
+                created_at=start + timedelta(seconds=m),
+            )
+            for m in range(messages)
+        )
+        await session.commit()
+        return user, conv.id
+
+
+async def orm_conversation(session: AsyncSession, user: User, conv_id: int):
+    """The former ORM read path."""
+    result = await session.execute(
+        select(Conversation)
+        .options(selectinload(Conversation.messages))
+        .where(Conversation.id == conv_id, Conversation.user_id == user.id)
+    )
+    conv = result.scalars().first()
+    rendered = await expand_many([msg.text for msg in conv.messages])
+    for msg, html in zip(conv.messages, rendered):
+        msg.html = html
+    return conv
+
+
+async def measure(session_factory, load: Callable[..., Awaitable], user: User, conv_id: int, repeat: int) -> Dict:
+    async def once() -> int:
+        async with session_factory() as session:
+            conv = await load(session, user, conv_id)
+            return len(PAGE.render(messages=conv.messages))
+
+    wall, cpu = [], []
+    for _ in range(repeat):
+        w, c = time.perf_counter(), time.process_time()
+        size = await once()
+        wall.append(time.perf_counter() - w)
+        cpu.append(time.process_time() - c)
+    tracemalloc.start()
+    await once()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"wall_ms": min(wall) * 1000, "cpu_ms": min(cpu) * 1000, "peak_mb": peak / 2**20, "html_bytes": size}
+
+
+async def run(messages: int, repeat: int) -> Dict[str, Dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        user, conv_id = await seed(session_factory, messages)
+        try:
+            return {
+                "orm": await measure(session_factory, orm_conversation, user, conv_id, repeat),
+                "views": await measure(session_factory, get_conversation, user, conv_id, repeat),
+            }
+        finally:
+            await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.messages, args.repeat))
+    print(f"{'path':<6} {'wall ms':>9} {'cpu ms':>9} {'peak MB':>9}")
+    for name, r in results.items():
+        print(f"{name:<6} {r['wall_ms']:>9.1f} {r['cpu_ms']:>9.1f} {r['peak_mb']:>9.2f}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"messages": args.messages, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
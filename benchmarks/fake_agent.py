@@ -0,0 +1,44 @@
+"""Deterministic streaming agent used for load testing."""
+
+from __future__ import annotations
+
+import asyncio
+from itertools import cycle, islice
+from typing import AsyncIterable
+
+from bob.agents import BaseAgent
+from bob.settings import settings
+
+WORDS = (
+    "Bob", "helps", "you", "learn", "by", "breaking", "topics", "into", "small",
+    "steps", "and", "checking", "your", "understanding", "along", "the", "way.",
+)
+
+
+class FakeAgent(BaseAgent):
+    """Stream a fixed reply with configurable latency and token rate.
+
+    Configured under ``[agents.ID]`` with
+    ``agent_type = "benchmarks.fake_agent:FakeAgent"``:
+
+    ``fake_latency``
+        Seconds to wait before the first token (default ``0.05``).
+    ``fake_token_rate``
+        Tokens emitted per second; ``0`` streams as fast as possible
+        (default ``100``).
+    ``fake_tokens``
+        Number of tokens in each reply (default ``64``).
+    """
+
+    def __init__(self, agent_name: str) -> None:
+        self._agent_name = agent_name
+        self.latency = float(settings.get_agent_param(agent_name, "fake_latency", 0.05))
+        self.token_rate = float(settings.get_agent_param(agent_name, "fake_token_rate", 100))
+        self.tokens = int(settings.get_agent_param(agent_name, "fake_tokens", 64))
+
+    async def stream(self, messages: list[dict[str, str]]) -> AsyncIterable[str]:
+        await asyncio.sleep(self.latency)
+        interval = 1.0 / self.token_rate if self.token_rate > 0 else 0.0
+        for word in islice(cycle(WORDS), self.tokens):
+            yield word + " "
+            await asyncio.sleep(interval)
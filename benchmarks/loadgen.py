@@ -0,0 +1,141 @@
+"""Asyncio load generator driving the chat routes like a browser would."""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import httpx
+
+from bobbing.bench import percentile
+
+CONV_RE = re.compile(r'id="conv-(\d+)"')
+STREAM_RE = re.compile(r"startStream\((\d+), (\d+),")
+
+
+@dataclass
+class RouteStats:
+    """Latency samples (seconds) and error count for a single route."""
+
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+
+@dataclass
+class LoadResult:
+    """Aggregated outcome of a load run."""
+
+    duration: float
+    routes: Dict[str, RouteStats]
+    turns: int = 0
+
+
+def summarize(result: LoadResult) -> Dict[str, Dict[str, float]]:
+    """Return throughput and p50/p95/p99 latency in milliseconds per route."""
+    summary: Dict[str, Dict[str, float]] = {}
+    for route, stats in sorted(result.routes.items()):
+        summary[route] = {
+            "requests": len(stats.latencies),
+            "errors": stats.errors,
+            "rps": round(len(stats.latencies) / result.duration, 2),
+            "p50_ms": round(percentile(stats.latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(stats.latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(stats.latencies, 99) * 1000, 2),
+        }
+    summary["chat_turns"] = {"turns": result.turns, "rps": round(result.turns / result.duration, 2)}
+    return summary
+
+
+class _VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, agent: str, routes: Dict[str, RouteStats]) -> None:
+        self.client = client
+        self.agent = agent
+        self.routes = routes
+        self.conv_id = 0
+
+    async def _timed(self, route: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.routes[route].errors += 1
+            return None
+        if resp.status_code >= 400:
+            self.routes[route].errors += 1
+            return None
+        self.routes[route].latencies.append(time.perf_counter() - start)
+        return resp
+
+    async def login(self, username: str, password: str) -> None:
+        await self.client.post("/login", data={"username": username, "password": password})
+        resp = await self._timed("/", "GET", "/")
+        match = CONV_RE.search(resp.text) if resp is not None else None
+        if not match:
+            raise RuntimeError(f"No seeded conversation visible for {username}")
+        self.conv_id = int(match.group(1))
+
+    async def _stream(self, url: str) -> None:
+        start = time.perf_counter()
+        first = None
+        try:
+            async with self.client.stream("GET", url) as resp:
+                async for line in resp.aiter_lines():
+                    if first is None and line.startswith("data:"):
+                        first = time.perf_counter() - start
+                    if line == "data: [DONE]":
+                        break
+        except httpx.HTTPError:
+            self.routes["/{conv_id}/stream"].errors += 1
+            return
+        self.routes["/{conv_id}/stream"].latencies.append(time.perf_counter() - start)
+        if first is not None:
+            self.routes["/{conv_id}/stream (first event)"].latencies.append(first)
+
+    async def turn(self, index: int) -> bool:
+        await self._timed("/", "GET", "/")
+        await self._timed("/{conv_id}", "GET", f"/{self.conv_id}")
+        resp = await self._timed(
+            "/{conv_id}/message",
+            "POST",
+            f"/{self.conv_id}/message",
+            data={"agent": self.agent, "text": f"Question {index}"},
+        )
+        match = STREAM_RE.search(resp.text) if resp is not None else None
+        if match:
+            await self._stream(f"/{self.conv_id}/stream?user_msg_id={match.group(2)}&agent={self.agent}")
+        await self._timed("/search", "GET", "/search", params={"q": "Topic"})
+        return match is not None
+
+
+async def run_load(
+    base_url: str,
+    credentials: List[tuple[str, str]],
+    duration: float,
+    agent: str = "fake",
+) -> LoadResult:
+    """Run one virtual user per credential pair for ``duration`` seconds."""
+
+    routes: Dict[str, RouteStats] = defaultdict(RouteStats)
+    turns = 0
+    deadline = 0.0
+
+    async def worker(username: str, password: str) -> None:
+        nonlocal turns
+        timeout = httpx.Timeout(60.0)
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            user = _VirtualUser(client, agent, routes)
+            await user.login(username, password)
+            index = 0
+            while time.perf_counter() < deadline:
+                if await user.turn(index):
+                    turns += 1
+                index += 1
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(worker(u, p) for u, p in credentials))
+    return LoadResult(duration=time.perf_counter() - start, routes=dict(routes), turns=turns)
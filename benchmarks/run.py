@@ -0,0 +1,162 @@
+"""Start Bob with a fake agent, drive it with concurrent users and report.
+
+Usage::
+
+    python -m benchmarks.run --users 20 --duration 20
+    python -m benchmarks.run --update-baseline
+
+The server runs in a subprocess against a freshly seeded SQLite database in a
+temporary directory.  Results are compared to ``benchmarks/baseline.json``;
+a route whose p95 latency grows, or whose throughput drops, by more than the
+tolerance counts as a regression and makes the command exit with status 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+CONFIG_TEMPLATE = """\
+[global]
+database_url = "sqlite+aiosqlite:///{db_path}"
+host = "127.0.0.1"
+port = {port}
+
+[agents.fake]
+agent_type = "benchmarks.fake_agent:FakeAgent"
+home_selector = "Fake"
+fake_latency = {latency}
+fake_token_rate = {token_rate}
+fake_tokens = {tokens}
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Benchmark server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/login", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Benchmark server did not become ready")
+
+
+def compare(summary: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Return human readable regressions of ``summary`` against ``baseline``."""
+    regressions: List[str] = []
+    for route, base in baseline.items():
+        current = summary.get(route)
+        if current is None:
+            continue
+        if "p95_ms" in base and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{route}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if base.get("rps") and current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{route}: {current['rps']} req/s < baseline {base['rps']} req/s")
+    return regressions
+
+
+def _print_summary(summary: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'route':<32} {'reqs':>6} {'err':>4} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for route, row in summary.items():
+        if "p50_ms" not in row:
+            continue
+        print(
+            f"{route:<32} {row['requests']:>6} {row['errors']:>4} {row['rps']:>8} "
+            f"{row['p50_ms']:>7}ms {row['p95_ms']:>7}ms {row['p99_ms']:>7}ms"
+        )
+    turns = summary["chat_turns"]
+    print(f"chat turns: {turns['turns']} ({turns['rps']} turns/s)")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bob load test")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load")
+    parser.add_argument("--conversations", type=int, default=5, help="seeded conversations per user")
+    parser.add_argument("--messages", type=int, default=40, help="seeded messages per conversation")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake agent first-token latency")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="fake agent tokens per second")
+    parser.add_argument("--tokens", type=int, default=40, help="tokens per fake reply")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--update-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--output", type=Path, help="write the JSON summary to this file")
+    args = parser.parse_args(argv)
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory(prefix="bob-bench-") as tmp:
+        db_path = Path(tmp) / "bench.db"
+        config = Path(tmp) / "bob-config.toml"
+        config.write_text(
+            CONFIG_TEMPLATE.format(
+                db_path=db_path.as_posix(),
+                port=port,
+                latency=args.latency,
+                token_rate=args.token_rate,
+                tokens=args.tokens,
+            )
+        )
+        env = dict(os.environ, bob_config_path=str(config))
+        os.environ["bob_config_path"] = str(config)
+
+        from .loadgen import run_load, summarize
+        from .seed import PASSWORD, seed, username
+
+        asyncio.run(seed(f"sqlite+aiosqlite:///{db_path.as_posix()}", args.users, args.conversations, args.messages))
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.server", "--port", str(port)],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(base_url, proc)
+            credentials = [(username(i), PASSWORD) for i in range(args.users)]
+            result = asyncio.run(run_load(base_url, credentials, args.duration))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    summary = summarize(result)
+    _print_summary(summary)
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2) + "\n")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(summary, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if args.baseline.is_file():
+        regressions = compare(summary, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""Populate a benchmark database with users, conversations and messages."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from bob.db import Base
+from bob.models import Conversation, Message, User
+
+#: Password shared by all seeded users
+PASSWORD = "bench"
+
+
+def username(index: int) -> str:
+    return f"bench{index}"
+
+
+async def seed(database_url: str, users: int, conversations: int, messages: int) -> None:
+    """Create ``users`` accounts each owning ``conversations`` with ``messages``.
+
+    The data is deterministic so runs against the same parameters are
+    comparable.
+    """
+
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    start = datetime(2025, 1, 1)
+    async with session_factory() as session:
+        for u in range(users):
+            user = User(name=f"Bench {u}", username=username(u), password=PASSWORD)
+            session.add(user)
+            await session.flush()
+            for c in range(conversations):
+                created = start + timedelta(hours=c)
+                conv = Conversation(title=f"Topic {c} of {username(u)}", user_id=user.id, created_at=created)
+                session.add(conv)
+                await session.flush()
+                session.add_all(
+                    Message(
+                        conversation_id=conv.id,
+                        sender="user" if m % 2 == 0 else "bob",
+                        text=f"Message {m} about topic {c} [[component:emoji name=thumbs_up]]",
+                        created_at=created + timedelta(seconds=m),
+                    )
+                    for m in range(messages)
+                )
+        await session.commit()
+    await engine.dispose()
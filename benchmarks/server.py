@@ -0,0 +1,27 @@
+"""Run ``bob.web:app`` for benchmarking.
+
+The benchmark runner starts this module in a subprocess with
+``bob_config_path`` pointing at a generated configuration whose agent uses
+``agent_type = "benchmarks.fake_agent:FakeAgent"``.
+"""
+
+from __future__ import annotations
+
+import argparse
+
+import uvicorn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    from bob.web import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,22 @@
 # Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
 
-"""Console entry point for running the Bob web application."""
+"""Console entry point for running the Bob web application.
 
-import uvicorn
+``server_mode = "production"`` in ``[global]`` starts the pre-fork
+multi-worker server from :mod:`bob.server`; otherwise a single uvicorn
+process is used.
+"""
 
+from .log import configure_logging
+from .server import serve
 from .settings import settings
 from .web import app
 
+
+def main() -> None:
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_DEBUG_SAMPLE_RATE)
+    serve(app, settings)
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host=settings.HOST, port=settings.PORT)
+    main()
@@ -4,25 +4,49 @@ from __future__ import annotations
 
 Agents are configured in ``bob-config.toml`` under ``[agents.ID]`` sections.
 Each section may specify ``agent_type`` to override the class name.  If the
-field is omitted, the section ID itself is used as the type name.  When present,
+field is omitted, the section ID itself is used as the type name.  An
+``agent_type`` of the form ``"package.module:ClassName"`` imports the class
+directly, which allows agents to live outside this package.  When present,
 ``home_selector`` provides the label for the frontend agent picker.
+The ``fanout`` type combines other configured agents, see :class:`FanoutAgent`.
 """
 
+import asyncio
+import importlib
+import logging
 from abc import ABC, abstractmethod
-from typing import AsyncIterable, Dict, List, Tuple, Type
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple, Type
 
 from . import llm
+from .metrics import FANOUT_WINS, RETRIEVAL_TIME
 from .settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 class BaseAgent(ABC):
-    """Shared interface for all agents."""
+    """Shared interface for all agents.
+
+    Work that does not depend on the model's output, such as retrieval, can
+    be done in :meth:`prepare`; the application runs it as soon as the user
+    message is saved, before the browser opens the stream, and then calls
+    :meth:`stream_prepared` with the result.
+    """
 
     @abstractmethod
     async def stream(self, messages: list[dict[str, str]]) -> AsyncIterable[str]:
         """Stream response tokens for the given messages."""
         raise NotImplementedError
 
+    async def prepare(self, messages: list[dict[str, str]]) -> list[dict[str, str]]:
+        """Return the messages to send to the model for ``messages``."""
+        return messages
+
+    async def stream_prepared(self, messages: list[dict[str, str]]) -> AsyncIterable[str]:
+        """Stream response tokens for messages returned by :meth:`prepare`."""
+        async for token in self.stream(messages):
+            yield token
+
 
 class DefaultAgent(BaseAgent):
     """Default agent using the raw LLM provider."""
@@ -38,18 +62,32 @@ class BobAgent(BaseAgent):
     def __init__(self, agent_name: str) -> None:
         self._agent_name = agent_name
         self._vector_db = settings.get_vector_db(agent_name)
+        self._embedder = settings.get_embedder(agent_name)
 
-    async def stream(self, messages: list[dict[str, str]]) -> AsyncIterable[str]:
+    async def prepare(self, messages: list[dict[str, str]]) -> list[dict[str, str]]:
+        """Append retrieved context for the last message."""
         prompt = messages[-1]["content"] if messages else ""
         context = ""
         if self._vector_db:
-            docs = self._vector_db.similarity_search(prompt, k=3)
+            with RETRIEVAL_TIME.time(self._agent_name):
+                # Chroma queries block; keep them off the event loop
+                if self._embedder is not None:
+                    vector = await self._embedder.embed(prompt)
+                    docs = await asyncio.to_thread(self._vector_db.similarity_search_by_vector, vector, k=3)
+                else:
+                    docs = await asyncio.to_thread(self._vector_db.similarity_search, prompt, k=3)
             context = "\n".join(d.page_content for d in docs)
-            #print(f"Context retrieved: {context}")
         composed = messages.copy()
         if context:
             composed.append({"role": "system", "content": context})
-        async for token in llm.stream_tokens(composed, self._agent_name):
+        return composed
+
+    async def stream_prepared(self, messages: list[dict[str, str]]) -> AsyncIterable[str]:
+        async for token in llm.stream_tokens(messages, self._agent_name):
+            yield token
+
+    async def stream(self, messages: list[dict[str, str]]) -> AsyncIterable[str]:
+        async for token in self.stream_prepared(await self.prepare(messages)):
             yield token
 
 
@@ -60,6 +98,161 @@ class TutorAgent(BobAgent):
         super().__init__(agent_name)
 
 
+class FanoutAgent(BaseAgent):
+    """Composite agent that runs several configured agents concurrently.
+
+    ``branches`` lists the IDs of the agents to run and ``strategy`` decides
+    which answer is streamed:
+
+    ``race``
+        The first branch to produce a token wins and is streamed live; the
+        other branches are cancelled.
+    ``first``
+        The first branch to finish its whole reply wins.  Slower to the
+        first token than ``race``, but a branch that fails halfway never
+        reaches the user.
+    ``judge``
+        All branches run to completion and the ``judge`` agent merges their
+        answers into the reply that is streamed.
+
+    ``branch_timeout`` is the number of seconds a branch may take to its
+    first token (``race``) or to its complete reply (``first``, ``judge``).
+    Branches that fail or time out are dropped; the reply fails only when
+    every branch does.  :func:`load_agents` rejects branch and judge IDs
+    that are not configured agents.
+    """
+
+    STRATEGIES = ("race", "first", "judge")
+
+    JUDGE_PROMPT = (
+        "Several assistants answered the last user message independently. "
+        "Combine them into the single best answer to the user. Keep what is "
+        "correct and useful, resolve contradictions and do not mention the "
+        "assistants."
+    )
+
+    def __init__(self, agent_name: str) -> None:
+        config = settings.get_agent_config(agent_name)
+        self._agent_name = agent_name
+        self.branches = [str(b).lower() for b in config.get("branches", ())]
+        self.strategy = str(config.get("strategy", "race")).lower()
+        self.branch_timeout = float(config.get("branch_timeout", 30))
+        judge = config.get("judge")
+        self.judge = str(judge).lower() if judge else None
+
+        if not self.branches:
+            raise ValueError(f"Fanout agent '{agent_name}' needs at least one branch")
+        if self.strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown fanout strategy '{self.strategy}' for agent '{agent_name}'")
+        if self.strategy == "judge" and not self.judge:
+            raise ValueError(f"Fanout agent '{agent_name}' uses strategy 'judge' without a judge")
+        if agent_name.lower() in self.branches or agent_name.lower() == self.judge:
+            raise ValueError(f"Fanout agent '{agent_name}' cannot include itself")
+
+    async def stream(self, messages: list[dict[str, str]]) -> AsyncIterable[str]:
+        if self.strategy == "race":
+            replies = self._race(messages)
+        elif self.strategy == "first":
+            replies = self._first(messages)
+        else:
+            replies = self._merge(messages)
+        async for token in replies:
+            yield token
+
+    async def _race(self, messages: list[dict[str, str]]) -> AsyncIterator[str]:
+        # branch agents are looked up per reply so config reloads apply
+        streams = {name: get_agent(name).stream(messages).__aiter__() for name in self.branches}
+        winner = None
+        try:
+            winner, first = await self._first_success(
+                {name: asyncio.wait_for(s.__anext__(), self.branch_timeout) for name, s in streams.items()}
+            )
+        finally:
+            for name, branch in streams.items():
+                if name != winner:
+                    await _aclose(branch)
+        try:
+            yield first
+            async for token in streams[winner]:
+                yield token
+        finally:
+            await _aclose(streams[winner])
+
+    async def _first(self, messages: list[dict[str, str]]) -> AsyncIterator[str]:
+        _, reply = await self._first_success(
+            {name: asyncio.wait_for(self._complete(name, messages), self.branch_timeout) for name in self.branches}
+        )
+        yield reply
+
+    async def _merge(self, messages: list[dict[str, str]]) -> AsyncIterator[str]:
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self._complete(name, messages), self.branch_timeout) for name in self.branches),
+            return_exceptions=True,
+        )
+        answers = []
+        for name, result in zip(self.branches, results):
+            if isinstance(result, BaseException):
+                self._log_failure(name, result)
+            else:
+                answers.append(result)
+        if not answers:
+            raise RuntimeError(f"All branches of fanout agent '{self._agent_name}' failed")
+        if len(answers) == 1:
+            yield answers[0]
+            return
+
+        candidates = "\n\n".join(f"Answer {i}:\n{text}" for i, text in enumerate(answers, 1))
+        prompt = messages + [{"role": "system", "content": f"{self.JUDGE_PROMPT}\n\n{candidates}"}]
+        FANOUT_WINS.inc(self._agent_name, self.judge)
+        async for token in get_agent(self.judge).stream(prompt):
+            yield token
+
+    async def _complete(self, name: str, messages: list[dict[str, str]]) -> str:
+        reply = "".join([token async for token in get_agent(name).stream(messages)])
+        if not reply:
+            raise ValueError("empty reply")
+        return reply
+
+    async def _first_success(self, branches: Dict[str, Any]) -> Tuple[str, Any]:
+        """Await the ``branches`` awaitables and return the first success.
+
+        Failed branches are logged and skipped; the rest are cancelled as
+        soon as one succeeds.
+        """
+
+        tasks = {asyncio.ensure_future(aw): name for name, aw in branches.items()}
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks.pop(task)
+                    exc = task.exception()
+                    if exc is None:
+                        FANOUT_WINS.inc(self._agent_name, name)
+                        return name, task.result()
+                    self._log_failure(name, exc)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        raise RuntimeError(f"All branches of fanout agent '{self._agent_name}' failed")
+
+    def _log_failure(self, branch: str, exc: BaseException) -> None:
+        if isinstance(exc, asyncio.TimeoutError):
+            reason = f"no answer within {self.branch_timeout:g}s"
+        elif isinstance(exc, StopAsyncIteration):
+            reason = "empty reply"
+        else:
+            reason = repr(exc)
+        logger.warning("Branch %s of fanout agent %s dropped: %s", branch, self._agent_name, reason)
+
+
+async def _aclose(stream: Any) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
 # ---------------------------------------------------------------------------
 # Dynamic agent registry
 # ---------------------------------------------------------------------------
@@ -87,9 +280,13 @@ def _instantiate_agent(agent_id: str) -> BaseAgent:
     name.  If omitted, the agent ID itself is used as the type name.
     """
 
-    agent_type = settings.get_agent_param(agent_id, "agent_type", agent_id)
-    agent_type = str(agent_type).lower()
-    cls = _AGENT_TYPES.get(agent_type)
+    agent_type = settings.get_agent_config(agent_id).agent_type
+    if ":" in agent_type:
+        module_name, _, attr = agent_type.partition(":")
+        cls = getattr(importlib.import_module(module_name), attr, None)
+    else:
+        agent_type = agent_type.lower()
+        cls = _AGENT_TYPES.get(agent_type)
     if not cls:
         raise ValueError(f"Unknown agent_type '{agent_type}' for agent '{agent_id}'")
 
@@ -100,18 +297,84 @@ def _instantiate_agent(agent_id: str) -> BaseAgent:
         return cls()
 
 
+def _find_fanout_cycle(instances: Dict[str, BaseAgent]) -> Optional[List[str]]:
+    """Return a path of fanout agents that leads back to its start, if any."""
+
+    def children(agent_id: str) -> List[str]:
+        agent = instances[agent_id]
+        if not isinstance(agent, FanoutAgent):
+            return []
+        return agent.branches + ([agent.judge] if agent.judge else [])
+
+    done: set[str] = set()
+    path: List[str] = []
+
+    def visit(agent_id: str) -> Optional[List[str]]:
+        if agent_id in path:
+            return path[path.index(agent_id) :] + [agent_id]
+        if agent_id in done:
+            return None
+        path.append(agent_id)
+        for child in children(agent_id):
+            cycle = visit(child)
+            if cycle:
+                return cycle
+        path.pop()
+        done.add(agent_id)
+        return None
+
+    for agent_id in instances:
+        cycle = visit(agent_id)
+        if cycle:
+            return cycle
+    return None
+
+
 def load_agents() -> None:
-    """Parse ``[agents.*]`` sections and instantiate all agents."""
+    """Parse ``[agents.*]`` sections and instantiate all agents.
 
-    _AGENT_INSTANCES.clear()  # ensure single instantiation per reload
-    _SELECTOR_CHOICES.clear()
+    The new registry is built aside and swapped in with a single rebinding,
+    so lookups never observe a half-loaded registry and streams holding an
+    agent from the previous registry keep running.  If any agent fails to
+    instantiate the current registry is left untouched.
+    """
+
+    global _AGENT_INSTANCES, _SELECTOR_CHOICES
 
+    instances: Dict[str, BaseAgent] = {}
+    choices: List[Tuple[str, str]] = []
     for agent_id in settings.get_agent_names():
-        instance = _instantiate_agent(agent_id)
-        _AGENT_INSTANCES[agent_id] = instance
-        label = settings.get_agent_param(agent_id, "home_selector")
+        instances[agent_id] = _instantiate_agent(agent_id)
+        label = settings.get_agent_config(agent_id).home_selector
         if label is not None:
-            _SELECTOR_CHOICES.append((agent_id, str(label)))
+            choices.append((agent_id, label))
+    for agent_id, agent in instances.items():
+        if isinstance(agent, FanoutAgent):
+            unknown = [name for name in agent.branches + [agent.judge] if name and name not in instances]
+            if unknown:
+                raise ValueError(f"Fanout agent '{agent_id}' refers to unknown agents: {', '.join(unknown)}")
+    cycle = _find_fanout_cycle(instances)
+    if cycle:
+        raise ValueError(f"Fanout agents form a cycle: {' -> '.join(cycle)}")
+    _AGENT_INSTANCES, _SELECTOR_CHOICES = instances, choices
+
+
+async def watch_config(interval: float) -> None:
+    """Reload settings and agents whenever the configuration file changes.
+
+    Polls the file's modification time every ``interval`` seconds; intended to
+    run as a background task for the lifetime of the application.
+    """
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # load_agents validates the new settings; on failure both the
+            # settings and the agent registry keep their previous state
+            if settings.reload_if_changed(validate=load_agents):
+                logger.info("Configuration reloaded with %d agents", len(_AGENT_INSTANCES))
+        except Exception:
+            logger.exception("Configuration reload failed, keeping previous agents")
 
 
 def get_agent(name: str) -> BaseAgent:
@@ -138,5 +401,6 @@ def get_selector_choices() -> List[Tuple[str, str]]:
 register_agent_type("default", DefaultAgent)
 register_agent_type("bob", BobAgent)
 register_agent_type("tutor", TutorAgent)
+register_agent_type("fanout", FanoutAgent)
 
 load_agents()
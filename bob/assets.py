@@ -0,0 +1,198 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Static asset pipeline.
+
+``bobbing assets build`` copies every file below ``static/`` into
+``static/dist/`` under a content-hashed name, writes ``.gz`` (and ``.br`` when
+the optional ``brotli`` package is installed) variants of compressible files,
+combines the emoji SVGs into one sprite of ``<symbol>`` elements, and records
+the mapping in ``static/dist/manifest.json``.
+
+Templates call :func:`asset_url` to reference the hashed name.  Without a
+manifest the original path is returned, so a checkout that never ran the
+build keeps working.  :class:`AssetStaticFiles` serves the precompressed
+variants by content negotiation and marks hashed files as immutable.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:  # optional dependency
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path("static")
+DIST_NAME = "dist"
+MANIFEST_NAME = "manifest.json"
+#: Logical name of the combined emoji sprite
+EMOJI_SPRITE = "emoji/sprite.svg"
+
+COMPRESSIBLE = {".js", ".css", ".svg", ".json", ".html", ".txt", ".map"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_ID_RE = re.compile(r'\bid="([^"]+)"')
+_REF_RE = re.compile(r'(url\(#|href="#)([^)"]+)')
+_SVG_RE = re.compile(r"<svg\b([^>]*)>(.*)</svg>", re.S)
+_ATTR_RE = re.compile(r'([\w:-]+)="([^"]*)"')
+
+
+def _hashed_name(rel: str, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    path = Path(rel)
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix())
+
+
+def _write_variants(target: Path, data: bytes) -> None:
+    if target.suffix not in COMPRESSIBLE:
+        return
+    # mtime=0 keeps the output byte-identical between builds
+    target.with_name(target.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        target.with_name(target.name + ".br").write_bytes(brotli.compress(data))
+
+
+def build_sprite(emoji_dir: Path) -> bytes:
+    """Combine ``emoji_dir/*.svg`` into one SVG of ``<symbol id="emoji-NAME">``.
+
+    IDs inside each emoji are prefixed with its name so gradients and clip
+    paths of different emoji cannot collide in the shared document.
+    """
+
+    symbols = []
+    for path in sorted(emoji_dir.glob("*.svg")):
+        if path.name == Path(EMOJI_SPRITE).name:
+            continue
+        name = path.stem
+        match = _SVG_RE.search(path.read_text())
+        if not match:
+            logger.warning("Skipping %s: no <svg> element", path)
+            continue
+        attrs = dict(_ATTR_RE.findall(match.group(1)))
+        view_box = attrs.get("viewBox") or f"0 0 {attrs.get('width', '24')} {attrs.get('height', '24')}"
+        body = _ID_RE.sub(lambda m: f'id="{name}-{m.group(1)}"', match.group(2))
+        body = _REF_RE.sub(lambda m: f"{m.group(1)}{name}-{m.group(2)}", body)
+        symbols.append(f'<symbol id="emoji-{name}" viewBox="{view_box}">{body.strip()}</symbol>')
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">'
+        + "".join(symbols)
+        + "</svg>"
+    ).encode()
+
+
+def build_assets(src: Path = STATIC_DIR, dest: Optional[Path] = None) -> Dict[str, str]:
+    """Build hashed and precompressed copies of ``src`` into ``dest``.
+
+    Returns the manifest mapping logical paths (relative to ``src``) to
+    hashed paths (relative to ``dest``).  ``dest`` is recreated from scratch.
+    """
+
+    src = Path(src)
+    dest = Path(dest) if dest is not None else src / DIST_NAME
+    if dest.exists():
+        shutil.rmtree(dest)
+    dest.mkdir(parents=True)
+
+    files: Dict[str, bytes] = {}
+    for path in sorted(src.rglob("*")):
+        if not path.is_file() or dest in path.parents or path.name.startswith("."):
+            continue
+        files[path.relative_to(src).as_posix()] = path.read_bytes()
+    if (src / "emoji").is_dir():
+        files[EMOJI_SPRITE] = build_sprite(src / "emoji")
+
+    manifest: Dict[str, str] = {}
+    for rel, data in files.items():
+        hashed = _hashed_name(rel, data)
+        target = dest / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        _write_variants(target, data)
+        manifest[rel] = hashed
+    (dest / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+class AssetManifest:
+    """Lookup of hashed asset names, read once from ``manifest.json``."""
+
+    def __init__(self, static_dir: Path = STATIC_DIR, url_prefix: str = "/static") -> None:
+        self.static_dir = Path(static_dir)
+        self.url_prefix = url_prefix
+        self._entries: Optional[Dict[str, str]] = None
+
+    def load(self) -> Dict[str, str]:
+        path = self.static_dir / DIST_NAME / MANIFEST_NAME
+        try:
+            self._entries = json.loads(path.read_text())
+        except FileNotFoundError:
+            self._entries = {}
+        except ValueError:
+            logger.warning("Ignoring unreadable asset manifest %s", path)
+            self._entries = {}
+        return self._entries
+
+    def url(self, rel: str) -> str:
+        """Return the public URL of ``rel``, hashed when the build has run."""
+        entries = self._entries if self._entries is not None else self.load()
+        hashed = entries.get(rel)
+        if hashed:
+            return f"{self.url_prefix}/{DIST_NAME}/{hashed}"
+        return f"{self.url_prefix}/{rel}"
+
+
+manifest = AssetManifest()
+
+
+def asset_url(rel: str) -> str:
+    """Template helper returning the cache-busting URL for ``rel``."""
+    return manifest.url(rel)
+
+
+class AssetStaticFiles(StaticFiles):
+    """``StaticFiles`` that serves precompressed variants and immutable headers.
+
+    A request for ``app.3f2a9c.js`` with ``Accept-Encoding: br`` is answered
+    from ``app.3f2a9c.js.br`` when that file exists.  Files below ``dist/``
+    carry a content hash in their name and are cached for a year.
+    """
+
+    encodings = (("br", ".br"), ("gzip", ".gz"))
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+        if path.startswith(DIST_NAME + "/") or path.startswith(DIST_NAME + os.sep):
+            response.headers["Cache-Control"] = IMMUTABLE
+        if Path(path).suffix not in COMPRESSIBLE:
+            return response
+        response.headers["Vary"] = "Accept-Encoding"
+        accepted = Headers(scope=scope).get("accept-encoding", "")
+        for encoding, suffix in self.encodings:
+            if encoding not in accepted:
+                continue
+            variant = response.path + suffix
+            try:
+                stat_result = os.stat(variant)
+            except OSError:
+                continue
+            headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "etag", "last-modified")}
+            headers["Content-Encoding"] = encoding
+            return FileResponse(variant, headers=headers, media_type=response.media_type, stat_result=stat_result)
+        return response
@@ -0,0 +1,436 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Two-level cache: a per-process LRU in front of an optional shared store.
+
+Values live under a namespace and a key.  Each namespace has a version
+number, and :meth:`TieredCache.invalidate` bumps it, which makes every key of
+the namespace stale at once.  With a shared backend (Redis, or
+:class:`LocalBackend` in tests) the version lives in the backend, values are
+written through to it, and invalidations are broadcast over pub/sub, so all
+workers drop their L1 entries.  Without a backend the cache is a plain
+per-process LRU.
+
+Values are stored in a compact binary form (``marshal``, zlib-compressed
+when large), so they must be built from ``str``, ``bytes``, numbers,
+``None``, lists, tuples, sets and dicts.  :meth:`TieredCache.get_or_set`
+computes a missing value once: concurrent callers in the process wait for
+the first one, and a short lock in the backend keeps other workers from
+computing it at the same time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+import marshal
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .metrics import CACHE_HITS, CACHE_L2_HITS, CACHE_MISSES
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+#: Serialized values at least this large are compressed
+COMPRESS_MIN = 1024
+
+_MISSING = object()
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize ``value`` with a one-byte format tag."""
+    body = marshal.dumps(value)
+    if len(body) >= COMPRESS_MIN:
+        packed = zlib.compress(body, 1)
+        if len(packed) < len(body):
+            return b"z" + packed
+    return b"m" + body
+
+
+def loads(data: bytes) -> Any:
+    tag, body = data[:1], data[1:]
+    if tag == b"z":
+        body = zlib.decompress(body)
+    elif tag != b"m":
+        raise ValueError(f"Unknown cache value format {tag!r}")
+    return marshal.loads(body)
+
+
+class LocalBackend:
+    """In-memory stand-in for :class:`RedisBackend`.
+
+    Several :class:`TieredCache` instances sharing one ``LocalBackend``
+    behave like workers sharing a Redis server.
+    """
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._channels: Dict[str, List[asyncio.Queue]] = {}
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, data = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return data
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._live(key)
+
+    async def set(self, key: str, data: bytes, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + ttl if ttl else None, data)
+
+    async def add(self, key: str, data: bytes, ttl: Optional[float] = None) -> bool:
+        if self._live(key) is not None:
+            return False
+        await self.set(key, data, ttl)
+        return True
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        value = int(self._live(key) or 0) + 1
+        self._data[key] = (None, str(value).encode())
+        return value
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        for queue in self._channels.get(channel, []):
+            queue.put_nowait(message)
+
+    async def listen(self, channel: str) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._channels.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._channels[channel].remove(queue)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisBackend:
+    """Shared cache storage and invalidation channel in Redis."""
+
+    def __init__(self, url: str) -> None:
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis.get(key)
+
+    async def set(self, key: str, data: bytes, ttl: Optional[float] = None) -> None:
+        await self.redis.set(key, data, px=int(ttl * 1000) if ttl else None)
+
+    async def add(self, key: str, data: bytes, ttl: Optional[float] = None) -> bool:
+        return bool(await self.redis.set(key, data, px=int(ttl * 1000) if ttl else None, nx=True))
+
+    async def delete(self, *keys: str) -> None:
+        await self.redis.delete(*keys)
+
+    async def incr(self, key: str) -> int:
+        return await self.redis.incr(key)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.redis.publish(channel, message)
+
+    async def listen(self, channel: str) -> AsyncIterator[bytes]:
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def _format_key(key: Hashable) -> str:
+    if isinstance(key, tuple):
+        return ":".join(str(part) for part in key)
+    return str(key)
+
+
+class TieredCache:
+    """LRU of ``maxsize`` entries in front of an optional shared ``backend``."""
+
+    def __init__(
+        self,
+        backend: Any = None,
+        maxsize: int = 4096,
+        ttl: float = 3600.0,
+        prefix: str = "bob:cache",
+        lock_timeout: float = 5.0,
+    ) -> None:
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.channel = f"{prefix}:invalidate"
+        self._origin = uuid.uuid4().hex
+        self._l1: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._last_error = 0.0
+
+    # -- backend access -------------------------------------------------
+
+    async def _l2(self, op: str, *args: Any, default: Any = None) -> Any:
+        """Run a backend operation; failures degrade to L1-only caching."""
+        if self.backend is None:
+            return default
+        try:
+            return await getattr(self.backend, op)(*args)
+        except Exception as exc:
+            now = time.monotonic()
+            if now - self._last_error > 30:
+                self._last_error = now
+                logger.warning("Cache backend %s failed: %r", op, exc)
+            return default
+
+    async def _version(self, namespace: str) -> int:
+        version = self._versions.get(namespace)
+        if version is None:
+            raw = await self._l2("get", f"{self.prefix}:{namespace}:v")
+            version = self._versions[namespace] = int(raw or 0)
+        return version
+
+    async def _key(self, namespace: str, key: Hashable) -> str:
+        version = await self._version(namespace)
+        return f"{self.prefix}:{namespace}:{version}:{_format_key(key)}"
+
+    # -- L1 ---------------------------------------------------------------
+
+    def _l1_get(self, full_key: str) -> Any:
+        entry = self._l1.get(full_key)
+        if entry is None:
+            return _MISSING
+        if entry[0] <= time.monotonic():
+            del self._l1[full_key]
+            return _MISSING
+        self._l1.move_to_end(full_key)
+        return entry[1]
+
+    def _l1_put(self, full_key: str, value: Any, ttl: float) -> None:
+        if self.maxsize <= 0:
+            return
+        self._l1[full_key] = (time.monotonic() + ttl, value)
+        self._l1.move_to_end(full_key)
+        while len(self._l1) > self.maxsize:
+            self._l1.popitem(last=False)
+
+    # -- public API -------------------------------------------------------
+
+    async def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or ``default`` when missing."""
+        value = await self._lookup(namespace, await self._key(namespace, key))
+        return default if value is _MISSING else value
+
+    async def _lookup(self, namespace: str, full_key: str) -> Any:
+        kind = namespace.split(":", 1)[0]
+        value = self._l1_get(full_key)
+        if value is not _MISSING:
+            CACHE_HITS.inc(kind)
+            return value
+        value = await self._l2_get(full_key)
+        if value is not _MISSING:
+            # the L1 copy may outlive the L2 entry by at most one TTL
+            self._l1_put(full_key, value, self.ttl)
+            CACHE_HITS.inc(kind)
+            CACHE_L2_HITS.inc(kind)
+            return value
+        CACHE_MISSES.inc(kind)
+        return _MISSING
+
+    async def _l2_get(self, full_key: str) -> Any:
+        """Read and decode ``full_key`` from the backend.
+
+        An entry that cannot be decoded (written by an incompatible version,
+        or corrupted) is deleted and treated as missing.
+        """
+        data = await self._l2("get", full_key)
+        if data is None:
+            return _MISSING
+        try:
+            return loads(data)
+        except Exception as exc:
+            logger.warning("Dropping undecodable cache entry %s: %r", full_key, exc)
+            await self._l2("delete", full_key)
+            return _MISSING
+
+    async def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store ``value`` for ``ttl`` seconds (default: the cache TTL)."""
+        await self._store(await self._key(namespace, key), value, ttl or self.ttl)
+
+    async def _store(self, full_key: str, value: Any, ttl: float) -> None:
+        data = dumps(value)  # fail early on values the backend cannot hold
+        self._l1_put(full_key, value, ttl)
+        await self._l2("set", full_key, data, ttl)
+
+    async def get_or_set(
+        self,
+        namespace: str,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """Return the cached value or compute it once with ``factory()``."""
+        full_key = await self._key(namespace, key)
+        while True:
+            value = await self._lookup(namespace, full_key)
+            if value is not _MISSING:
+                return value
+            pending = self._inflight.get(full_key)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # the computing request went away; try again ourselves
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume)
+        self._inflight[full_key] = future
+        try:
+            value = await self._compute(full_key, factory, ttl or self.ttl)
+        except BaseException as exc:
+            if isinstance(exc, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(exc)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(full_key, None)
+
+    async def _compute(self, full_key: str, factory: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        lock = f"{full_key}:lock"
+        locked = await self._l2("add", lock, self._origin.encode(), self.lock_timeout, default=True)
+        if not locked:
+            # another worker is computing it; wait for its result
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+                value = await self._l2_get(full_key)
+                if value is not _MISSING:
+                    self._l1_put(full_key, value, ttl)
+                    return value
+        try:
+            value = factory()
+            if inspect.isawaitable(value):
+                value = await value
+            await self._store(full_key, value, ttl)
+            return value
+        finally:
+            if locked:
+                await self._l2("delete", lock)
+
+    async def delete(self, namespace: str, key: Hashable) -> None:
+        """Remove one key in every worker."""
+        full_key = await self._key(namespace, key)
+        self._l1.pop(full_key, None)
+        await self._l2("delete", full_key)
+        await self._broadcast({"key": full_key})
+
+    async def invalidate(self, namespace: str) -> None:
+        """Make every key of ``namespace`` stale in every worker."""
+        if self.backend is None:
+            self._versions[namespace] = await self._version(namespace) + 1
+            return
+        version = await self._l2("incr", f"{self.prefix}:{namespace}:v")
+        if version is None:
+            # backend unreachable: at least stop serving stale local copies
+            self._versions[namespace] = await self._version(namespace) + 1
+        else:
+            self._versions[namespace] = version
+        await self._broadcast({"namespace": namespace})
+
+    async def _broadcast(self, message: Dict[str, str]) -> None:
+        message["origin"] = self._origin
+        await self._l2("publish", self.channel, json.dumps(message).encode())
+
+    def _apply(self, raw: bytes) -> None:
+        message = json.loads(raw)
+        if message.get("origin") == self._origin:
+            return
+        if "namespace" in message:
+            # re-read on next use; entries under the old version age out
+            self._versions.pop(message["namespace"], None)
+        if "key" in message:
+            self._l1.pop(message["key"], None)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for raw in self.backend.listen(self.channel):
+                    self._apply(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Cache invalidation listener failed: %r", exc)
+            # messages may have been missed while disconnected
+            self._versions.clear()
+            await asyncio.sleep(1)
+
+    async def start(self) -> None:
+        """Start receiving invalidations from other workers."""
+        if self.backend is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+            await asyncio.sleep(0)  # subscribe before returning
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self.backend is not None:
+            await self._l2("close")
+
+    def clear_local(self) -> None:
+        self._l1.clear()
+        self._versions.clear()
+
+
+def _consume(future: asyncio.Future) -> None:
+    # nobody may be waiting; don't warn about unretrieved exceptions
+    if not future.cancelled():
+        future.exception()
+
+
+def make_backend(kind: str):
+    """Return the backend for the ``cache_backend`` setting."""
+    kind = (kind or "none").lower()
+    if kind == "redis":
+        return RedisBackend(settings.REDIS_URL)
+    if kind == "local":
+        return LocalBackend()
+    if kind != "none":
+        raise ValueError(f"Unknown cache_backend {kind!r}")
+    return None
+
+
+cache = TieredCache(make_backend(settings.CACHE_BACKEND), settings.CACHE_SIZE, settings.CACHE_TTL)
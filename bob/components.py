@@ -1,36 +1,102 @@
-"""Helper utilities for renderable server-side components."""
+"""Helper utilities for renderable server-side components.
 
+A component is registered with :func:`component` together with the pydantic
+model that validates its token parameters.  Renderers receive an instance of
+that model and return HTML, either directly or from a coroutine for
+components that need I/O.  Components registered with ``ttl`` keep rendered
+results for that many seconds in :mod:`bob.cache`, keyed by their parameters,
+so all workers share them.
+"""
+
+import inspect
 import logging
-from typing import Callable, Dict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Type, Union
+
+from pydantic import BaseModel, Extra, Field
+
+from .cache import cache
 
 logger = logging.getLogger(__name__)
 
-# Registry mapping component names to renderer callables
-COMPONENTS: Dict[str, Callable[..., str]] = {}
+Renderer = Callable[[BaseModel], Union[str, Awaitable[str]]]
+
+
+class NoParams(BaseModel):
+    """Parameters of components that take none."""
+
+    class Config:
+        extra = Extra.forbid
+
+
+@dataclass
+class Component:
+    """A registered renderer and the model validating its parameters."""
+
+    name: str
+    render: Renderer
+    params: Type[BaseModel] = NoParams
+    ttl: float = 0
+
+    async def __call__(self, raw: Dict[str, str]) -> str:
+        """Validate ``raw`` and return the rendered HTML.
+
+        Raises :class:`pydantic.ValidationError` for invalid parameters.
+        """
+        params = self.params(**raw)
+        if self.ttl > 0:
+            key = tuple(sorted(raw.items()))
+            return await cache.get_or_set(f"component:{self.name}", key, lambda: self._render(params), self.ttl)
+        return await self._render(params)
+
+    async def _render(self, params: BaseModel) -> str:
+        html = self.render(params)
+        if inspect.isawaitable(html):
+            html = await html
+        return str(html)
+
+
+# Registry mapping component names to components
+COMPONENTS: Dict[str, Component] = {}
+
+
+def component(
+    name: str, params: Type[BaseModel] = NoParams, ttl: float = 0
+) -> Callable[[Renderer], Renderer]:
+    """Register a component rendering function.
 
-def component(name: str) -> Callable[[Callable[..., str]], Callable[..., str]]:
-    """Register a component rendering function."""
+    ``params`` is the model built from the token parameters and passed to
+    the renderer.  With ``ttl`` > 0 results are cached for ``ttl`` seconds.
+    """
 
-    def decorator(func: Callable[..., str]) -> Callable[..., str]:
-        COMPONENTS[name] = func
+    def decorator(func: Renderer) -> Renderer:
+        COMPONENTS[name] = Component(name, func, params, ttl)
         logger.debug("Registered component %s", name)
         return func
 
     return decorator
 
 
-from pydantic import BaseModel, Field
+from .assets import asset_url
+from .settings import settings
 
 class EmojiParams(BaseModel):
-    name: str = Field(pattern=r"^[a-z0-9_]+$")
+    name: str = Field(regex=r"^[a-z0-9_]+$")
     size: int = Field(24, ge=8, le=256)
 
 
-@component("emoji")
+@component("emoji", params=EmojiParams)
 def emoji_component(params: EmojiParams) -> str:
-    """Render an emoji SVG tag."""
+    """Render an emoji as an image or as a reference into the emoji sprite."""
+    if settings.EMOJI_MODE == "sprite":
+        # the sprite is fetched once per page by bob-client.js
+        return (
+            f'<svg width="{params.size}" height="{params.size}" role="img" '
+            f'aria-label=":{params.name}:" class="inline-block align-middle">'
+            f'<use href="#emoji-{params.name}"></use></svg>'
+        )
     return (
-        f'<img src="/static/emoji/{params.name}.svg" '
+        f'<img src="{asset_url(f"emoji/{params.name}.svg")}" '
         f'alt=":{params.name}:" '
         f'width="{params.size}" height="{params.size}" '
         'class="inline-block align-middle"/>'
@@ -0,0 +1,198 @@
+"""Archival tier for idle conversations.
+
+Archiving moves the messages of a conversation into one compressed JSON blob
+in ``conversation_archives`` and marks the conversation row, which stays in
+place as a stub, with ``archived_at``.  The hot ``messages`` table then only
+holds conversations that are in use.  :func:`restore_conversation` reverses
+the move; the conversation views call it transparently when an archived
+conversation is opened.
+
+Blobs are compressed with zstd when the optional ``zstandard`` package is
+installed and with zlib otherwise.  The codec is stored per row.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.future import select
+
+from ..db import SessionLocal
+from ..models import Conversation, ConversationArchive, Message
+
+try:  # optional dependency
+    import zstandard
+except ImportError:  # pragma: no cover - optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    """Return ``(codec, blob)`` using the best available codec."""
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Archive was written with zstd; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    raise ValueError(f"Unknown archive codec {codec!r}")
+
+
+def encode_messages(messages) -> bytes:
+    return json.dumps(
+        [
+            {
+                "id": m.id,
+                "sender": m.sender,
+                "text": m.text,
+                "created_at": m.created_at.isoformat(),
+                "interrupted": bool(m.interrupted),
+                "reply_to_id": m.reply_to_id,
+            }
+            for m in messages
+        ],
+        separators=(",", ":"),
+    ).encode()
+
+
+def decode_messages(data: bytes) -> List[dict]:
+    rows = json.loads(data)
+    for row in rows:
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+        row.setdefault("interrupted", False)
+        row.setdefault("reply_to_id", None)
+    return rows
+
+
+async def archive_conversation(db: AsyncSession, conv_id: int) -> int:
+    """Move the messages of ``conv_id`` into an archive blob.
+
+    Returns the number of archived messages, or ``-1`` if the conversation
+    is missing or already archived.  Commits on success.
+    """
+
+    conv = await db.get(Conversation, conv_id)
+    if conv is None or conv.archived_at is not None:
+        return -1
+    result = await db.execute(
+        select(
+            Message.id, Message.sender, Message.text, Message.created_at, Message.interrupted, Message.reply_to_id
+        )
+        .where(Message.conversation_id == conv_id)
+        .order_by(Message.created_at, Message.id)
+    )
+    messages = result.all()
+    codec, blob = compress(encode_messages(messages))
+    now = datetime.utcnow()
+    await db.execute(
+        insert(ConversationArchive).values(
+            conversation_id=conv_id, codec=codec, payload=blob, message_count=len(messages), archived_at=now
+        )
+    )
+    if messages:
+        # messages posted since the select above stay in the hot table
+        await db.execute(
+            delete(Message).where(Message.conversation_id == conv_id, Message.id <= max(m.id for m in messages))
+        )
+    await db.execute(update(Conversation).where(Conversation.id == conv_id).values(archived_at=now))
+    await db.commit()
+    return len(messages)
+
+
+async def restore_conversation(db: AsyncSession, conv_id: int) -> int:
+    """Move archived messages of ``conv_id`` back into ``messages``.
+
+    Messages keep their original IDs; the ``messages`` table never hands
+    an ID out twice, so they cannot clash with messages posted since the
+    conversation was archived.  Returns the number of restored
+    messages, ``0`` if another request restored the conversation first, or
+    ``-1`` if the conversation has no archive.  Commits on success.
+    """
+
+    archive = await db.get(ConversationArchive, conv_id)
+    if archive is None:
+        return -1
+    rows = decode_messages(decompress(archive.codec, archive.payload))
+    db.expunge(archive)
+    try:
+        if rows:
+            await db.execute(insert(Message), [{**row, "conversation_id": conv_id} for row in rows])
+        await db.execute(delete(ConversationArchive).where(ConversationArchive.conversation_id == conv_id))
+        await db.execute(update(Conversation).where(Conversation.id == conv_id).values(archived_at=None))
+        await db.commit()
+    except IntegrityError:
+        # a concurrent request (another tab, the stream) inserted the rows
+        await db.rollback()
+        if await db.get(ConversationArchive, conv_id) is not None:
+            raise
+        return 0
+    logger.info("Restored archived conversation", extra={"conversation_id": conv_id, "messages": len(rows)})
+    return len(rows)
+
+
+async def archive_idle(db: AsyncSession, older_than_days: float, limit: int | None = None) -> Tuple[int, int]:
+    """Archive conversations without activity for ``older_than_days``.
+
+    Returns ``(conversations, messages)`` archived.  Conversations that
+    another worker archives concurrently are skipped.
+    """
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    query = (
+        select(Conversation.id)
+        .where(
+            Conversation.archived_at.is_(None),
+            func.coalesce(Conversation.last_message_at, Conversation.created_at) < cutoff,
+        )
+        .order_by(Conversation.id)
+    )
+    if limit:
+        query = query.limit(limit)
+    conv_ids = (await db.execute(query)).scalars().all()
+    conversations = messages = 0
+    for conv_id in conv_ids:
+        try:
+            count = await archive_conversation(db, conv_id)
+        except IntegrityError:
+            await db.rollback()
+            continue
+        if count >= 0:
+            conversations += 1
+            messages += count
+    return conversations, messages
+
+
+async def optimize(engine: AsyncEngine) -> None:
+    """Reclaim free pages and refresh planner statistics (SQLite)."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.exec_driver_sql("VACUUM")
+        await conn.exec_driver_sql("ANALYZE")
+
+
+async def archive_periodically(interval: float, older_than_days: float) -> None:
+    """Run :func:`archive_idle` every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with SessionLocal() as session:
+                conversations, messages = await archive_idle(session, older_than_days)
+            if conversations:
+                logger.info("Archived idle conversations", extra={"conversations": conversations, "messages": messages})
+        except Exception:
+            logger.exception("Archiving failed")
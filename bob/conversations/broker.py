@@ -0,0 +1,364 @@
+"""Share one agent reply between any number of SSE subscribers.
+
+A reply is generated once per ``(conv_id, user_msg_id)`` by a producer task
+that appends its events to a reply log.  Subscribers follow the log from any
+position.  The log keeps the last ``buffer_size`` events, so a client that
+reconnects with ``Last-Event-ID`` picks up where it left off.  A client that
+fell further behind gets a ``reset`` event carrying the reply so far.  When
+the last subscriber leaves, the producer keeps going for ``linger`` seconds in
+case the client comes back, and is then cancelled.  Finished replies stay
+readable for ``linger`` seconds as well.
+
+:class:`LocalReplyLog` serves one process.  :class:`RedisReplyLog` keeps the
+log in a Redis stream, so subscribers on every worker share one producer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncGenerator, AsyncIterable, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[int, int]
+
+#: Events that are part of the reply text, as opposed to notices
+_CONTENT_EVENTS = (None, "component")
+_END = "__end__"
+
+
+class ReplyEvent(NamedTuple):
+    seq: int
+    event: Optional[str]
+    data: str
+
+
+class _Log:
+    __slots__ = ("owner", "events", "seq", "snapshot", "done", "subscribers", "changed")
+
+    def __init__(self, owner: int, buffer_size: int) -> None:
+        self.owner = owner
+        self.events: deque[ReplyEvent] = deque(maxlen=buffer_size)
+        self.seq = 0
+        self.snapshot: list[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class LocalReplyLog:
+    """Reply logs held in this process."""
+
+    def __init__(self, buffer_size: int = 256) -> None:
+        self.buffer_size = buffer_size
+        self._logs: Dict[Key, _Log] = {}
+
+    async def create(self, key: Key, owner: int, lease: float) -> bool:
+        """Create the log for ``key``; ``False`` if it already exists."""
+        if key in self._logs:
+            return False
+        self._logs[key] = _Log(owner, self.buffer_size)
+        return True
+
+    async def owner(self, key: Key) -> Optional[int]:
+        log = self._logs.get(key)
+        return log.owner if log else None
+
+    async def append(self, key: Key, seq: int, event: Optional[str], data: str) -> None:
+        log = self._logs[key]
+        log.events.append(ReplyEvent(seq, event, data))
+        log.seq = seq
+        if event in _CONTENT_EVENTS:
+            log.snapshot.append(data)
+        log.notify()
+
+    async def finish(self, key: Key, seq: int, retention: float) -> None:
+        log = self._logs.get(key)
+        if log is None:
+            return
+        log.done = True
+        log.notify()
+        asyncio.get_running_loop().call_later(retention, self._drop, key, log)
+
+    def _drop(self, key: Key, log: _Log) -> None:
+        if self._logs.get(key) is log:
+            del self._logs[key]
+
+    async def follow(self, key: Key, after: int) -> AsyncGenerator[ReplyEvent, None]:
+        """Yield the events after ``after`` until the reply is finished."""
+        while True:
+            log = self._logs.get(key)
+            if log is None:
+                return
+            changed = log.changed
+            if log.events and log.events[0].seq > after + 1:
+                # the events in between were dropped from the buffer
+                after = log.seq
+                yield ReplyEvent(after, "reset", "".join(log.snapshot))
+                continue
+            pending = [e for e in log.events if e.seq > after]
+            for event in pending:
+                after = event.seq
+                yield event
+            if log.done and after >= log.seq:
+                return
+            if not pending:
+                await changed.wait()
+
+    async def join(self, key: Key) -> None:
+        self._logs[key].subscribers += 1
+
+    async def leave(self, key: Key) -> int:
+        """Unregister a subscriber and return how many remain."""
+        log = self._logs.get(key)
+        if log is None:
+            return 0
+        log.subscribers -= 1
+        return log.subscribers
+
+    async def subscribers(self, key: Key) -> int:
+        log = self._logs.get(key)
+        return log.subscribers if log else 0
+
+    async def keepalive(self, key: Key, lease: float) -> None:
+        pass
+
+    async def active(self, conv_id: int) -> Optional[int]:
+        """Return the user message whose reply is being generated in ``conv_id``."""
+        for (conv, msg), log in self._logs.items():
+            if conv == conv_id and not log.done:
+                return msg
+        return None
+
+
+def _decode(fields: Dict[bytes, bytes]) -> ReplyEvent:
+    event = fields.get(b"event")
+    return ReplyEvent(int(fields[b"seq"]), event.decode() if event else None, fields[b"data"].decode())
+
+
+class RedisReplyLog:
+    """Reply logs in Redis, shared by all workers.
+
+    Per reply: a ``meta`` hash (owner, last seq) that expires unless the
+    producer renews its lease, an ``events`` stream trimmed to about
+    ``buffer_size`` entries, the ``text`` so far for resets, and a
+    subscriber count.
+    """
+
+    def __init__(self, url: str, buffer_size: int = 256, prefix: str = "bob:reply", poll: float = 5.0) -> None:
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url)
+        self.buffer_size = buffer_size
+        self.prefix = prefix
+        self.poll = poll
+
+    def _key(self, key: Key, part: str) -> str:
+        return f"{self.prefix}:{key[0]}:{key[1]}:{part}"
+
+    def _active(self, conv_id: int) -> str:
+        return f"{self.prefix}:active:{conv_id}"
+
+    async def create(self, key: Key, owner: int, lease: float) -> bool:
+        if not await self.redis.hsetnx(self._key(key, "meta"), "owner", owner):
+            return False
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(key, "meta"), "seq", 0)
+            pipe.pexpire(self._key(key, "meta"), int(lease * 1000))
+            # leftovers of an earlier run whose lease ran out
+            pipe.delete(self._key(key, "events"), self._key(key, "text"), self._key(key, "subs"))
+            pipe.set(self._active(key[0]), key[1], px=int(lease * 1000))
+            await pipe.execute()
+        return True
+
+    async def owner(self, key: Key) -> Optional[int]:
+        owner = await self.redis.hget(self._key(key, "meta"), "owner")
+        return int(owner) if owner is not None else None
+
+    async def append(self, key: Key, seq: int, event: Optional[str], data: str) -> None:
+        fields = {"seq": seq, "data": data}
+        if event:
+            fields["event"] = event
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(self._key(key, "events"), fields, maxlen=self.buffer_size, approximate=True)
+            if event in _CONTENT_EVENTS:
+                pipe.append(self._key(key, "text"), data)
+            pipe.hset(self._key(key, "meta"), "seq", seq)
+            await pipe.execute()
+
+    async def finish(self, key: Key, seq: int, retention: float) -> None:
+        ttl = max(1, int(retention * 1000))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(self._key(key, "events"), {"seq": seq, "event": _END, "data": ""})
+            pipe.delete(self._active(key[0]))
+            for part in ("meta", "events", "text", "subs"):
+                pipe.pexpire(self._key(key, part), ttl)
+            await pipe.execute()
+
+    async def follow(self, key: Key, after: int) -> AsyncGenerator[ReplyEvent, None]:
+        stream = self._key(key, "events")
+        cursor = None
+        while True:
+            if cursor is None:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.xrange(stream)
+                    pipe.get(self._key(key, "text"))
+                    pipe.hget(self._key(key, "meta"), "seq")
+                    entries, text, seq = await pipe.execute()
+                if seq is None and not entries:
+                    return
+                cursor = entries[-1][0] if entries else b"0-0"
+                events = [_decode(fields) for _, fields in entries]
+                seq = int(seq) if seq is not None else events[-1].seq
+                if (events and events[0].seq > after + 1) or (not events and seq > after):
+                    after = seq
+                    yield ReplyEvent(after, "reset", (text or b"").decode())
+            else:
+                response = await self.redis.xread({stream: cursor}, count=self.buffer_size, block=int(self.poll * 1000))
+                if not response:
+                    if not await self.redis.exists(self._key(key, "meta")):
+                        return  # the producer went away without finishing
+                    continue
+                entries = response[0][1]
+                cursor = entries[-1][0]
+                events = [_decode(fields) for _, fields in entries]
+                if events[0].seq > after + 1:
+                    cursor = None  # trimmed before we read it; start over
+                    continue
+            for event in events:
+                if event.event == _END:
+                    return
+                if event.seq > after:
+                    after = event.seq
+                    yield event
+
+    async def join(self, key: Key) -> None:
+        await self.redis.incr(self._key(key, "subs"))
+
+    async def leave(self, key: Key) -> int:
+        return await self.redis.decr(self._key(key, "subs"))
+
+    async def subscribers(self, key: Key) -> int:
+        return int(await self.redis.get(self._key(key, "subs")) or 0)
+
+    async def keepalive(self, key: Key, lease: float) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in (self._key(key, "meta"), self._key(key, "subs"), self._active(key[0])):
+                pipe.pexpire(name, int(lease * 1000))
+            await pipe.execute()
+
+    async def active(self, conv_id: int) -> Optional[int]:
+        msg = await self.redis.get(self._active(conv_id))
+        return int(msg) if msg is not None else None
+
+
+Source = AsyncIterable[Tuple[Optional[str], str]]
+
+
+class StreamBroker:
+    """Run each reply once and fan its events out to subscribers."""
+
+    def __init__(self, log=None, linger: float = 15.0, lease: float = 30.0, poll: float = 1.0) -> None:
+        self.log = log or LocalReplyLog()
+        self.linger = linger
+        self.lease = lease
+        self.poll = poll
+        self._producers: Dict[Key, asyncio.Task] = {}
+
+    async def subscribe(
+        self,
+        key: Key,
+        user_id: int,
+        start: Callable[[], Awaitable[Optional[Source]]],
+        last_event_id: Optional[int] = None,
+    ) -> AsyncGenerator[ReplyEvent, None]:
+        """Yield the events of the reply for ``key`` after ``last_event_id``.
+
+        If no reply is running, ``await start()`` returns the ``(event,
+        data)`` source to generate it from, or ``None`` for no reply.
+        Replies belonging to another user yield nothing.
+        """
+        if await self.log.create(key, user_id, self.lease):
+            await self.log.join(key)
+            try:
+                source = await start()
+            except BaseException:
+                await self.log.leave(key)
+                await self.log.finish(key, 0, self.linger)
+                raise
+            self._producers[key] = asyncio.ensure_future(self._produce(key, source))
+        elif await self.log.owner(key) != user_id:
+            return
+        else:
+            await self.log.join(key)
+        events = self.log.follow(key, last_event_id or 0)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+            # otherwise the watchdog stops the producer after ``linger``
+            if await self.log.leave(key) <= 0 and key in self._producers and self.linger <= 0:
+                self._producers[key].cancel()
+
+    async def active(self, conv_id: int) -> Optional[int]:
+        """Return the user message whose reply is streaming in ``conv_id``, if any."""
+        return await self.log.active(conv_id)
+
+    async def _produce(self, key: Key, source: Optional[Source]) -> None:
+        seq = 0
+        watchdog = asyncio.ensure_future(self._watch(key, asyncio.current_task()))
+        try:
+            if source is not None:
+                async for event, data in source:
+                    seq += 1
+                    await self.log.append(key, seq, event, data)
+        except Exception:
+            logger.exception("Reply generation failed", extra={"conversation_id": key[0]})
+        finally:
+            watchdog.cancel()
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            await self.log.finish(key, seq, self.linger)
+            self._producers.pop(key, None)
+
+    async def _watch(self, key: Key, task: asyncio.Task) -> None:
+        """Renew the producer lease and stop it once nobody listens anywhere."""
+        idle_since = None
+        while True:
+            await asyncio.sleep(self.poll)
+            await self.log.keepalive(key, self.lease)
+            if await self.log.subscribers(key) > 0:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= self.linger:
+                task.cancel()
+                return
+
+    async def close(self) -> None:
+        """Cancel running replies; what they produced so far is saved."""
+        tasks = list(self._producers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def make_reply_log(kind: str, buffer_size: int):
+    """Return the reply log for the ``stream_broker`` setting."""
+    from ..settings import settings
+
+    kind = (kind or "local").lower()
+    if kind == "redis":
+        return RedisReplyLog(settings.REDIS_URL, buffer_size)
+    if kind != "local":
+        raise ValueError(f"Unknown stream_broker {kind!r}")
+    return LocalReplyLog(buffer_size)
@@ -2,21 +2,39 @@
 
 from __future__ import annotations
 
+import asyncio
+import logging
+from time import perf_counter
 from typing import AsyncGenerator, Iterable
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
+from ..metrics import ACTIVE_STREAMS, STREAM_DURATION, STREAMS_INTERRUPTED, STREAMS_REJECTED
 from ..models import Conversation, Message, User
-from ..token_expander import expand_tokens
+from ..token_expander import StreamingExpander, expand_many, expand_tokens_async
 from ..agents import get_agent
 from ..settings import settings
 from ..db import SessionLocal
+from .archive import restore_conversation
+from .broker import StreamBroker, make_reply_log
+from .prefetch import prefetcher
+from .store import HistoryEntry, add_user_message, load_context, load_reply, save_reply
+from .streaming import StreamLimiter, format_sse, relay
+from .views import CONVERSATION_COLUMNS, MESSAGE_COLUMNS, ConversationView, MessageView
+
+logger = logging.getLogger(__name__)
 
 # Number of recent messages to include as conversation history
 HISTORY_LIMIT = 20
 
+_NOT_PREPARED = object()
+
+stream_limiter = StreamLimiter(settings.MAX_STREAMS_PER_USER)
+stream_broker = StreamBroker(
+    make_reply_log(settings.STREAM_BROKER, settings.STREAM_REPLAY_SIZE), linger=settings.STREAM_LINGER
+)
+
 
 async def get_history(db: AsyncSession, conv_id: int, limit: int = HISTORY_LIMIT) -> list[Message]:
     """Return the last ``limit`` messages for the given conversation in chronological order."""
@@ -29,33 +47,52 @@ async def get_history(db: AsyncSession, conv_id: int, limit: int = HISTORY_LIMIT
     return list(reversed(result.scalars().all()))
 
 
-async def get_conversations(db: AsyncSession, user: User) -> list[Conversation]:
-    """Return a list of conversations for ``user`` with messages expanded."""
+async def get_conversations(db: AsyncSession, user: User) -> list[ConversationView]:
+    """Return the conversations of ``user``, newest first, without messages.
+
+    ``message_count`` and ``last_message_at`` summarize the messages, so the
+    sidebar does not need to load them.
+    """
     result = await db.execute(
-        select(Conversation)
-        .options(selectinload(Conversation.messages))
+        select(*CONVERSATION_COLUMNS)
         .where(Conversation.user_id == user.id)
         .order_by(Conversation.created_at.desc())
     )
-    conversations = result.scalars().all()
-    for conv in conversations:
-        for msg in conv.messages:
-            msg.html = expand_tokens(msg.text)
-    return conversations
+    return [ConversationView(*row) for row in result]
 
 
-async def get_conversation(db: AsyncSession, user: User, conv_id: int) -> Conversation | None:
+async def get_conversation(db: AsyncSession, user: User, conv_id: int) -> ConversationView | None:
     """Return ``conv_id`` if owned by ``user`` with messages expanded."""
     result = await db.execute(
-        select(Conversation)
-        .options(selectinload(Conversation.messages))
-        .where(Conversation.id == conv_id, Conversation.user_id == user.id)
+        select(*CONVERSATION_COLUMNS).where(Conversation.id == conv_id, Conversation.user_id == user.id)
     )
-    conv = result.scalars().first()
-    if conv:
-        for msg in conv.messages:
-            msg.html = expand_tokens(msg.text)
-    return conv
+    row = result.first()
+    if row is None:
+        return None
+    conv = ConversationView(*row)
+    if conv.archived_at is not None:
+        await restore_conversation(db, conv.id)
+        conv = conv._replace(archived_at=None)
+    result = await db.execute(
+        select(*MESSAGE_COLUMNS)
+        .where(Message.conversation_id == conv.id)
+        .order_by(Message.created_at, Message.id)
+    )
+    rows = result.all()
+    rendered = await expand_many([row.text for row in rows])
+    return conv._replace(messages=tuple(MessageView(*row, html) for row, html in zip(rows, rendered)))
+
+
+async def get_latest_conversation(db: AsyncSession, user: User) -> ConversationView | None:
+    """Return the most recently created conversation of ``user``, if any."""
+    result = await db.execute(
+        select(Conversation.id)
+        .where(Conversation.user_id == user.id)
+        .order_by(Conversation.created_at.desc())
+        .limit(1)
+    )
+    conv_id = result.scalar()
+    return await get_conversation(db, user, conv_id) if conv_id is not None else None
 
 
 async def create_conversation(db: AsyncSession, user: User) -> Conversation:
@@ -67,62 +104,167 @@ async def create_conversation(db: AsyncSession, user: User) -> Conversation:
     return conv
 
 
-async def save_user_message(db: AsyncSession, conv_id: int, text: str) -> Message | None:
-    """Persist a user message in ``conv_id`` and return the DB instance."""
-    result = await db.execute(select(Conversation).where(Conversation.id == conv_id))
-    conv = result.scalars().first()
-    if not conv:
+async def save_user_message(db: AsyncSession, user: User, conv_id: int, text: str) -> MessageView | None:
+    """Persist a user message in ``conv_id`` if ``user`` owns the conversation."""
+    user_msg = await add_user_message(db, user.id, conv_id, text)
+    if user_msg is None:
         return None
-    user_msg = Message(conversation_id=conv.id, sender="user", text=text)
-    db.add(user_msg)
-    await db.commit()
-    await db.refresh(user_msg)
-    user_msg.html = expand_tokens(user_msg.text)
-    return user_msg
-
+    return MessageView(
+        user_msg.id, user_msg.sender, user_msg.text, user_msg.created_at, False, await expand_tokens_async(text)
+    )
 
-async def stream_agent_response(
-    db: AsyncSession, conv_id: int, user_msg_id: int, agent_name: str
-) -> AsyncGenerator[str, None]:
-    """Stream the agent response for ``user_msg_id`` and store it."""
-    result = await db.execute(select(Conversation).where(Conversation.id == conv_id))
-    conv = result.scalars().first()
-    result = await db.execute(select(Message).where(Message.id == user_msg_id))
-    user_msg = result.scalars().first()
-    if not conv or not user_msg:
-        yield "data: [DONE]\n\n"
-        return
 
-    history = await get_history(db, conv.id)
+def build_prompt(history: Iterable[HistoryEntry]) -> list[dict[str, str]]:
+    """Return chat messages for ``history`` preceded by the persona prompt."""
     persona = settings.PERSONA_NAME
     messages: list[dict[str, str]] = [{"role": "system", "content": f"You are {persona}, an AI assistant."}]
     for msg in history:
         role = "assistant" if msg.sender == "bob" else "user"
         messages.append({"role": role, "content": msg.text})
+    return messages
+
+
+async def prepare_reply(
+    db: AsyncSession, user_id: int, conv_id: int, user_msg_id: int, agent_name: str
+) -> list[dict[str, str]] | None:
+    """Load the history for ``user_msg_id`` and let the agent prepare it."""
+    history = await load_context(db, user_id, conv_id, user_msg_id, HISTORY_LIMIT)
+    if history is None:
+        return None
+    return await get_agent(agent_name).prepare(build_prompt(history))
+
+
+async def _prepare_detached(user_id: int, conv_id: int, user_msg_id: int, agent_name: str):
+    async with SessionLocal() as session:
+        return await prepare_reply(session, user_id, conv_id, user_msg_id, agent_name)
+
+
+def prefetch_reply(user: User, conv_id: int, user_msg_id: int, agent_name: str) -> None:
+    """Start preparing the reply to ``user_msg_id`` before the stream opens."""
+    prefetcher.start(
+        (conv_id, user_msg_id), user.id, agent_name, _prepare_detached(user.id, conv_id, user_msg_id, agent_name)
+    )
+
+
+async def stream_agent_response(
+    db: AsyncSession,
+    user: User,
+    conv_id: int,
+    user_msg_id: int,
+    agent_name: str,
+    last_event_id: int | None = None,
+) -> AsyncGenerator[str, None]:
+    """Stream the agent response for ``user_msg_id`` as server-sent events.
+
+    The reply is generated once by :data:`stream_broker` and stored when it
+    is done; a second tab or a client reconnecting with ``last_event_id``
+    subscribes to the same generation.  If every subscriber goes away, the
+    upstream agent stream is closed after ``stream_linger`` seconds and
+    whatever was produced so far is stored as an interrupted reply.  A
+    reply that is already stored, for instance when the client comes back
+    after ``stream_linger`` or reaches another worker, is sent as a single
+    ``reset`` event instead of being generated again.
+    """
+
+    async def start():
+        stored = await load_reply(db, user.id, conv_id, user_msg_id)
+        if stored is not None:
+            return _replay(stored)
+        if stream_limiter.full(user.id):
+            return _rejected()
+        messages = _NOT_PREPARED
+        task = prefetcher.take((conv_id, user_msg_id), user.id, agent_name)
+        if task is not None:
+            try:
+                messages = await task
+            except Exception:
+                pass  # logged by the prefetcher; prepare again below
+        if messages is _NOT_PREPARED:
+            # not prefetched, expired, handled by another worker, or failed
+            messages = await prepare_reply(db, user.id, conv_id, user_msg_id, agent_name)
+        if messages is None:
+            return None
+        logger.debug(
+            "Streaming reply", extra={"agent": agent_name, "conversation_id": conv_id, "prefetched": task is not None}
+        )
+        return _generate(user, conv_id, user_msg_id, agent_name, messages)
+
+    ACTIVE_STREAMS.inc()
+    events = stream_broker.subscribe((conv_id, user_msg_id), user.id, start, last_event_id)
+    try:
+        async for event in events:
+            yield format_sse(event.data, event=event.event, event_id=event.seq)
+    finally:
+        await events.aclose()
+        ACTIVE_STREAMS.dec()
+    yield format_sse("[DONE]")
+
+
+async def _replay(text: str) -> AsyncGenerator[tuple[str | None, str], None]:
+    yield "reset", await expand_tokens_async(text)
+
+
+async def _rejected() -> AsyncGenerator[tuple[str | None, str], None]:
+    STREAMS_REJECTED.inc()
+    yield "notice", "Too many replies in progress. Wait for one to finish."
+
+
+async def _generate(
+    user: User, conv_id: int, user_msg_id: int, agent_name: str, messages: list[dict[str, str]]
+) -> AsyncGenerator[tuple[str | None, str], None]:
+    """Yield the ``(event, data)`` pairs of a reply and store it."""
+    with stream_limiter.slot(user.id) as allowed:
+        if not allowed:
+            async for item in _rejected():
+                yield item
+            return
+
+        agent = get_agent(agent_name)
+        parts: list[str] = []
+        finished = False
+        start = perf_counter()
+        tokens = relay(agent.stream_prepared(messages), settings.STREAM_BUFFER_SIZE)
+        # components are sent as separate events once their token is complete
+        expander = StreamingExpander()
+        try:
+            async for chunk in tokens:
+                parts.append(chunk)
+                for item in await expander.feed(chunk):
+                    yield item
+            for item in expander.flush():
+                yield item
+            finished = True
+        finally:
+            await tokens.aclose()
+            STREAM_DURATION.observe(perf_counter() - start, agent_name)
+            if not finished:
+                STREAMS_INTERRUPTED.inc(agent_name)
+                logger.info("Reply interrupted", extra={"conversation_id": conv_id, "chunks": len(parts)})
+                if parts:
+                    _save_detached(conv_id, user_msg_id, "".join(parts))
+
+        await save_reply(conv_id, user_msg_id, "".join(parts))
+
 
-    agent = get_agent(agent_name)
-    print(f"Using agent: {agent_name}")
-    full_text = ""
-    async for chunk in agent.stream(messages):
-        full_text += chunk
-        yield f"data: {chunk}\n\n"
+#: Saves of interrupted replies; referenced until done so they are not collected
+_pending_saves: set[asyncio.Task] = set()
 
-    async with SessionLocal() as new_session:
-        bob_msg = Message(conversation_id=conv.id, sender="bob", text=full_text)
-        new_session.add(bob_msg)
-        await new_session.commit()
 
-    yield "data: [DONE]\n\n"
+def _save_detached(conv_id: int, user_msg_id: int, text: str) -> None:
+    """Store an interrupted reply outside the (cancelled) request task."""
+    task = asyncio.ensure_future(save_reply(conv_id, user_msg_id, text, interrupted=True))
+    _pending_saves.add(task)
+    task.add_done_callback(_pending_saves.discard)
 
 
-async def search_conversations(db: AsyncSession, user: User, query: str) -> list[Conversation]:
+async def search_conversations(db: AsyncSession, user: User, query: str) -> list[ConversationView]:
     """Return conversations for ``user`` whose title matches ``query``."""
     result = await db.execute(
-        select(Conversation)
+        select(*CONVERSATION_COLUMNS)
         .where(Conversation.user_id == user.id, Conversation.title.ilike(f"%{query}%"))
         .order_by(Conversation.created_at.desc())
     )
-    return result.scalars().all()
+    return [ConversationView(*row) for row in result]
 
 
 async def delete_conversation(db: AsyncSession, user: User, conv_id: int) -> bool:
@@ -0,0 +1,92 @@
+"""Background preparation of prompts between the POST and the SSE request.
+
+``send_message`` starts assembling history and running retrieval as soon as
+the user message is stored; ``stream_agent_response`` takes the prepared
+prompt over when the browser opens the stream.  Entries that are never
+claimed are cancelled after ``ttl`` seconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Dict, Optional, Tuple
+
+from ..metrics import CACHE_HITS, CACHE_MISSES
+from ..settings import settings
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[int, int]
+
+
+@dataclass
+class _Entry:
+    user_id: int
+    agent: str
+    task: asyncio.Task
+    timer: asyncio.TimerHandle
+
+
+class PromptPrefetcher:
+    """Pending prompt preparations keyed by ``(conv_id, user_msg_id)``.
+
+    Entries live in the process that handled the POST; with several
+    workers the stream request may land elsewhere and simply prepares the
+    prompt itself.
+    """
+
+    def __init__(self, ttl: float = 30.0) -> None:
+        self.ttl = ttl
+        self._entries: Dict[Key, _Entry] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def start(self, key: Key, user_id: int, agent: str, work: Awaitable) -> None:
+        """Run ``work`` in the background and remember it under ``key``."""
+        if not self.enabled:
+            work.close()  # never awaited
+            return
+        self._discard(key)
+        task = asyncio.ensure_future(work)
+        task.add_done_callback(_log_failure)
+        timer = asyncio.get_running_loop().call_later(self.ttl, self._discard, key)
+        self._entries[key] = _Entry(user_id, agent, task, timer)
+
+    def take(self, key: Key, user_id: int, agent: str) -> Optional[asyncio.Task]:
+        """Claim the preparation for ``key`` if it matches the request."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            CACHE_MISSES.inc("prefetch")
+            return None
+        entry.timer.cancel()
+        if entry.user_id != user_id or entry.agent != agent:
+            entry.task.cancel()
+            CACHE_MISSES.inc("prefetch")
+            return None
+        CACHE_HITS.inc("prefetch")
+        return entry.task
+
+    def _discard(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.timer.cancel()
+            entry.task.cancel()
+
+    def clear(self) -> None:
+        for key in list(self._entries):
+            self._discard(key)
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Prompt preparation failed", exc_info=task.exception())
+
+
+prefetcher = PromptPrefetcher(settings.PREFETCH_TTL)
@@ -1,27 +1,61 @@
 """HTTP routes for conversation management and chat interface."""
 
+import logging
+
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from markupsafe import Markup
+
 from ..models import Conversation, User
 from ..shared import templates, HOME_PANELS, get_db, get_current_user  # get_current_user is now a direct async function
 from ..settings import settings
 from ..agents import get_selector_choices
+from ..fragments import fragments, render_fragment
+from .streaming import format_sse
+from .views import ConversationView
 from .middleware import (
     get_conversations,
     get_conversation,
+    get_latest_conversation,
     create_conversation,
     save_user_message,
+    prefetch_reply,
     stream_agent_response,
+    stream_broker,
     search_conversations,
     delete_conversation,
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+async def _sidebar_html(db: AsyncSession, user: User, active: ConversationView | None) -> Markup:
+    """Return the rendered conversation list for ``user``, cached per version."""
+
+    async def render() -> str:
+        conversations = await get_conversations(db, user)
+        return render_fragment(
+            "partials/conversation_list.html",
+            {"conversations": conversations, "active_conversation": active},
+        )
+
+    return await fragments.get_or_render(user.id, "sidebar", render, active.id if active else None)
+
+
+async def _panels_html() -> Markup:
+    """Return the rendered home panels, which are the same for every user."""
+
+    async def render() -> str:
+        return render_fragment("partials/home_panels.html", {"home_panels": HOME_PANELS})
+
+    return await fragments.get_or_render(None, "home_panels", render)
+
+
 @router.get("/", response_class=HTMLResponse)
 async def list_conversations(
     request: Request,
@@ -29,35 +63,57 @@ async def list_conversations(
 ):
     """Render the home page showing the latest conversation list."""
     user = await get_current_user(request, db)  # Pass db to get_current_user
-    print("[DEBUG] / called")
-    print("[DEBUG] request:", request)
-    print("[DEBUG] db:", db)
-    print("[DEBUG] user:", user)
     if not user:
-        print("[DEBUG] No user, redirecting to /login")
+        logger.debug("No user, redirecting to /login")
         return RedirectResponse("/login")
-    conversations = await get_conversations(db, user)
-    print("[DEBUG] conversations:", conversations)
-    conv = conversations[0] if conversations else None
-    print("[DEBUG] active_conversation:", conv)
+    conv = await get_latest_conversation(db, user)
     messages = conv.messages if conv else []
-    print("[DEBUG] messages:", messages)
+    logger.debug(
+        "Home page",
+        extra={"user_id": user.id, "conversation_id": conv.id if conv else None, "messages": len(messages)},
+    )
     agent_names = get_selector_choices()
     active_agent = request.session.get("agent", agent_names[0][0] if agent_names else "default")
     return templates.TemplateResponse(
         "home.html",
         {
             "request": request,
-            "conversations": conversations,
+            "sidebar_html": await _sidebar_html(db, user, conv),
+            "panels_html": await _panels_html(),
             "active_conversation": conv,
             "messages": messages,
-            "home_panels": HOME_PANELS,
+            # a reply still streaming, e.g. into another tab, to follow here
+            "streaming_msg_id": await stream_broker.active(conv.id) if conv else None,
             "agent_names": agent_names,
             "active_agent": active_agent,
         },
     )
 
 
+@router.get("/search", response_class=HTMLResponse)
+async def search(
+    q: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),  # Inject db session here
+):
+    """Return conversations matching ``q`` rendered as a partial list.
+
+    Declared before ``/{conv_id}`` so the literal path takes precedence.
+    """
+    user = await get_current_user(request, db)  # Pass db to get_current_user
+    if not user:
+        return RedirectResponse("/login")
+    conversations = await search_conversations(db, user, q)
+    return templates.TemplateResponse(
+        "partials/conversation_list.html",
+        {
+            "request": request,
+            "conversations": conversations,
+            "active_conversation": None,
+        },
+    )
+
+
 @router.get("/{conv_id}", response_class=HTMLResponse)
 async def read_conversation(
     conv_id: int,
@@ -68,7 +124,6 @@ async def read_conversation(
     user = await get_current_user(request, db)  # Pass db to get_current_user
     if not user:
         return RedirectResponse("/login")
-    conversations = await get_conversations(db, user)
     conv = await get_conversation(db, user, conv_id)
     messages = conv.messages if conv else []
     agent_names = get_selector_choices()
@@ -77,10 +132,12 @@ async def read_conversation(
         "home.html",
         {
             "request": request,
-            "conversations": conversations,
+            "sidebar_html": await _sidebar_html(db, user, conv),
+            "panels_html": await _panels_html(),
             "active_conversation": conv,
             "messages": messages,
-            "home_panels": HOME_PANELS,
+            # a reply still streaming, e.g. into another tab, to follow here
+            "streaming_msg_id": await stream_broker.active(conv.id) if conv else None,
             "agent_names": agent_names,
             "active_agent": active_agent,
         },
@@ -100,9 +157,10 @@ async def send_message(
     if not user:
         return RedirectResponse("/login")
     request.session["agent"] = agent
-    msg = await save_user_message(db, conv_id, text)
+    msg = await save_user_message(db, user, conv_id, text)
     if not msg:
         return ""
+    prefetch_reply(user, conv_id, msg.id, agent)
     return templates.TemplateResponse(
         "partials/user_message_and_stream.html",
         {"request": {}, "msg": msg, "conv_id": conv_id, "agent": agent},
@@ -121,10 +179,14 @@ async def stream_response(
     user = await get_current_user(request, db)  # Pass db to get_current_user
     if not user:
         async def empty():
-            yield "data: [DONE]\n\n"
+            yield format_sse("[DONE]")
 
         return StreamingResponse(empty(), media_type="text/event-stream")
-    generator = stream_agent_response(db, conv_id, user_msg_id, agent)
+    # sent by EventSource when it reconnects
+    last_event_id = request.headers.get("last-event-id", "")
+    generator = stream_agent_response(
+        db, user, conv_id, user_msg_id, agent, int(last_event_id) if last_event_id.isdigit() else None
+    )
     return StreamingResponse(generator, media_type="text/event-stream")
 
 
@@ -138,33 +200,13 @@ async def new_conversation(
     if not user:
         return RedirectResponse("/login")
     conv = await create_conversation(db, user)
+    await fragments.bump(user.id)
     return templates.TemplateResponse(
         "partials/new_conversation.html",
         {"request": request, "conv": conv},
     )
 
 
-@router.get("/search", response_class=HTMLResponse)
-async def search(
-    q: str,
-    request: Request,
-    db: AsyncSession = Depends(get_db),  # Inject db session here
-):
-    """Return conversations matching ``q`` rendered as a partial list."""
-    user = await get_current_user(request, db)  # Pass db to get_current_user
-    if not user:
-        return RedirectResponse("/login")
-    conversations = await search_conversations(db, user, q)
-    return templates.TemplateResponse(
-        "partials/conversation_list.html",
-        {
-            "request": request,
-            "conversations": conversations,
-            "active_conversation": None,
-        },
-    )
-
-
 @router.post("/{conv_id}/rename", response_class=HTMLResponse)
 async def rename_conversation(
     conv_id: int,
@@ -185,6 +227,7 @@ async def rename_conversation(
     conv.title = title
     await db.commit()
     await db.refresh(conv)
+    await fragments.bump(user.id)
     return templates.TemplateResponse(
         "partials/conversation_item.html",
         {"request": request, "conv": conv, "active_conversation": None},
@@ -204,5 +247,6 @@ async def delete_conversation_route(
     success = await delete_conversation(db, user, conv_id)
     if not success:
         return HTMLResponse(status_code=404, content="")
+    await fragments.bump(user.id)
     # Redirect the user back to the conversation list after deletion
     return RedirectResponse("/", status_code=303)
@@ -0,0 +1,252 @@
+"""Message persistence with as few database round trips as possible.
+
+``add_user_message`` validates ownership and inserts in a single statement,
+``load_context`` fetches the prompt history for a turn in one query, and
+``save_reply`` stores the assistant message either directly or through the
+optional :class:`WriteBehindQueue`, which batches the replies of concurrent
+streams into one transaction.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, literal, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..db import SessionLocal
+from ..models import Conversation, Message
+from .archive import restore_conversation
+
+logger = logging.getLogger(__name__)
+
+
+def _count_messages(conv_id: int, added: int, last: datetime):
+    """Return the update keeping the denormalized conversation stats current."""
+    return (
+        update(Conversation)
+        .where(Conversation.id == conv_id)
+        .values(message_count=Conversation.message_count + added, last_message_at=last)
+    )
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    """A message as needed to build the prompt."""
+
+    id: int
+    sender: str
+    text: str
+
+
+async def add_user_message(db: AsyncSession, user_id: int, conv_id: int, text: str) -> Message | None:
+    """Insert a user message into ``conv_id`` if ``user_id`` owns it.
+
+    The ownership check and the insert are one ``INSERT ... SELECT``; the
+    conversation's message stats are bumped in the same transaction only when
+    a row was inserted.  Returns a detached
+    :class:`Message` populated without re-reading the row, or ``None`` if the
+    conversation does not exist or belongs to another user.
+    """
+
+    now = datetime.utcnow()
+    owned = select(Conversation.id).where(Conversation.id == conv_id, Conversation.user_id == user_id)
+    stmt = insert(Message).from_select(
+        ["conversation_id", "sender", "text", "created_at"],
+        select(
+            literal(conv_id),
+            literal("user"),
+            literal(text),
+            literal(now, Message.created_at.type),
+        ).where(owned.exists()),
+    )
+    result = await db.execute(stmt)
+    if not result.rowcount:
+        await db.rollback()
+        return None
+    await db.execute(_count_messages(conv_id, 1, now))
+    await db.commit()
+    # lastrowid is the new primary key on SQLite, the configured backend
+    return Message(id=result.lastrowid, conversation_id=conv_id, sender="user", text=text, created_at=now)
+
+
+async def load_context(
+    db: AsyncSession, user_id: int, conv_id: int, user_msg_id: int, limit: int
+) -> List[HistoryEntry] | None:
+    """Return up to ``limit`` messages ending with ``user_msg_id``.
+
+    Ownership of the conversation and existence of the user message are
+    verified by the same query.  Returns ``None`` when either check fails.
+    A conversation that was archived after the message was written is
+    restored first so the history is complete.
+    """
+
+    query = (
+        select(Message.id, Message.sender, Message.text, Conversation.archived_at)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(
+            Message.conversation_id == conv_id,
+            Conversation.user_id == user_id,
+            Message.id <= user_msg_id,
+        )
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
+    )
+    result = (await db.execute(query)).all()
+    if result and result[0].archived_at is not None:
+        await restore_conversation(db, conv_id)
+        result = (await db.execute(query)).all()
+    rows = [HistoryEntry(*row[:3]) for row in reversed(result)]
+    if not rows or rows[-1].id != user_msg_id:
+        return None
+    return rows
+
+
+async def load_reply(db: AsyncSession, user_id: int, conv_id: int, user_msg_id: int) -> str | None:
+    """Return the stored reply to ``user_msg_id``, or ``None`` if there is none.
+
+    Replies are found through ``reply_to_id``, so turns whose replies were
+    stored out of order still get their own; replies stored as interrupted
+    count too.
+    """
+
+    result = await db.execute(
+        select(Message.text)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .where(
+            Message.conversation_id == conv_id,
+            Conversation.user_id == user_id,
+            Message.reply_to_id == user_msg_id,
+        )
+        .order_by(Message.id)
+        .limit(1)
+    )
+    return result.scalar()
+
+
+class WriteBehindQueue:
+    """Batch assistant message inserts in a background task.
+
+    Writes are acknowledged as soon as they are queued; they reach the
+    database within ``interval`` seconds or once ``batch_size`` items are
+    waiting.  Items still queued when the process is killed are lost, so
+    the queue is opt-in via ``message_write_behind``.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = 200, interval: float = 0.05) -> None:
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.interval = interval
+        self._messages: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add_message(
+        self,
+        conv_id: int,
+        sender: str,
+        text: str,
+        created_at: datetime | None = None,
+        interrupted: bool = False,
+        reply_to_id: int | None = None,
+    ) -> None:
+        self._messages.append(
+            {
+                "conversation_id": conv_id,
+                "sender": sender,
+                "text": text,
+                "created_at": created_at or datetime.utcnow(),
+                "interrupted": interrupted,
+                "reply_to_id": reply_to_id,
+            }
+        )
+        if len(self._messages) >= self.batch_size:
+            self._wakeup.set()
+
+
+    async def flush(self) -> int:
+        """Write everything queued so far and return the number of items.
+
+        If the write fails the batch is queued again, so the next flush
+        retries it, and the error is re-raised.
+        """
+        messages, self._messages = self._messages, []
+        if not messages:
+            return 0
+        try:
+            async with self._session_factory() as session:
+                async with session.begin():
+                    await session.execute(insert(Message), messages)
+                    stats: Dict[int, Tuple[int, datetime]] = {}
+                    for msg in messages:
+                        count, last = stats.get(msg["conversation_id"], (0, msg["created_at"]))
+                        stats[msg["conversation_id"]] = (count + 1, max(last, msg["created_at"]))
+                    for conv_id, (count, last) in stats.items():
+                        await session.execute(_count_messages(conv_id, count, last))
+        except Exception:
+            logger.exception("Write-behind flush failed", extra={"messages": len(messages)})
+            # put the failed batch back in front of newer items
+            self._messages = messages + self._messages
+            raise
+        return len(messages)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                pass  # already logged; keep the writer alive
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write any remaining items."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+#: Shared writer, started by the application lifespan when enabled
+write_behind = WriteBehindQueue()
+
+
+async def save_reply(conv_id: int, reply_to_id: int, text: str, interrupted: bool = False) -> None:
+    """Persist an assistant reply to message ``reply_to_id`` of ``conv_id``."""
+    if write_behind.running:
+        write_behind.add_message(conv_id, "bob", text, interrupted=interrupted, reply_to_id=reply_to_id)
+        return
+    now = datetime.utcnow()
+    async with SessionLocal() as session:
+        await session.execute(
+            insert(Message).values(
+                conversation_id=conv_id,
+                sender="bob",
+                text=text,
+                created_at=now,
+                interrupted=interrupted,
+                reply_to_id=reply_to_id,
+            )
+        )
+        await session.execute(_count_messages(conv_id, 1, now))
+        await session.commit()
@@ -0,0 +1,98 @@
+"""Server-sent event helpers for agent replies.
+
+:func:`relay` decouples the model stream from its consumer with a bounded
+queue: a slow consumer fills the queue and pauses the producer instead of
+letting tokens pile up in memory, and closing the relay cancels the producer,
+which closes the upstream provider stream.  :class:`StreamLimiter` caps the
+number of replies a user can stream at the same time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import AsyncGenerator, AsyncIterable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+def format_sse(data: str, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Frame ``data`` as one SSE event; embedded newlines become data lines."""
+    lines = [f"event: {event}"] if event else []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+class _Failed:
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+async def _produce(source: AsyncIterable[str], queue: "asyncio.Queue[object]") -> None:
+    try:
+        async for chunk in source:
+            await queue.put(chunk)
+    except Exception as exc:
+        await queue.put(_Failed(exc))
+    else:
+        await queue.put(_END)
+    finally:
+        # closes the provider stream when we are cancelled mid-reply
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def relay(source: AsyncIterable[str], maxsize: int) -> AsyncGenerator[str, None]:
+    """Yield the chunks of ``source`` through a queue of ``maxsize`` chunks.
+
+    Errors raised by ``source`` are re-raised here.  Closing or cancelling
+    the returned generator cancels the producer task.
+    """
+
+    queue: "asyncio.Queue[object]" = asyncio.Queue(maxsize)
+    producer = asyncio.ensure_future(_produce(source, queue))
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _END:
+                return
+            if isinstance(chunk, _Failed):
+                raise chunk.exc
+            yield chunk
+    finally:
+        producer.cancel()
+
+
+class StreamLimiter:
+    """Per-user count of replies currently streaming in this process."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._active: Dict[int, int] = defaultdict(int)
+
+    def active(self, user_id: int) -> int:
+        return self._active.get(user_id, 0)
+
+    def full(self, user_id: int) -> bool:
+        return self.limit > 0 and self.active(user_id) >= self.limit
+
+    @contextmanager
+    def slot(self, user_id: int) -> Iterator[bool]:
+        """Yield ``True`` and hold a slot if ``user_id`` is below the limit."""
+        if self.full(user_id):
+            yield False
+            return
+        self._active[user_id] += 1
+        try:
+            yield True
+        finally:
+            self._active[user_id] -= 1
+            if not self._active[user_id]:
+                del self._active[user_id]
@@ -0,0 +1,267 @@
+"""Bulk NDJSON export and import of conversations.
+
+The format is one JSON object per line.  A ``conversation`` record is
+followed by the ``message`` records that belong to it::
+
+    {"type": "conversation", "id": 7, "user": "alice", "title": "...", "created_at": "..."}
+    {"type": "message", "conversation": 7, "sender": "user", "text": "...", "created_at": "...", "interrupted": false}
+
+Export walks conversations in keyset pages and streams their messages
+through a server-side cursor, and import writes multi-row ``INSERT``
+statements in one transaction, so memory use does not grow with the number
+of messages.  Archived conversations are exported from their blobs and
+imported as regular conversations.  Files ending in ``.gz`` or ``.zst`` are
+compressed transparently; ``-`` means stdin/stdout.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.future import select
+
+from ..fragments import fragments
+from ..models import Conversation, ConversationArchive, Message, User
+from .archive import decode_messages, decompress
+
+try:  # optional dependency
+    import zstandard
+except ImportError:  # pragma: no cover - optional
+    zstandard = None
+
+#: Conversations fetched per keyset page during export
+PAGE_SIZE = 500
+#: Bound parameters per statement allowed by SQLite builds before 3.32
+MAX_VARIABLES = 999
+#: Message rows per multi-row INSERT during import; each binds 5 columns
+BATCH_SIZE = MAX_VARIABLES // 5
+
+
+@contextmanager
+def open_ndjson(path: str, mode: str) -> Iterator[IO[str]]:
+    """Open ``path`` for text reading (``"r"``) or writing (``"w"``)."""
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+        return
+    if path.endswith(".gz"):
+        fh = gzip.open(path, mode + "t", encoding="utf-8")
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Install the zstandard package to read or write .zst files")
+        raw = open(path, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        fh = io.TextIOWrapper(stream, encoding="utf-8")
+    else:
+        fh = open(path, mode, encoding="utf-8")
+    try:
+        yield fh
+    finally:
+        fh.close()
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+async def export_conversations(
+    engine: AsyncEngine,
+    out: IO[str],
+    username: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    page_size: int = PAGE_SIZE,
+) -> Tuple[int, int]:
+    """Write conversations matching the filters to ``out`` as NDJSON.
+
+    ``since``/``until`` bound the conversation creation time (``until`` is
+    exclusive).  Returns ``(conversations, messages)`` written.
+    """
+
+    query = (
+        select(
+            Conversation.id,
+            Conversation.title,
+            Conversation.created_at,
+            Conversation.archived_at,
+            User.username,
+        )
+        .join(User, User.id == Conversation.user_id)
+        .order_by(Conversation.id)
+        .limit(page_size)
+    )
+    if username is not None:
+        query = query.where(User.username == username)
+    if since is not None:
+        query = query.where(Conversation.created_at >= since)
+    if until is not None:
+        query = query.where(Conversation.created_at < until)
+
+    conversations = messages = 0
+    last_id = 0
+    async with engine.connect() as conn:
+        while True:
+            page = (await conn.execute(query.where(Conversation.id > last_id))).all()
+            if not page:
+                break
+            last_id = page[-1].id
+            for conv in page:
+                out.write(
+                    _dumps(
+                        {
+                            "type": "conversation",
+                            "id": conv.id,
+                            "user": conv.username,
+                            "title": conv.title,
+                            "created_at": _iso(conv.created_at),
+                        }
+                    )
+                )
+                conversations += 1
+                messages += await _export_messages(conn, out, conv.id, conv.archived_at is not None)
+    return conversations, messages
+
+
+async def _export_messages(conn: AsyncConnection, out: IO[str], conv_id: int, archived: bool) -> int:
+    count = 0
+    if archived:
+        row = (
+            await conn.execute(
+                select(ConversationArchive.codec, ConversationArchive.payload).where(
+                    ConversationArchive.conversation_id == conv_id
+                )
+            )
+        ).first()
+        rows = decode_messages(decompress(row.codec, row.payload)) if row else []
+        for msg in rows:
+            out.write(_dumps({"type": "message", "conversation": conv_id, "sender": msg["sender"],
+                              "text": msg["text"], "created_at": _iso(msg["created_at"]),
+                              "interrupted": msg["interrupted"]}))
+            count += 1
+    # a stub may already have new live messages next to its archive
+    result = await conn.stream(
+        select(Message.sender, Message.text, Message.created_at, Message.interrupted)
+        .where(Message.conversation_id == conv_id)
+        .order_by(Message.created_at, Message.id)
+        .execution_options(stream_results=True)
+    )
+    async for partition in result.partitions(BATCH_SIZE):
+        for msg in partition:
+            out.write(_dumps({"type": "message", "conversation": conv_id, "sender": msg.sender,
+                              "text": msg.text, "created_at": _iso(msg.created_at),
+                              "interrupted": bool(msg.interrupted)}))
+            count += 1
+    return count
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+async def import_conversations(
+    engine: AsyncEngine, source: IO[str], batch_size: int = BATCH_SIZE
+) -> Tuple[int, int]:
+    """Load NDJSON produced by :func:`export_conversations` from ``source``.
+
+    Conversations get new IDs assigned by the database and their messages
+    are remapped to them; users are matched by username and created
+    (without a usable password) when missing.  Everything is written in
+    one transaction.  ``batch_size`` messages are inserted per statement
+    and must stay below SQLite's parameter limit.  The cached sidebars of
+    the owners are invalidated afterwards; a running server only sees that
+    when the cache has a shared backend, otherwise its sidebars catch up
+    within ``cache_ttl``.  Returns ``(conversations, messages)`` imported.
+    """
+
+    users: Dict[str, int] = {}
+    conv_ids: Dict[int, int] = {}
+    msg_rows: List[dict] = []
+    messages = 0
+
+    async with engine.begin() as conn:
+
+        async def user_id(name: str) -> int:
+            if name not in users:
+                found = (await conn.execute(select(User.id).where(User.username == name))).scalar()
+                if found is None:
+                    result = await conn.execute(insert(User).values(username=name, name=name, password=None))
+                    found = result.inserted_primary_key[0]
+                users[name] = found
+            return users[name]
+
+        async def flush() -> None:
+            if msg_rows:
+                await conn.execute(insert(Message).values(msg_rows))
+                msg_rows.clear()
+
+        for lineno, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            kind = record.get("type")
+            if kind == "conversation":
+                # one row at a time: its new ID is needed to map the messages
+                result = await conn.execute(
+                    insert(Conversation).values(
+                        user_id=await user_id(record["user"]),
+                        title=record.get("title"),
+                        created_at=_parse_time(record.get("created_at")) or datetime.utcnow(),
+                        message_count=0,
+                    )
+                )
+                conv_ids[record["id"]] = result.inserted_primary_key[0]
+            elif kind == "message":
+                try:
+                    conv_id = conv_ids[record["conversation"]]
+                except KeyError:
+                    raise ValueError(f"line {lineno}: message for unknown conversation {record['conversation']}")
+                msg_rows.append(
+                    {
+                        "conversation_id": conv_id,
+                        "sender": record["sender"],
+                        "text": record["text"],
+                        "created_at": _parse_time(record.get("created_at")) or datetime.utcnow(),
+                        "interrupted": bool(record.get("interrupted", False)),
+                    }
+                )
+                messages += 1
+            else:
+                raise ValueError(f"line {lineno}: unknown record type {kind!r}")
+            if len(msg_rows) >= batch_size:
+                await flush()
+        await flush()
+
+        # one pass per chunk of imported conversations instead of a counter per insert
+        imported = list(conv_ids.values())
+        for start in range(0, len(imported), MAX_VARIABLES):
+            chunk = imported[start : start + MAX_VARIABLES]
+            await conn.execute(
+                update(Conversation)
+                .where(Conversation.id.in_(chunk))
+                .values(
+                    message_count=select(func.count())
+                    .where(Message.conversation_id == Conversation.id)
+                    .scalar_subquery(),
+                    last_message_at=select(func.max(Message.created_at))
+                    .where(Message.conversation_id == Conversation.id)
+                    .scalar_subquery(),
+                )
+                .execution_options(synchronize_session=False)
+            )
+    for owner in set(users.values()):
+        await fragments.bump(owner)
+    return len(conv_ids), messages
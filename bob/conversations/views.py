@@ -0,0 +1,48 @@
+"""Read-only views of conversations and messages for rendering.
+
+Pages and the sidebar only read a few columns, so they are loaded with Core
+selects into named tuples rather than ORM instances: there is no identity
+map, change tracking or relationship loading, and a view is a single small
+tuple.  Writes keep using the models in :mod:`bob.models`.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from ..models import Conversation, Message
+
+
+class MessageView(NamedTuple):
+    id: int
+    sender: str
+    text: str
+    created_at: datetime
+    interrupted: bool
+    # text with component tokens expanded
+    html: str = ""
+
+
+class ConversationView(NamedTuple):
+    id: int
+    title: str
+    created_at: datetime
+    message_count: int
+    last_message_at: Optional[datetime]
+    archived_at: Optional[datetime]
+    messages: Tuple[MessageView, ...] = ()
+
+
+#: Columns selected for a :class:`ConversationView`, in field order
+CONVERSATION_COLUMNS = (
+    Conversation.id,
+    Conversation.title,
+    Conversation.created_at,
+    Conversation.message_count,
+    Conversation.last_message_at,
+    Conversation.archived_at,
+)
+
+#: Columns selected for a :class:`MessageView`, without ``html``
+MESSAGE_COLUMNS = (Message.id, Message.sender, Message.text, Message.created_at, Message.interrupted)
@@ -5,11 +5,13 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from .metrics import instrument_engine
 from .settings import settings
 
 engine = create_async_engine(
     settings.DATABASE_URL, echo=False
 )
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(
     bind=engine,
@@ -0,0 +1,77 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Micro-batching of embedding requests.
+
+Retrieval embeds one short query per user message.  Under load many of those
+arrive within a few milliseconds of each other, and sending each as its own
+provider call wastes round trips and rate limit.  :class:`EmbeddingBatcher`
+collects the queries that arrive within ``window`` seconds, or until
+``max_batch`` are waiting, embeds them with one ``embed_documents`` call and
+hands each caller its vector.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .metrics import EMBEDDING_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Batch concurrent :meth:`embed` calls into ``embed_documents`` calls.
+
+    ``embeddings`` is any object with a blocking ``embed_documents(texts)``
+    method, such as a LangChain embeddings client; batches run in a worker
+    thread.  Identical texts in one batch are embedded once.
+    """
+
+    def __init__(self, embeddings: Any, max_batch: int = 64, window: float = 0.005) -> None:
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.window = window
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> List[float]:
+        """Return the embedding of ``text``, batched with concurrent calls."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        index: Dict[str, int] = {}
+        for text, _ in batch:
+            index.setdefault(text, len(index))
+        EMBEDDING_BATCH_SIZE.observe(len(index))
+        try:
+            vectors = await asyncio.to_thread(self.embeddings.embed_documents, list(index))
+        except Exception as exc:
+            logger.warning("Embedding batch of %d texts failed: %r", len(index), exc)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for text, future in batch:
+            # callers that went away cancelled their future
+            if not future.done():
+                future.set_result(vectors[index[text]])
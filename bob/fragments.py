@@ -0,0 +1,68 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Cache of rendered template fragments.
+
+Fragments such as the conversation sidebar are expensive to build (a query
+plus rendering one include per conversation) but change rarely.  They are
+cached in :mod:`bob.cache` under one namespace per owner (usually the user
+ID), keyed by the fragment name and any extra discriminators.  Bumping the
+owner on create, rename or delete invalidates the namespace, in every worker
+when the cache has a shared backend; stale entries simply age out.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from markupsafe import Markup
+
+from .cache import TieredCache, cache
+from .settings import settings
+from .shared import templates
+
+
+class FragmentCache:
+    """Rendered fragments in a :class:`~bob.cache.TieredCache`."""
+
+    def __init__(self, store: TieredCache, enabled: bool = True) -> None:
+        self.store = store
+        self.enabled = enabled
+
+    @staticmethod
+    def _namespace(owner: Hashable) -> str:
+        return f"fragment:{owner}"
+
+    async def bump(self, owner: Hashable) -> None:
+        """Invalidate every fragment cached for ``owner``."""
+        await self.store.invalidate(self._namespace(owner))
+
+    async def get(self, owner: Hashable, name: str, *extra: Hashable) -> Optional[Markup]:
+        if not self.enabled:
+            return None
+        html = await self.store.get(self._namespace(owner), (name,) + extra)
+        return None if html is None else Markup(html)
+
+    async def put(self, owner: Hashable, name: str, html: str, *extra: Hashable) -> Markup:
+        if self.enabled:
+            await self.store.set(self._namespace(owner), (name,) + extra, str(html))
+        return Markup(html)
+
+    async def get_or_render(
+        self, owner: Hashable, name: str, render: Callable[[], Awaitable[str]], *extra: Hashable
+    ) -> Markup:
+        """Return the cached fragment, rendering it once on a miss."""
+        if not self.enabled:
+            return Markup(await render())
+
+        async def _render() -> str:
+            return str(await render())
+
+        return Markup(await self.store.get_or_set(self._namespace(owner), (name,) + extra, _render))
+
+
+def render_fragment(template_name: str, context: Dict[str, Any]) -> str:
+    """Render ``template_name`` outside of a response."""
+    return templates.get_template(template_name).render(context)
+
+
+fragments = FragmentCache(cache, enabled=settings.FRAGMENT_CACHE_SIZE > 0)
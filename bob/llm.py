@@ -3,10 +3,12 @@
 """Interfaces to language model providers."""
 
 from abc import ABC, abstractmethod
+from time import perf_counter
 from typing import AsyncIterable
 
 import openai
 
+from .metrics import LLM_TOKENS_PER_SECOND, LLM_TTFT
 from .settings import settings
 
 
@@ -50,5 +52,16 @@ async def generate_text(messages: list[dict], agent_name: str = "default") -> st
 async def stream_tokens(messages: list[dict], agent_name: str = "default") -> AsyncIterable[str]:
     """Yield response tokens from the configured LLM."""
     provider = settings.get_llm(agent_name)
+    start = perf_counter()
+    first = 0.0
+    count = 0
     async for token in provider.stream_tokens(messages):
+        if not count:
+            first = perf_counter()
+            LLM_TTFT.observe(first - start, agent_name)
+        count += 1
         yield token
+    if count > 1:
+        elapsed = perf_counter() - first
+        if elapsed > 0:
+            LLM_TOKENS_PER_SECOND.observe((count - 1) / elapsed, agent_name)
@@ -0,0 +1,185 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Structured, non-blocking logging with request correlation IDs.
+
+Loggers below ``bob`` hand their records to a :class:`~logging.handlers.QueueHandler`;
+a :class:`~logging.handlers.QueueListener` thread formats and writes them, so
+no stream I/O happens on the event loop.  Every record carries the ID of the
+request that produced it (see :class:`RequestIdMiddleware`), and high-volume
+DEBUG records can be sampled per call site.
+
+Extra fields passed with ``extra={...}`` are emitted as structured fields::
+
+    logger.debug("db session opened", extra={"session": id(session)})
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO, Tuple
+
+#: Correlation ID of the request being handled in the current context
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+#: Attributes every LogRecord has; anything else was passed via ``extra``
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[QueueHandler] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID to each record on the emitting thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep roughly ``rate`` of the DEBUG records emitted at each call site.
+
+    Sampling is deterministic: with ``rate=0.1`` the 1st, 11th, 21st ...
+    record from a given line is kept.  INFO and above always pass.
+    """
+
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.every = 0 if rate <= 0 else max(1, round(1 / rate))
+        self._counts: Dict[Tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        if not self.every:
+            return False
+        key = (record.pathname, record.lineno)
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+def _extras(record: logging.LogRecord) -> Dict[str, object]:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        data.update(_extras(record))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable lines with ``key=value`` pairs for extra fields."""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            line += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        return line
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "text",
+    debug_sample_rate: float = 1.0,
+    stream: Optional[TextIO] = None,
+) -> None:
+    """Route ``bob.*`` loggers through a queue to a background writer.
+
+    Safe to call repeatedly, including in a freshly forked worker whose
+    inherited listener thread no longer exists: any previous handler is
+    detached and a new queue and listener are started.
+    """
+
+    global _listener, _handler
+
+    logger = logging.getLogger("bob")
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _handler = QueueHandler(records)
+    _handler.addFilter(RequestIdFilter())
+    _handler.addFilter(SamplingFilter(debug_sample_rate))
+    _listener = QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+
+    logger.addHandler(_handler)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+
+    global _listener
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+class RequestIdMiddleware:
+    """ASGI middleware assigning a correlation ID to every HTTP request.
+
+    An incoming ``X-Request-ID`` header is reused when it looks sane;
+    otherwise a new ID is generated.  The ID is echoed in the response.
+    """
+
+    header = b"x-request-id"
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = ""
+        for name, value in scope["headers"]:
+            if name == self.header:
+                request_id = value.decode("latin-1")
+                break
+        if not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
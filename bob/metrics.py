@@ -0,0 +1,280 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Lightweight in-process metrics exposed in Prometheus text format.
+
+The collectors here are deliberately minimal: recording a sample is a couple
+of dictionary lookups and integer additions so they can sit on the chat hot
+path.  Values are aggregated per process and rendered on demand by the
+``/metrics`` endpoint.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple
+
+#: Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#: Default latency buckets in seconds
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Common bookkeeping for named, labelled collectors."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[str]:  # pragma: no cover - overridden
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(val)}"
+            for key, val in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) - amount
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        self._values[labelvalues] = value
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: Tuple[str, ...]) -> None:
+        self._histogram = histogram
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._histogram.observe(perf_counter() - self._start, *self._labels)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum, count
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        counts = self._counts.get(labelvalues)
+        if counts is None:
+            counts = self._counts[labelvalues] = [0] * (len(self.buckets) + 1)
+            self._sums[labelvalues] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labelvalues] += value
+
+    def time(self, *labelvalues: str) -> _Timer:
+        """Return a context manager observing the elapsed wall time."""
+        return _Timer(self, labelvalues)
+
+    def count(self, *labelvalues: str) -> int:
+        return sum(self._counts.get(labelvalues, ()))
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        bounds = self.buckets + (float("inf"),)
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip(bounds, self._counts[key]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    "bob_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+DB_TIME = REGISTRY.histogram(
+    "bob_db_query_duration_seconds", "Time spent executing database statements."
+)
+RETRIEVAL_TIME = REGISTRY.histogram(
+    "bob_retrieval_duration_seconds", "Vector store retrieval latency.", ("agent",)
+)
+EMBEDDING_BATCH_SIZE = REGISTRY.histogram(
+    "bob_embedding_batch_size",
+    "Distinct texts per batched embedding call.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+LLM_TTFT = REGISTRY.histogram(
+    "bob_llm_time_to_first_token_seconds", "Delay until the LLM produced its first token.", ("agent",)
+)
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "bob_llm_tokens_per_second",
+    "LLM streaming rate after the first token.",
+    ("agent",),
+    buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400),
+)
+STREAM_DURATION = REGISTRY.histogram(
+    "bob_stream_duration_seconds", "Duration of agent reply streams.", ("agent",)
+)
+CACHE_HITS = REGISTRY.counter("bob_cache_hits_total", "Cache lookups served from cache.", ("cache",))
+CACHE_MISSES = REGISTRY.counter("bob_cache_misses_total", "Cache lookups that missed.", ("cache",))
+CACHE_L2_HITS = REGISTRY.counter(
+    "bob_cache_l2_hits_total", "Cache hits served by the shared backend after an L1 miss.", ("cache",)
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "bob_task_queue_depth", "Jobs waiting in the task queue, read from the store at scrape time.", ("backend",)
+)
+ACTIVE_STREAMS = REGISTRY.gauge("bob_active_streams", "Server-sent event streams currently open.")
+STREAMS_INTERRUPTED = REGISTRY.counter(
+    "bob_streams_interrupted_total", "Reply streams stopped before the agent finished.", ("agent",)
+)
+STREAMS_REJECTED = REGISTRY.counter(
+    "bob_streams_rejected_total", "Reply streams refused by the per-user limit."
+)
+FANOUT_WINS = REGISTRY.counter(
+    "bob_fanout_wins_total", "Replies of fanout agents by the branch that produced them.", ("agent", "branch")
+)
+
+
+def instrument_engine(engine) -> None:
+    """Record statement execution time of ``engine`` in :data:`DB_TIME`."""
+
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bob_query_start", []).append(perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_TIME.observe(perf_counter() - conn.info["bob_query_start"].pop())
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency labelled by route template.
+
+    Streaming responses are timed until the last body chunk is sent.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get("route")
+            # mounted apps such as ``/static`` expose their prefix as root_path
+            path = getattr(route, "path", None) or scope.get("root_path") or "<unmatched>"
+            REQUEST_LATENCY.observe(perf_counter() - start, scope["method"], path)
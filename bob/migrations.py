@@ -0,0 +1,212 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Versioned schema migrations.
+
+The applied version is stored in the single-row ``schema_version`` table.
+:func:`upgrade` first lets ``create_all`` create tables that do not exist yet
+(a new database therefore starts with the current schema) and then runs every
+migration newer than the stored version.  Migrations inspect the live schema
+so they are safe to run against tables ``create_all`` has just created.  They
+spell out their own DDL rather than reading the models, so a shipped migration
+keeps doing the same thing when the models change later.
+
+Add a migration by appending a function to :data:`MIGRATIONS`; never reorder
+or edit migrations that have shipped.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .db import Base
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {col["name"] for col in inspect(conn).get_columns(table)}
+
+
+def _add_conversation_stats(conn: Connection) -> None:
+    """Add ``message_count``/``last_message_at`` and backfill them."""
+    existing = _columns(conn, "conversations")
+    if "message_count" not in existing:
+        conn.execute(text("ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0"))
+    if "last_message_at" not in existing:
+        conn.execute(text("ALTER TABLE conversations ADD COLUMN last_message_at DATETIME"))
+    conn.execute(
+        text(
+            "UPDATE conversations SET "
+            "message_count = (SELECT count(*) FROM messages WHERE messages.conversation_id = conversations.id), "
+            "last_message_at = (SELECT max(created_at) FROM messages WHERE messages.conversation_id = conversations.id)"
+        )
+    )
+
+
+def _add_history_indexes(conn: Connection) -> None:
+    """Composite indexes for message history and the conversation sidebar."""
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_messages_conversation_created "
+            "ON messages (conversation_id, created_at)"
+        )
+    )
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_conversations_user_created ON conversations (user_id, created_at)")
+    )
+
+
+def _add_archive(conn: Connection) -> None:
+    """Side table for archived messages and the ``archived_at`` stub marker."""
+    conn.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS conversation_archives ("
+            "conversation_id INTEGER NOT NULL PRIMARY KEY REFERENCES conversations (id), "
+            "codec VARCHAR NOT NULL, "
+            "payload BLOB NOT NULL, "
+            "message_count INTEGER NOT NULL, "
+            "archived_at DATETIME)"
+        )
+    )
+    if "archived_at" not in _columns(conn, "conversations"):
+        conn.execute(text("ALTER TABLE conversations ADD COLUMN archived_at DATETIME"))
+
+
+def _add_interrupted_flag(conn: Connection) -> None:
+    """Mark replies that were cut off before the agent finished."""
+    if "interrupted" not in _columns(conn, "messages"):
+        conn.execute(text("ALTER TABLE messages ADD COLUMN interrupted BOOLEAN NOT NULL DEFAULT 0"))
+
+
+def _add_task_scheduling(conn: Connection) -> None:
+    """Expiry, chunked results, lanes and schedules for SQLite task jobs."""
+    existing = _columns(conn, "bob_tasks")
+    added = {
+        "ttl": "FLOAT",
+        "expires_at": "DATETIME",
+        "result_chunks": "INTEGER NOT NULL DEFAULT 0",
+        "lane": "VARCHAR NOT NULL DEFAULT 'default'",
+        "run_at": "DATETIME",
+        "dedupe_key": "VARCHAR",
+        "every": "FLOAT",
+    }
+    for name, ddl in added.items():
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE bob_tasks ADD COLUMN {name} {ddl}"))
+    conn.execute(text("UPDATE bob_tasks SET run_at = created_at WHERE run_at IS NULL"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bob_tasks_expires_at ON bob_tasks (expires_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bob_tasks_claim ON bob_tasks (status, lane, run_at)"))
+    # one waiting job per key; claiming a job frees its key
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_bob_tasks_dedupe "
+            "ON bob_tasks (dedupe_key) WHERE status = 'PENDING'"
+        )
+    )
+
+
+def _autoincrement_message_ids(conn: Connection) -> None:
+    """Never reuse message IDs, including IDs held by archived conversations.
+
+    SQLite only avoids reusing rowids for ``AUTOINCREMENT`` tables, so the
+    table is rebuilt and its sequence starts above every archived ID.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages'")).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        columns = "id, conversation_id, sender, text, created_at, interrupted"
+        conn.execute(
+            text(
+                "CREATE TABLE messages_new ("
+                "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+                "conversation_id INTEGER REFERENCES conversations (id), "
+                "sender VARCHAR, "
+                "text TEXT, "
+                "created_at DATETIME, "
+                "interrupted BOOLEAN NOT NULL DEFAULT 0)"
+            )
+        )
+        conn.execute(text(f"INSERT INTO messages_new ({columns}) SELECT {columns} FROM messages"))
+        conn.execute(text("DROP TABLE messages"))
+        conn.execute(text("ALTER TABLE messages_new RENAME TO messages"))
+        conn.execute(text("CREATE INDEX ix_messages_id ON messages (id)"))
+        conn.execute(
+            text("CREATE INDEX ix_messages_conversation_created ON messages (conversation_id, created_at)")
+        )
+
+    from .conversations.archive import decode_messages, decompress
+
+    seq = conn.execute(text("SELECT coalesce(max(id), 0) FROM messages")).scalar()
+    for codec, payload in conn.execute(text("SELECT codec, payload FROM conversation_archives")):
+        seq = max([seq] + [row["id"] for row in decode_messages(decompress(codec, payload))])
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'messages'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('messages', :seq)"), {"seq": seq})
+
+
+def _add_reply_links(conn: Connection) -> None:
+    """Link each reply to the user message it answers.
+
+    Existing replies are linked to the closest earlier user message.
+    """
+    if "reply_to_id" not in _columns(conn, "messages"):
+        conn.execute(text("ALTER TABLE messages ADD COLUMN reply_to_id INTEGER"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_messages_reply_to_id ON messages (reply_to_id)"))
+    conn.execute(
+        text(
+            "UPDATE messages SET reply_to_id = ("
+            "SELECT max(asked.id) FROM messages AS asked "
+            "WHERE asked.conversation_id = messages.conversation_id "
+            "AND asked.sender = 'user' AND asked.id < messages.id) "
+            "WHERE sender = 'bob' AND reply_to_id IS NULL"
+        )
+    )
+
+
+#: Ordered migrations; the version of a migration is its position plus one
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("conversation message_count and last_message_at", _add_conversation_stats),
+    ("history and sidebar indexes", _add_history_indexes),
+    ("conversation archive", _add_archive),
+    ("interrupted replies", _add_interrupted_flag),
+    ("task expiry, result chunks and lanes", _add_task_scheduling),
+    ("never reuse message ids", _autoincrement_message_ids),
+    ("reply links", _add_reply_links),
+]
+
+LATEST = len(MIGRATIONS)
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+
+
+def upgrade(conn: Connection, target: int = LATEST) -> Tuple[int, int]:
+    """Bring the schema on ``conn`` to ``target`` and return ``(old, new)``."""
+    from .tasks.sqlite_manager import Base as TaskBase
+
+    Base.metadata.create_all(conn)
+    TaskBase.metadata.create_all(conn)
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    old = current_version(conn)
+    if old == 0:
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (0)"))
+    for version in range(old + 1, target + 1):
+        description, migrate = MIGRATIONS[version - 1]
+        logger.info("Applying migration", extra={"version": version, "migration": description})
+        migrate(conn)
+        conn.execute(text("UPDATE schema_version SET version = :v"), {"v": version})
+    return old, max(old, target)
+
+
+async def upgrade_database(engine: AsyncEngine, target: int = LATEST) -> Tuple[int, int]:
+    """Run :func:`upgrade` in one transaction on an async ``engine``."""
+    async with engine.begin() as conn:
+        return await conn.run_sync(upgrade, target)
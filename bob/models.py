@@ -7,7 +7,7 @@ from enum import Enum
 from typing import Any, Optional
 
 from pydantic import BaseModel
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
 from sqlalchemy.orm import relationship
 
 from .db import Base
@@ -33,9 +33,17 @@ class Conversation(Base):
     title = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # denormalized, maintained by bob.conversations.store on every insert
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime, nullable=True)
+    # set while the messages live in ConversationArchive instead of messages
+    archived_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    archive = relationship("ConversationArchive", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (Index("ix_conversations_user_created", "user_id", "created_at"),)
 
 
 class Message(Base):
@@ -46,9 +54,31 @@ class Message(Base):
     sender = Column(String)  # 'user' or 'bob'
     text = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # reply cut short because the client went away or the agent failed
+    interrupted = Column(Boolean, nullable=False, default=False, server_default="0")
+    # for Bob's messages, the user message they answer
+    reply_to_id = Column(Integer, nullable=True, index=True)
 
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+        # archived messages keep their IDs, so IDs must never be handed out twice
+        {"sqlite_autoincrement": True},
+    )
+
+
+class ConversationArchive(Base):
+    """Compressed JSON of the messages of an archived conversation."""
+
+    __tablename__ = "conversation_archives"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), primary_key=True)
+    codec = Column(String, nullable=False)  # 'zstd' or 'zlib'
+    payload = Column(LargeBinary, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
 
 class StatusEnum(str, Enum):
     PENDING = "PENDING"
@@ -62,3 +92,5 @@ class JobResponse(BaseModel):
     status: StatusEnum
     result: Optional[Any] = None
     error: Optional[str] = None
+    # large results are stored separately and only loaded on request
+    chunked: bool = False
@@ -0,0 +1,248 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Pre-fork multi-worker server used by ``python -m bob`` in production mode.
+
+The master process binds the listening socket, loads settings and agents,
+upgrades the database, and then forks the configured number of workers.
+Workers inherit the preloaded state copy-on-write and each run a uvicorn
+server on the shared socket.  Database connections and vector stores are not
+inherited: each worker opens its own, since SQLite connections must not cross
+a fork.  The master supervises the workers:
+
+* a worker that dies is replaced;
+* only the first worker, and whichever worker replaces it, runs periodic
+  maintenance: archiving idle conversations and sweeping expired jobs;
+* ``SIGHUP`` replaces all workers one by one without dropping the socket;
+* ``SIGTERM``/``SIGINT`` ask every worker to finish in-flight requests and
+  exit, killing stragglers after ``graceful_timeout`` seconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+from .settings import Settings
+
+logger = logging.getLogger(__name__)
+
+#: Minimum lifetime in seconds below which a dying worker counts as crashing
+_CRASH_WINDOW = 5.0
+
+
+def _resolve_impl(choice: str, module: str, fallback: str) -> str:
+    """Return ``choice`` unless it names a missing optional module."""
+    if choice == module and importlib.util.find_spec(module) is None:
+        logger.warning("%s is not installed, falling back to %s", module, fallback)
+        return fallback
+    return choice
+
+
+def uvicorn_options(settings: Settings) -> Dict:
+    """Return uvicorn keyword arguments derived from ``[global]`` settings."""
+    return {
+        "loop": _resolve_impl(settings.LOOP, "uvloop", "asyncio"),
+        "http": _resolve_impl(settings.HTTP, "httptools", "h11"),
+        "timeout_keep_alive": settings.KEEP_ALIVE,
+        "backlog": settings.BACKLOG,
+        "timeout_graceful_shutdown": settings.GRACEFUL_TIMEOUT,
+    }
+
+
+def preload(settings: Settings) -> None:
+    """Build shared state before forking so workers inherit it."""
+    from . import agents
+    from .db import engine
+    from .migrations import upgrade_database
+    from .shared import precompile_templates
+
+    # fails fast on a bad configuration; workers reopen the stores agents hold
+    agents.load_agents()
+    precompile_templates()
+
+    async def _upgrade() -> None:
+        await upgrade_database(engine)
+        await engine.dispose()
+
+    asyncio.run(_upgrade())
+
+
+def _reset_after_fork(settings: Settings, maintenance: bool) -> None:
+    """Drop connection pools and vector stores inherited from the master process."""
+    from . import agents, web
+    from .db import engine
+    from .log import configure_logging
+    from .tasks import sqlite_manager
+    from .vectorstores import vector_stores
+
+    web.maintenance_enabled = maintenance
+
+    # the master's log writer thread does not survive fork
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_DEBUG_SAMPLE_RATE)
+    engine.sync_engine.dispose(close=False)
+    sqlite_manager.engine.sync_engine.dispose(close=False)
+    # Chroma keeps SQLite connections; agents get stores opened in this process
+    vector_stores.clear()
+    settings.clear_vector_dbs()
+    agents.load_agents()
+
+
+class PreforkServer:
+    """Supervise ``workers`` uvicorn processes sharing one socket."""
+
+    def __init__(self, app, settings: Settings, workers: Optional[int] = None) -> None:
+        self.app = app
+        self.settings = settings
+        self.workers = workers or settings.WORKERS or os.cpu_count() or 1
+        self.options = uvicorn_options(settings)
+        self.sock: Optional[socket.socket] = None
+        self._children: Dict[int, float] = {}
+        # the one worker running periodic maintenance
+        self._maintainer: Optional[int] = None
+        self._stopping = False
+        self._reloading = False
+
+    def _bind(self) -> socket.socket:
+        family = socket.AF_INET6 if ":" in self.settings.HOST else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.settings.HOST, self.settings.PORT))
+        sock.listen(self.settings.BACKLOG)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, maintenance: bool = False) -> int:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = time.monotonic()
+            if maintenance:
+                self._maintainer = pid
+            return pid
+        # worker process
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        _reset_after_fork(self.settings, maintenance)
+        config = uvicorn.Config(self.app, log_level="info", **self.options)
+        server = uvicorn.Server(config)
+        try:
+            server.run(sockets=[self.sock])
+        finally:
+            os._exit(0)
+
+    def _on_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _on_reload(self, signum, frame) -> None:
+        self._reloading = True
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            started = self._children.pop(pid, None)
+            if started is None or self._stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning("Worker %s exited with %s, restarting", pid, code)
+            if time.monotonic() - started < _CRASH_WINDOW:
+                time.sleep(1.0)  # avoid a tight fork loop on startup errors
+            self._spawn(maintenance=pid == self._maintainer)
+
+    def _wait_exit(self, pids, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+                    self._children.pop(pid, None)
+            time.sleep(0.1)
+        for pid in remaining:
+            logger.warning("Worker %s did not stop in time, killing", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self._children.pop(pid, None)
+
+    def _rolling_restart(self) -> None:
+        logger.info("Reloading %d workers", len(self._children))
+        for pid in list(self._children):
+            self._spawn(maintenance=pid == self._maintainer)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            self._wait_exit([pid], self.settings.GRACEFUL_TIMEOUT + 5)
+
+    def run(self) -> None:
+        if self.workers > 1:
+            from .fragments import fragments
+
+            if fragments.store.backend is None:
+                # without a shared cache backend invalidations stay in the
+                # worker that made them and others would serve stale sidebars
+                logger.info("Fragment cache disabled: set cache_backend = \"redis\" to share it between workers")
+                fragments.enabled = False
+            if self.settings.STREAM_BROKER == "local":
+                # a stream reconnecting to another worker would start the reply again
+                logger.warning(
+                    "stream_broker = \"local\" with %d workers: a reply still being generated can be "
+                    "generated twice; set stream_broker = \"redis\" to share replies between workers",
+                    self.workers,
+                )
+        self.sock = self._bind()
+        preload(self.settings)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        logger.info(
+            "Starting %d workers on %s:%s (loop=%s, http=%s)",
+            self.workers, self.settings.HOST, self.settings.PORT,
+            self.options["loop"], self.options["http"],
+        )
+        for index in range(self.workers):
+            self._spawn(maintenance=index == 0)
+        try:
+            while not self._stopping:
+                if self._reloading:
+                    self._reloading = False
+                    self._rolling_restart()
+                self._reap()
+                time.sleep(0.5)
+        finally:
+            logger.info("Stopping %d workers", len(self._children))
+            for pid in list(self._children):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+            self._wait_exit(list(self._children), self.settings.GRACEFUL_TIMEOUT + 5)
+            self.sock.close()
+
+
+def serve(app, settings: Settings) -> None:
+    """Run ``app`` according to ``settings.SERVER_MODE``."""
+    if settings.SERVER_MODE == "production" and hasattr(os, "fork"):
+        PreforkServer(app, settings).run()
+        return
+    if settings.SERVER_MODE == "production":
+        logger.warning("Pre-fork workers need os.fork; running a single process")
+    uvicorn.run(app, host=settings.HOST, port=settings.PORT, **uvicorn_options(settings))
@@ -2,12 +2,16 @@ from __future__ import annotations
 
 """Project configuration utilities."""
 
+from dataclasses import dataclass, field
 from functools import lru_cache
 from pathlib import Path
-from typing import Protocol, Optional, List, Dict, Any
+from types import MappingProxyType
+from typing import Protocol, Optional, List, Dict, Any, Mapping, Callable
 import os
 import tomllib
 
+from .metrics import CACHE_HITS, CACHE_MISSES
+
 
 class SettingsProvider(Protocol):
     """Protocol for loading configuration data."""
@@ -25,9 +29,59 @@ class TomlSettingsProvider:
             return tomllib.load(fh)
 
 
+@dataclass(frozen=True, slots=True)
+class AgentConfig:
+    """Resolved, read-only configuration of one ``[agents.ID]`` section.
+
+    ``@variable`` indirections are resolved once when the configuration is
+    loaded; parameters whose variable is undefined are omitted so lookups fall
+    back to their defaults.
+    """
+
+    id: str
+    params: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+
+    def get(self, param: str, default=None):
+        return self.params.get(param, default)
+
+    @property
+    def agent_type(self) -> str:
+        return str(self.params.get("agent_type", self.id))
+
+    @property
+    def home_selector(self) -> Optional[str]:
+        label = self.params.get("home_selector")
+        return None if label is None else str(label)
+
+
+_MISSING = object()
+
+
+def _resolve(value, global_cfg: Dict):
+    """Return ``value`` with ``@variable`` indirection resolved or ``_MISSING``."""
+    if isinstance(value, str) and value.startswith("@"):
+        varname = value[1:]
+        # 1. Check [global] section
+        if varname in global_cfg:
+            return global_cfg[varname]
+        # 2. Check OS environment
+        env_value = os.getenv(varname)
+        if env_value is not None:
+            return env_value
+        # 3. Fall back to the caller's default
+        return _MISSING
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
 class Settings:
     """Application settings with pluggable configuration provider.
 
+    The configuration file is parsed once into immutable :class:`AgentConfig`
+    objects.  :meth:`reload_if_changed` rebuilds them when the file's
+    modification time changes.
+
     Usage example::
 
         settings = Settings()
@@ -36,20 +90,48 @@ class Settings:
 
     def __init__(self, provider: Optional[SettingsProvider] = None, path: Optional[str] = None) -> None:
         self._provider = provider or TomlSettingsProvider()
-        self._path = self._discover_path(path)
-        data: Dict = {}
-        if self._path:
-            try:
-                data = self._provider.load(self._path)
-            except Exception:
-                data = {}
-        self._global: Dict = data.get("global", {})
-        self._agents: Dict[str, Dict] = data.get("agents", {})
+        # a custom provider need not be file based, so trust an explicit path
+        self._path = path if provider and path else self._discover_path(path)
 
         # Load environment variables if available
         from dotenv import load_dotenv
         load_dotenv()
 
+        # Environment fallbacks for agent-specific keys
+        self._env_openai_api_key = os.getenv("OPENAI_API_KEY")
+        self._env_llm_provider = os.getenv("LLM_PROVIDER")
+
+        self._mtime = self._stat()
+        self._apply(self._load())
+
+    def _load(self) -> Dict:
+        if not self._path:
+            return {}
+        try:
+            return self._provider.load(self._path)
+        except Exception:
+            return {}
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return os.stat(self._path).st_mtime if self._path else None
+        except OSError:
+            return None
+
+    def _apply(self, data: Dict) -> None:
+        """Build resolved configuration from ``data`` and swap it in."""
+        global_cfg: Dict = data.get("global", {})
+        configs: Dict[str, AgentConfig] = {}
+        for agent_id, raw in data.get("agents", {}).items():
+            params = {}
+            for key, value in raw.items():
+                resolved = _resolve(value, global_cfg)
+                if resolved is not _MISSING:
+                    params[key] = resolved
+            configs[agent_id] = AgentConfig(agent_id, MappingProxyType(params))
+        self._global = global_cfg
+        self._agent_configs: Mapping[str, AgentConfig] = MappingProxyType(configs)
+
         # Global settings
         self.DATABASE_URL = self._global.get("database_url", "sqlite+aiosqlite:///./db/bob.db")
         self.HOST = self._global.get("host", "0.0.0.0")
@@ -59,14 +141,75 @@ class Settings:
         self.SITE_HEADER = self._global.get("site_header", "Phoenix")
         self.SITE_TAGLINE = self._global.get("site_tagline", "AI-Powered Learning")
         self.PERSONA_NAME = self._global.get("persona_name", "Bob")
+        self.SERVER_MODE = self._global.get("server_mode", "development")
+        self.WORKERS = int(self._global.get("workers", 0))
+        self.LOOP = self._global.get("loop", "auto")
+        self.HTTP = self._global.get("http", "auto")
+        self.KEEP_ALIVE = int(self._global.get("keep_alive", 5))
+        self.BACKLOG = int(self._global.get("backlog", 2048))
+        self.GRACEFUL_TIMEOUT = int(self._global.get("graceful_timeout", 30))
+        self.METRICS_ENABLED = bool(self._global.get("metrics_enabled", True))
+        self.METRICS_ALLOW_REMOTE = bool(self._global.get("metrics_allow_remote", False))
+        self.TEMPLATE_CACHE_DIR = self._global.get("template_cache_dir", "./db/jinja-cache")
+        self.FRAGMENT_CACHE_SIZE = int(self._global.get("fragment_cache_size", 1024))
+        self.CACHE_BACKEND = self._global.get("cache_backend", "none")
+        self.CACHE_SIZE = int(self._global.get("cache_size", 4096))
+        self.CACHE_TTL = float(self._global.get("cache_ttl", 3600))
+        self.TASK_BACKEND = self._global.get("task_backend", "sqlite")
+        self.TASK_TTL = float(self._global.get("task_ttl", 86400))
+        self.TASK_PENDING_TTL = float(self._global.get("task_pending_ttl", 7 * 86400))
+        self.TASK_GC_INTERVAL = float(self._global.get("task_gc_interval", 600))
+        self.LOG_LEVEL = self._global.get("log_level", "INFO")
+        self.LOG_FORMAT = self._global.get("log_format", "text")
+        self.LOG_DEBUG_SAMPLE_RATE = float(self._global.get("log_debug_sample_rate", 1.0))
+        self.CONFIG_WATCH_INTERVAL = float(self._global.get("config_watch_interval", 2.0))
+        self.EMOJI_MODE = self._global.get("emoji_mode", "img")
+        self.ARCHIVE_AFTER_DAYS = float(self._global.get("archive_after_days", 0))
+        self.ARCHIVE_INTERVAL = float(self._global.get("archive_interval", 3600))
+        self.PREFETCH_TTL = float(self._global.get("prefetch_ttl", 30))
+        self.MAX_STREAMS_PER_USER = int(self._global.get("max_streams_per_user", 3))
+        self.STREAM_BUFFER_SIZE = int(self._global.get("stream_buffer_size", 64))
+        self.STREAM_BROKER = self._global.get("stream_broker", "local")
+        self.STREAM_REPLAY_SIZE = int(self._global.get("stream_replay_size", 256))
+        self.STREAM_LINGER = float(self._global.get("stream_linger", 15))
+        self.MESSAGE_WRITE_BEHIND = bool(self._global.get("message_write_behind", False))
+        self.VECTOR_WARMUP = bool(self._global.get("vector_warmup", True))
+        self.EMBED_BATCH_WINDOW = float(self._global.get("embed_batch_window", 0.005))
+        self.EMBED_BATCH_SIZE = int(self._global.get("embed_batch_size", 64))
 
-        # Environment fallbacks for agent-specific keys
-        self._env_openai_api_key = os.getenv("OPENAI_API_KEY")
-        self._env_llm_provider = os.getenv("LLM_PROVIDER")
-
+        # Fresh caches: objects already handed out keep working until released
         self._llms: Dict[str, Any] = {}
         self._vector_dbs: Dict[str, Any] = {}
 
+    def reload_if_changed(self, validate: Optional[Callable[[], None]] = None) -> bool:
+        """Re-read the configuration file if it changed since the last load.
+
+        Returns ``True`` when new configuration was applied.  A file that
+        fails to parse leaves the current configuration in place.  When
+        ``validate`` raises, the previous configuration and modification time
+        are restored before the error propagates, so the file is retried on
+        the next poll.  Database and bind address changes only take effect
+        after a restart.
+        """
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return False
+        previous = dict(self.__dict__)
+        self._mtime = mtime
+        try:
+            data = self._provider.load(self._path)
+        except Exception:
+            return False
+        self._apply(data)
+        if validate is not None:
+            try:
+                validate()
+            except Exception:
+                self.__dict__.clear()
+                self.__dict__.update(previous)
+                raise
+        return True
+
     def _discover_path(self, path: Optional[str]) -> Optional[str]:
         candidates: List[Path] = []
         if path:
@@ -83,27 +226,17 @@ class Settings:
         return None
 
     def get_agent_names(self) -> List[str]:
-        return list(self._agents.keys())
+        return list(self._agent_configs.keys())
+
+    def get_agent_config(self, name: str) -> AgentConfig:
+        """Return the resolved configuration for agent ``name``."""
+        return self._agent_configs.get(name) or AgentConfig(name)
 
-    def get_agent(self, name: str) -> Dict:
-        return self._agents.get(name, {})
+    def get_agent(self, name: str) -> Mapping[str, Any]:
+        return self.get_agent_config(name).params
 
     def get_agent_param(self, name: str, param: str, default=None):
-        agent_cfg = self.get_agent(name)
-        value = agent_cfg.get(param, default)
-        if isinstance(value, str) and value.startswith("@"):  # variable indirection
-            varname = value[1:]
-            # 1. Check [global] section
-            global_cfg = self._provider.load(self._path).get("global", {}) if self._path else {}
-            if varname in global_cfg:
-                return global_cfg[varname]
-            # 2. Check OS environment
-            env_value = os.getenv(varname)
-            if env_value is not None:
-                return env_value
-            # 3. Fallback to default
-            return default
-        return value
+        return self.get_agent_config(name).get(param, default)
 
     def get_openai_api_key(self, name: str) -> Optional[str]:
         """Return OpenAI API key for ``name`` with environment fallback."""
@@ -115,7 +248,10 @@ class Settings:
 
     def get_llm(self, name: str):
         """Return a cached LLM instance for ``name``."""
-        if name not in self._llms:
+        if name in self._llms:
+            CACHE_HITS.inc("llm")
+        else:
+            CACHE_MISSES.inc("llm")
             from .llm import OpenAILLM  # local import to avoid circular
 
             provider = self.get_llm_provider(name)
@@ -128,29 +264,47 @@ class Settings:
         return self._llms[name]
 
     def get_vector_db(self, name: str):
-        """Return a cached vector DB instance for ``name`` (may be ``None``)."""
-        if name not in self._vector_dbs:
-            try:  # optional dependency
-                from langchain.embeddings import OpenAIEmbeddings
-                from langchain.vectorstores import Chroma
-            except Exception:  # pragma: no cover - optional deps
-                OpenAIEmbeddings = None
-                Chroma = None
-
-            db = None
-            db_type = self.get_agent_param(name, "vector_db_type")
-            if db_type == "Chroma" and Chroma:
-                path = self.get_agent_param(name, "vector_db_path", "chroma")
-                embedding_type = self.get_agent_param(name, "vector_db_embedding", "openai")
-                if embedding_type == "openai" and OpenAIEmbeddings:
-                    embeddings = OpenAIEmbeddings(
-                        openai_api_key=self.get_openai_api_key(name)
-                    )
-                else:  # pragma: no cover - unsupported embedding
-                    embeddings = None
-                db = Chroma(persist_directory=path, embedding_function=embeddings)
-            self._vector_dbs[name] = db
-        return self._vector_dbs[name]
+        """Return the vector DB for ``name`` (may be ``None``).
+
+        Stores come from the process-wide pool, so agents configured with the
+        same path and embedding share one store and embedding client.
+        """
+        if name in self._vector_dbs:
+            return self._vector_dbs[name]
+        from .vectorstores import vector_stores  # local import to avoid circular
+
+        db = None
+        db_type = self.get_agent_param(name, "vector_db_type")
+        if db_type:
+            db = vector_stores.get(
+                db_type,
+                self.get_agent_param(name, "vector_db_path", "chroma"),
+                self.get_agent_param(name, "vector_db_embedding", "openai"),
+                self.get_openai_api_key(name),
+            )
+        self._vector_dbs[name] = db
+        return db
+
+    def clear_vector_dbs(self) -> None:
+        """Forget the vector DBs handed out so far; the next lookup reopens them."""
+        self._vector_dbs = {}
+
+    def get_embedder(self, name: str):
+        """Return the batching query embedder for ``name``'s vector DB.
+
+        ``None`` when the agent has no vector DB or batching is disabled with
+        ``embed_batch_window = 0``.
+        """
+        if self.EMBED_BATCH_WINDOW <= 0 or self.get_vector_db(name) is None:
+            return None
+        from .vectorstores import vector_stores  # local import to avoid circular
+
+        return vector_stores.batcher(
+            self.get_agent_param(name, "vector_db_embedding", "openai"),
+            self.get_openai_api_key(name),
+            self.EMBED_BATCH_SIZE,
+            self.EMBED_BATCH_WINDOW,
+        )
 
 
 @lru_cache(maxsize=1)
@@ -1,18 +1,38 @@
 """Shared helpers for template rendering and database access."""
 
 import json
+import logging
+import os
 from pathlib import Path
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from fastapi import Request
+from .assets import asset_url
 from .settings import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from .db import SessionLocal
 from .models import User
 from sqlalchemy.future import select
 
+logger = logging.getLogger(__name__)
+
 # Jinja2 templates
 templates = Jinja2Templates(directory="bob/templates")
 templates.env.globals["settings"] = settings
+templates.env.globals["asset_url"] = asset_url
+if settings.TEMPLATE_CACHE_DIR:
+    os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR)
+# production templates only change on deploy, so skip per-render mtime checks
+templates.env.auto_reload = settings.SERVER_MODE != "production"
+
+
+def precompile_templates() -> int:
+    """Compile every template into the environment cache and return the count."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
 
 # Home panels data
 HOME_PANELS = json.loads((Path(__file__).resolve().parent.parent / "home-panels.json").read_text())
@@ -21,13 +41,12 @@ HOME_PANELS = json.loads((Path(__file__).resolve().parent.parent / "home-panels.
 async def get_db(): # This is now an async generator function
     """Yield an ``AsyncSession`` and ensure it is closed."""
     session = SessionLocal()
-    print(f"[DEBUG] get_db: Created session {type(session)}")
+    logger.debug("db session opened")
     try:
         yield session
     finally:
-        print(f"[DEBUG] get_db: Closing session {type(session)}")
         await session.close()
-        print("[DEBUG] get_db: Session closed")
+        logger.debug("db session closed")
 
 # Async current user fetcher
 async def get_current_user(request: Request, db: AsyncSession): # Removed Depends(get_db)
@@ -5,28 +5,179 @@ from __future__ import annotations
 
 import json
 import uuid
+from datetime import datetime
+from typing import Any, Optional
 
 from redis.asyncio import Redis
 
 from ..models import JobResponse, StatusEnum
 from ..settings import settings
-from . import TaskManager
+from . import LANES, ClaimedJob, TaskManager, next_run, pack_result, unpack_result
+
+# Pop the first due job from the lane queues in KEYS, tried in order.
+# IDs whose job hash has expired are dropped on the way.  ARGV: now (epoch
+# seconds).  Returns {lane key, job id} or nil.
+CLAIM_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    while true do
+        local ids = redis.call('ZRANGEBYSCORE', key, '-inf', ARGV[1], 'LIMIT', 0, 1)
+        if #ids == 0 then
+            break
+        end
+        redis.call('ZREM', key, ids[1])
+        local job = 'jobs:' .. ids[1]
+        if redis.call('EXISTS', job) == 1 then
+            redis.call('HSET', job, 'status', 'RUNNING')
+            local dedupe = redis.call('HGET', job, 'dedupe_key')
+            if dedupe and redis.call('GET', 'tasks:dedupe:' .. dedupe) == ids[1] then
+                redis.call('DEL', 'tasks:dedupe:' .. dedupe)
+            end
+            return {key, ids[1]}
+        end
+    end
+end
+return nil
+"""
+
+
+def _timestamp(when: datetime) -> float:
+    return (when - datetime(1970, 1, 1)).total_seconds()
 
 
 class RedisTasksManager(TaskManager):
-    def __init__(self) -> None:
-        self.redis = Redis.from_url(settings.REDIS_URL)
+    """Jobs as ``jobs:{id}`` hashes; chunked results in ``jobs:{id}:chunks``.
+
+    Waiting job IDs sit in one sorted set per lane (``tasks:{lane}``) scored
+    by their ``run_at`` time.  Every job key carries an expiry, so Redis
+    itself drops old jobs.
+    """
+
+    def __init__(
+        self, redis: Optional[Redis] = None, ttl: Optional[float] = None, pending_ttl: Optional[float] = None
+    ) -> None:
+        self.redis = redis or Redis.from_url(settings.REDIS_URL)
+        self.ttl = int(settings.TASK_TTL if ttl is None else ttl)
+        self.pending_ttl = int(settings.TASK_PENDING_TTL if pending_ttl is None else pending_ttl)
+        self._claim = self.redis.register_script(CLAIM_SCRIPT)
+        super().__init__()
 
-    async def enqueue(self, payload: dict) -> JobResponse:
+    async def enqueue(
+        self,
+        payload: dict,
+        ttl: Optional[float] = None,
+        lane: str = "default",
+        delay: float = 0,
+        run_at: Optional[datetime] = None,
+        dedupe_key: Optional[str] = None,
+        every: Optional[float] = None,
+    ) -> JobResponse:
+        """Queue a job whose outcome is kept ``ttl`` seconds after it finishes.
+
+        With ``dedupe_key`` the ID of a job with that key still waiting is
+        returned instead of queuing another.
+        """
+        when = self._run_at(lane, delay, run_at)
         try:
             job_id = str(uuid.uuid4())
-            await self.redis.hset(f"jobs:{job_id}", mapping={"status": StatusEnum.PENDING.value})
-            await self.redis.lpush("tasks_queue", json.dumps({"job_id": job_id, "payload": payload}))
+            # keep the job until pending_ttl after it was due
+            expiry = self.pending_ttl + max(0, int(_timestamp(when) - _timestamp(datetime.utcnow())))
+            if dedupe_key:
+                claimed = await self.redis.set(f"tasks:dedupe:{dedupe_key}", job_id, nx=True, ex=expiry or None)
+                if not claimed:
+                    existing = await self.redis.get(f"tasks:dedupe:{dedupe_key}")
+                    return JobResponse(job_id=existing.decode() if existing else "", status=StatusEnum.PENDING)
+            key = f"jobs:{job_id}"
+            mapping = {
+                "status": StatusEnum.PENDING.value,
+                "payload": json.dumps(payload),
+                "lane": lane,
+                "run_at": when.isoformat(),
+            }
+            ttl = int(ttl) if ttl is not None else None
+            for name, value in (("ttl", ttl), ("dedupe_key", dedupe_key), ("every", every)):
+                if value is not None:
+                    mapping[name] = value
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=mapping)
+                if self.pending_ttl > 0:
+                    pipe.expire(key, expiry)
+                pipe.zadd(f"tasks:{lane}", {job_id: _timestamp(when)})
+                await pipe.execute()
             return JobResponse(job_id=job_id, status=StatusEnum.PENDING)
         except Exception as exc:  # pragma: no cover - network errors
             return JobResponse(job_id="", status=StatusEnum.FAILED, error=str(exc))
 
-    async def status(self, job_id: str) -> JobResponse:
+    async def claim(self) -> Optional[ClaimedJob]:
+        """Mark the next due job running and return it, or ``None``."""
+        now = datetime.utcnow()
+        while True:
+            found = await self._claim(keys=[f"tasks:{lane}" for lane in self.lanes.order()], args=[_timestamp(now)])
+            if not found:
+                return None
+            job_id = found[1].decode()
+            data = await self.redis.hgetall(f"jobs:{job_id}")
+            if b"payload" not in data:
+                # expired just after the script claimed it
+                continue
+            if self.pending_ttl > 0:
+                await self.redis.expire(f"jobs:{job_id}", self.pending_ttl)
+            fields = {k.decode(): v.decode() for k, v in data.items()}
+            if "every" in fields:
+                every = float(fields["every"])
+                await self.enqueue(
+                    json.loads(fields["payload"]),
+                    ttl=float(fields["ttl"]) if "ttl" in fields else None,
+                    lane=fields["lane"],
+                    run_at=next_run(datetime.fromisoformat(fields["run_at"]), every, now),
+                    dedupe_key=fields.get("dedupe_key"),
+                    every=every,
+                )
+            return ClaimedJob(job_id, json.loads(fields["payload"]), fields["lane"])
+
+    async def depth(self) -> int:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for lane in LANES:
+                pipe.zcard(f"tasks:{lane}")
+            return sum(await pipe.execute())
+
+    async def _finish(self, job_id: str, mapping: dict, chunks: list) -> bool:
+        key = f"jobs:{job_id}"
+        custom = await self.redis.hget(key, "ttl")
+        if custom is None and not await self.redis.exists(key):
+            return False
+        ttl = int(custom) if custom is not None else self.ttl
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(f"{key}:chunks")
+            pipe.hdel(key, "result", "error")
+            if chunks:
+                pipe.rpush(f"{key}:chunks", *chunks)
+            pipe.hset(key, mapping={**mapping, "chunks": len(chunks)})
+            for name in (key, f"{key}:chunks"):
+                if ttl > 0:
+                    pipe.expire(name, ttl)
+                else:
+                    pipe.persist(name)
+            await pipe.execute()
+        return True
+
+    async def complete(self, job_id: str, result: Any) -> bool:
+        """Store ``result`` and mark the job successful."""
+        inline, chunks = pack_result(result)
+        mapping = {"status": StatusEnum.SUCCESS.value}
+        if inline is not None:
+            mapping["result"] = inline
+        return await self._finish(job_id, mapping, chunks)
+
+    async def fail(self, job_id: str, error: str) -> bool:
+        return await self._finish(job_id, {"status": StatusEnum.FAILED.value, "error": error}, [])
+
+    async def fetch_result(self, job_id: str) -> Any:
+        """Load a result stored in chunks."""
+        chunks = await self.redis.lrange(f"jobs:{job_id}:chunks", 0, -1)
+        return unpack_result(chunks) if chunks else None
+
+    async def status(self, job_id: str, fetch_result: bool = True) -> JobResponse:
+        """Return the job state; large results are only loaded with ``fetch_result``."""
         try:
             data = await self.redis.hgetall(f"jobs:{job_id}")
             if not data:
@@ -34,11 +185,60 @@ class RedisTasksManager(TaskManager):
             status = StatusEnum(data.get(b"status").decode())
             result = data.get(b"result")
             error = data.get(b"error")
+            chunked = int(data.get(b"chunks") or 0) > 0
+            value = json.loads(result) if result else None
+            if chunked and fetch_result:
+                value = await self.fetch_result(job_id)
             return JobResponse(
                 job_id=job_id,
                 status=status,
-                result=json.loads(result) if result else None,
+                result=value,
                 error=error.decode() if error else None,
+                chunked=chunked,
             )
         except Exception as exc:  # pragma: no cover - network errors
             return JobResponse(job_id=job_id, status=StatusEnum.FAILED, error=str(exc))
+
+    async def _requeue_legacy(self) -> int:
+        """Move jobs from the old ``tasks_queue`` list into the default lane."""
+        entries = await self.redis.lrange("tasks_queue", 0, -1)
+        moved = 0
+        for entry in reversed(entries):  # the list was filled with LPUSH
+            job = json.loads(entry)
+            key = f"jobs:{job['job_id']}"
+            if await self.redis.hget(key, "status") != StatusEnum.PENDING.value.encode():
+                continue
+            now = datetime.utcnow()
+            await self.redis.hset(
+                key, mapping={"payload": json.dumps(job["payload"]), "lane": "default", "run_at": now.isoformat()}
+            )
+            await self.redis.zadd("tasks:default", {job["job_id"]: _timestamp(now)})
+            moved += 1
+        if entries:
+            await self.redis.delete("tasks_queue")
+        return moved
+
+    async def gc(self) -> int:
+        """Upgrade job keys written by older versions; return how many.
+
+        Keys without an expiry get one, and jobs still waiting in the old
+        ``tasks_queue`` list move to the ``default`` lane.
+        """
+        fixed = await self._requeue_legacy()
+        async for key in self.redis.scan_iter(match="jobs:*", count=500):
+            if await self.redis.ttl(key) != -1:
+                continue
+            name = key.decode() if isinstance(key, bytes) else key
+            job = name[: -len(":chunks")] if name.endswith(":chunks") else name
+            if await self.redis.hexists(job, "ttl"):
+                continue  # a per-job ttl, possibly "keep forever"
+            if job != name:
+                ttl = self.ttl
+            else:
+                status = await self.redis.hget(name, "status")
+                pending = status is None or status.decode() == StatusEnum.PENDING.value
+                ttl = self.pending_ttl if pending else self.ttl
+            if ttl > 0:
+                await self.redis.expire(name, ttl)
+                fixed += 1
+        return fixed
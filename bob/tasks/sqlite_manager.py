@@ -4,24 +4,31 @@
 
 from __future__ import annotations
 
-import asyncio
-import json
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Any, Optional
 
-from sqlalchemy import Column, DateTime, JSON, String, select
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy import Column, DateTime, Float, Index, Integer, JSON, LargeBinary, String, delete, func, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from ..metrics import instrument_engine
+from ..migrations import upgrade_database
 from ..models import JobResponse, StatusEnum
 from ..settings import settings
-from . import TaskManager
+from . import ClaimedJob, TaskManager, next_run, pack_result, unpack_result
 
 Base = declarative_base()
 
 
 class SQLiteTask(Base):
     __tablename__ = "bob_tasks"
+    __table_args__ = (
+        Index("ix_bob_tasks_claim", "status", "lane", "run_at"),
+        # one waiting job per key; claiming a job frees its key
+        Index("ux_bob_tasks_dedupe", "dedupe_key", unique=True, sqlite_where=text("status = 'PENDING'")),
+    )
 
     id = Column(String, primary_key=True, index=True)
     payload = Column(JSON)
@@ -30,44 +37,259 @@ class SQLiteTask(Base):
     error = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    ttl = Column(Float, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
+    result_chunks = Column(Integer, nullable=False, default=0)
+    lane = Column(String, nullable=False, default="default")
+    run_at = Column(DateTime, default=datetime.utcnow)
+    dedupe_key = Column(String, nullable=True)
+    every = Column(Float, nullable=True)
+
+
+class SQLiteTaskResult(Base):
+    """One chunk of a compressed result too large to keep inline."""
+
+    __tablename__ = "bob_task_results"
+
+    job_id = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
 
 
 engine = create_async_engine(settings.DATABASE_URL, echo=False)
+instrument_engine(engine)
 SessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
-async def _init_db() -> None:
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+class SingletonTasksManager(TaskManager):
+    """Jobs in the ``bob_tasks`` table of ``engine`` (default: the app database)."""
 
+    def __init__(
+        self,
+        engine: Optional[AsyncEngine] = None,
+        ttl: Optional[float] = None,
+        pending_ttl: Optional[float] = None,
+    ) -> None:
+        self.engine = engine or globals()["engine"]
+        self.session = SessionLocal if engine is None else sessionmaker(
+            engine, expire_on_commit=False, class_=AsyncSession
+        )
+        self.ttl = settings.TASK_TTL if ttl is None else ttl
+        self.pending_ttl = settings.TASK_PENDING_TTL if pending_ttl is None else pending_ttl
+        self._ready = False
+        super().__init__()
 
-asyncio.run(_init_db())
+    async def _init(self) -> None:
+        if not self._ready:
+            # the task tables are part of the versioned schema
+            await upgrade_database(self.engine)
+            self._ready = True
 
+    @staticmethod
+    def _expiry(seconds: float, start: Optional[datetime] = None) -> Optional[datetime]:
+        return (start or datetime.utcnow()) + timedelta(seconds=seconds) if seconds > 0 else None
 
-class SingletonTasksManager(TaskManager):
-    async def enqueue(self, payload: dict) -> JobResponse:
+    def _new_task(self, payload: dict, **fields) -> SQLiteTask:
+        return SQLiteTask(
+            id=str(uuid.uuid4()),
+            payload=payload,
+            status=StatusEnum.PENDING.value,
+            expires_at=self._expiry(self.pending_ttl, fields["run_at"]),
+            **fields,
+        )
+
+    async def _waiting(self, session: AsyncSession, dedupe_key: str) -> Optional[str]:
+        result = await session.execute(
+            select(SQLiteTask.id).where(
+                SQLiteTask.dedupe_key == dedupe_key, SQLiteTask.status == StatusEnum.PENDING.value
+            )
+        )
+        return result.scalar_one_or_none()
+
+    async def enqueue(
+        self,
+        payload: dict,
+        ttl: Optional[float] = None,
+        lane: str = "default",
+        delay: float = 0,
+        run_at: Optional[datetime] = None,
+        dedupe_key: Optional[str] = None,
+        every: Optional[float] = None,
+    ) -> JobResponse:
+        """Queue a job whose outcome is kept ``ttl`` seconds after it finishes.
+
+        With ``dedupe_key`` the ID of a job with that key still waiting is
+        returned instead of queuing another.
+        """
+        when = self._run_at(lane, delay, run_at)
         try:
-            job_id = str(uuid.uuid4())
-            async with SessionLocal() as session:
-                task = SQLiteTask(id=job_id, payload=payload, status=StatusEnum.PENDING.value)
+            await self._init()
+            task = self._new_task(
+                payload,
+                ttl=ttl,
+                lane=lane,
+                run_at=when,
+                dedupe_key=dedupe_key,
+                every=every,
+            )
+            async with self.session() as session:
+                existing = dedupe_key and await self._waiting(session, dedupe_key)
+                if existing:
+                    return JobResponse(job_id=existing, status=StatusEnum.PENDING)
                 session.add(task)
-                await session.commit()
-            return JobResponse(job_id=job_id, status=StatusEnum.PENDING)
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    # another worker queued the same key in between
+                    await session.rollback()
+                    return JobResponse(job_id=await self._waiting(session, dedupe_key), status=StatusEnum.PENDING)
+            return JobResponse(job_id=task.id, status=StatusEnum.PENDING)
         except Exception as exc:  # pragma: no cover
             return JobResponse(job_id="", status=StatusEnum.FAILED, error=str(exc))
 
-    async def status(self, job_id: str) -> JobResponse:
+    async def claim(self) -> Optional[ClaimedJob]:
+        """Mark the next due job running and return it, or ``None``."""
+        await self._init()
+        now = datetime.utcnow()
+        while True:
+            for lane in self.lanes.order():
+                async with self.session() as session:
+                    result = await session.execute(
+                        select(SQLiteTask)
+                        .where(
+                            SQLiteTask.status == StatusEnum.PENDING.value,
+                            SQLiteTask.lane == lane,
+                            SQLiteTask.run_at <= now,
+                        )
+                        .order_by(SQLiteTask.run_at)
+                        .limit(1)
+                    )
+                    task = result.scalar_one_or_none()
+                    if task is None:
+                        continue
+                    claimed = await session.execute(
+                        update(SQLiteTask)
+                        .where(SQLiteTask.id == task.id, SQLiteTask.status == StatusEnum.PENDING.value)
+                        .values(status=StatusEnum.RUNNING.value, expires_at=self._expiry(self.pending_ttl, now))
+                        .execution_options(synchronize_session=False)
+                    )
+                    if claimed.rowcount != 1:
+                        # taken by another worker; the lane may hold more
+                        break
+                    if task.every:
+                        session.add(
+                            self._new_task(
+                                task.payload,
+                                ttl=task.ttl,
+                                lane=task.lane,
+                                run_at=next_run(task.run_at, task.every, now),
+                                dedupe_key=task.dedupe_key,
+                                every=task.every,
+                            )
+                        )
+                    await session.commit()
+                return ClaimedJob(task.id, task.payload, task.lane)
+            else:
+                return None
+
+    async def depth(self) -> int:
+        await self._init()
+        async with self.session() as session:
+            result = await session.execute(
+                select(func.count()).select_from(SQLiteTask).where(SQLiteTask.status == StatusEnum.PENDING.value)
+            )
+            return result.scalar()
+
+    async def _finish(self, job_id: str, status: StatusEnum, result: Any = None, error: Optional[str] = None) -> bool:
+        await self._init()
+        inline, chunks = pack_result(result) if status is StatusEnum.SUCCESS else (None, [])
+        async with self.session() as session:
+            ttl = (await session.execute(select(SQLiteTask.ttl).where(SQLiteTask.id == job_id))).first()
+            if ttl is None:
+                return False
+            await session.execute(delete(SQLiteTaskResult).where(SQLiteTaskResult.job_id == job_id))
+            if chunks:
+                await session.execute(
+                    SQLiteTaskResult.__table__.insert(),
+                    [{"job_id": job_id, "seq": i, "data": chunk} for i, chunk in enumerate(chunks)],
+                )
+            await session.execute(
+                update(SQLiteTask)
+                .where(SQLiteTask.id == job_id)
+                .values(
+                    status=status.value,
+                    result=result if inline is not None else None,
+                    error=error,
+                    result_chunks=len(chunks),
+                    expires_at=self._expiry(self.ttl if ttl[0] is None else ttl[0]),
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            await session.commit()
+        return True
+
+    async def complete(self, job_id: str, result: Any) -> bool:
+        """Store ``result`` and mark the job successful."""
+        return await self._finish(job_id, StatusEnum.SUCCESS, result=result)
+
+    async def fail(self, job_id: str, error: str) -> bool:
+        return await self._finish(job_id, StatusEnum.FAILED, error=error)
+
+    async def fetch_result(self, job_id: str) -> Any:
+        """Load a result stored in chunks."""
+        await self._init()
+        async with self.session() as session:
+            rows = await session.execute(
+                select(SQLiteTaskResult.data).where(SQLiteTaskResult.job_id == job_id).order_by(SQLiteTaskResult.seq)
+            )
+            chunks = rows.scalars().all()
+        return unpack_result(chunks) if chunks else None
+
+    async def status(self, job_id: str, fetch_result: bool = True) -> JobResponse:
+        """Return the job state; large results are only loaded with ``fetch_result``."""
         try:
-            async with SessionLocal() as session:
+            await self._init()
+            async with self.session() as session:
                 result = await session.execute(select(SQLiteTask).where(SQLiteTask.id == job_id))
                 task = result.scalar_one_or_none()
-                if not task:
-                    return JobResponse(job_id=job_id, status=StatusEnum.FAILED, error="Job not found")
-                return JobResponse(
-                    job_id=task.id,
-                    status=StatusEnum(task.status),
-                    result=task.result,
-                    error=task.error,
-                )
+            if not task or (task.expires_at is not None and task.expires_at <= datetime.utcnow()):
+                return JobResponse(job_id=job_id, status=StatusEnum.FAILED, error="Job not found")
+            value = task.result
+            if task.result_chunks and fetch_result:
+                value = await self.fetch_result(job_id)
+            return JobResponse(
+                job_id=task.id,
+                status=StatusEnum(task.status),
+                result=value,
+                error=task.error,
+                chunked=bool(task.result_chunks),
+            )
         except Exception as exc:  # pragma: no cover
             return JobResponse(job_id=job_id, status=StatusEnum.FAILED, error=str(exc))
+
+    async def gc(self, now: Optional[datetime] = None, batch_size: int = 1000) -> int:
+        """Delete expired jobs and their result chunks in batches."""
+        await self._init()
+        now = now or datetime.utcnow()
+        removed = 0
+        while True:
+            async with self.session() as session:
+                ids = (
+                    await session.execute(
+                        select(SQLiteTask.id).where(SQLiteTask.expires_at <= now).limit(batch_size)
+                    )
+                ).scalars().all()
+                if ids:
+                    await session.execute(delete(SQLiteTaskResult).where(SQLiteTaskResult.job_id.in_(ids)))
+                    await session.execute(delete(SQLiteTask).where(SQLiteTask.id.in_(ids)))
+                else:
+                    # chunks whose job row is gone, e.g. after a crash mid-write
+                    await session.execute(
+                        delete(SQLiteTaskResult)
+                        .where(SQLiteTaskResult.job_id.not_in(select(SQLiteTask.id)))
+                        .execution_options(synchronize_session=False)
+                    )
+                await session.commit()
+            removed += len(ids)
+            if len(ids) < batch_size:
+                return removed
@@ -1,25 +1,36 @@
 """Token expansion pipeline for server-side components.
 
 Messages may contain ``[[component:name param=value]]`` tokens that are replaced
-with HTML generated by registered renderers.
+with HTML generated by registered renderers.  Renderers may be coroutines, so
+the application uses :func:`expand_tokens_async` and :func:`expand_many`;
+:func:`expand_tokens` is the synchronous variant for scripts and tests.
+:class:`StreamingExpander` expands tokens in a reply while it streams.
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
+from typing import Optional, Sequence
 
 import bleach
 from pydantic import ValidationError
 
-from .components import COMPONENTS, EmojiParams
+from .components import COMPONENTS
 
 logger = logging.getLogger(__name__)
 
+TOKEN_PREFIX = "[[component:"
 TOKEN_RE = re.compile(r"\[\[component:(?P<name>[a-z0-9_]+)(?P<params>[^\]]*)]]")
 
-ALLOWED_TAGS = ["img"]
-ALLOWED_ATTRS = {"img": ["src", "alt", "width", "height", "class"]}
+ALLOWED_TAGS = ["img", "svg", "use"]
+ALLOWED_ATTRS = {
+    "img": ["src", "alt", "width", "height", "class"],
+    "svg": ["width", "height", "role", "aria-label", "class"],
+    # the sanitizer only keeps same-document references such as "#emoji-x"
+    "use": ["href"],
+}
 
 
 def _parse_params(param_str: str) -> dict[str, str]:
@@ -33,27 +44,105 @@ def _parse_params(param_str: str) -> dict[str, str]:
     return params
 
 
-def expand_tokens(text: str) -> str:
+async def _render(name: str, params: dict[str, str]) -> str:
+    component = COMPONENTS.get(name)
+    if component is None:
+        return f"<code>⚠ Unknown component '{name}'</code>"
+    try:
+        html = await component(params)
+        return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS)
+    except ValidationError as exc:
+        return f"<code>⚠ {exc.errors()[0]['msg']}</code>"
+    except Exception as exc:  # pragma: no cover - unexpected errors
+        logger.exception("Component rendering failed")
+        return f"<code>⚠ {exc}</code>"
+
+
+async def expand_many(texts: Sequence[str]) -> list[str]:
+    """Expand component tokens in all ``texts``.
+
+    Identical tokens are rendered once and distinct tokens concurrently, so
+    a conversation costs one round of renderer I/O rather than one per token.
+    """
+
+    tokens: dict[str, re.Match[str]] = {}
+    for text in texts:
+        if "[[component:" in text:
+            for match in TOKEN_RE.finditer(text):
+                tokens.setdefault(match.group(0), match)
+    if not tokens:
+        return list(texts)
+
+    html = await asyncio.gather(
+        *(_render(m.group("name"), _parse_params(m.group("params"))) for m in tokens.values())
+    )
+    rendered = dict(zip(tokens, html))
+    return [TOKEN_RE.sub(lambda m: rendered[m.group(0)], text) for text in texts]
+
+
+async def expand_tokens_async(text: str) -> str:
     """Expand registered component tokens in the given text."""
 
-    def _replace(match: re.Match[str]) -> str:
-        name = match.group("name")
-        params_str = match.group("params")
-        params = _parse_params(params_str)
-        renderer = COMPONENTS.get(name)
-        if not renderer:
-            return f"<code>⚠ Unknown component '{name}'</code>"
-        try:
-            if name == "emoji":
-                model = EmojiParams(**params)
-                html = renderer(model)
-            else:
-                html = renderer(**params)
-            return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS)
-        except ValidationError as exc:
-            return f"<code>⚠ {exc.errors()[0]['msg']}</code>"
-        except Exception as exc:  # pragma: no cover - unexpected errors
-            logger.exception("Component rendering failed")
-            return f"<code>⚠ {exc}</code>"
-
-    return TOKEN_RE.sub(_replace, text)
+    return (await expand_many([text]))[0]
+
+
+def expand_tokens(text: str) -> str:
+    """Synchronous :func:`expand_tokens_async` for use outside an event loop."""
+
+    if "[[component:" not in text:
+        return text
+    return asyncio.run(expand_tokens_async(text))
+
+
+class StreamingExpander:
+    """Split a streamed reply into text and rendered components.
+
+    :meth:`feed` returns ``(event, data)`` pairs: ``(None, text)`` for plain
+    text and ``("component", html)`` for each completed token.  Text is
+    passed on as soon as it cannot start a token; only a possible token, at
+    most ``lookahead`` characters, is held back, so the work stays linear in
+    the length of the reply.
+    """
+
+    def __init__(self, lookahead: int = 256) -> None:
+        self.lookahead = lookahead
+        self._buffer = ""
+
+    async def feed(self, chunk: str) -> list[tuple[Optional[str], str]]:
+        buf = self._buffer + chunk
+        events: list[tuple[Optional[str], str]] = []
+        text_start = pos = 0
+        while True:
+            start = buf.find("[", pos)
+            if start < 0:
+                pos = len(buf)
+                break
+            head = buf[start : start + len(TOKEN_PREFIX)]
+            if not TOKEN_PREFIX.startswith(head):
+                pos = start + 1
+                continue
+            if len(head) < len(TOKEN_PREFIX):
+                pos = start  # the prefix may continue in the next chunk
+                break
+            match = TOKEN_RE.match(buf, start)
+            if match:
+                if start > text_start:
+                    events.append((None, buf[text_start:start]))
+                html = await _render(match.group("name"), _parse_params(match.group("params")))
+                events.append(("component", html))
+                text_start = pos = match.end()
+                continue
+            end = buf.find("]", start)
+            if (end < 0 or end == len(buf) - 1) and len(buf) - start <= self.lookahead:
+                pos = start  # an unfinished token
+                break
+            pos = start + 1
+        if pos > text_start:
+            events.append((None, buf[text_start:pos]))
+        self._buffer = buf[pos:]
+        return events
+
+    def flush(self) -> list[tuple[Optional[str], str]]:
+        """Return held-back text once the stream has ended."""
+        rest, self._buffer = self._buffer, ""
+        return [(None, rest)] if rest else []
@@ -0,0 +1,178 @@
+# Part of Bob: an AI-driven learning and productivity portal for individuals and organizations | Copyright (c) 2025 | License: MIT
+
+"""Process-wide pool of vector stores and embedding clients.
+
+Agents that point at the same ``vector_db_path`` with the same embedding
+configuration share one store, and stores using the same embedding
+configuration share one embedding client and its query batcher
+(:class:`~bob.embeddings.EmbeddingBatcher`).  :meth:`VectorStorePool.warm_up`
+opens every pooled store and runs a first query, so the index load and the
+connection to the embedding provider happen at startup instead of during the
+first user request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from time import perf_counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from .embeddings import EmbeddingBatcher
+from .metrics import CACHE_HITS, CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+
+def _openai_embeddings(api_key: Optional[str]):
+    from langchain.embeddings import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(openai_api_key=api_key)
+
+
+def _chroma(path: str, embeddings):
+    from langchain.vectorstores import Chroma
+
+    return Chroma(persist_directory=path, embedding_function=embeddings)
+
+
+#: Embedding client factories keyed by ``vector_db_embedding``
+EMBEDDINGS: Dict[str, Callable[[Optional[str]], Any]] = {"openai": _openai_embeddings}
+
+#: Store factories keyed by ``vector_db_type``
+STORES: Dict[str, Callable[[str, Any], Any]] = {"Chroma": _chroma}
+
+
+class StoreKey(NamedTuple):
+    db_type: str
+    path: str
+    embedding: str
+    api_key: Optional[str]
+
+
+class VectorStorePool:
+    """Vector stores and embedding clients shared by all agents of a process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stores: Dict[StoreKey, Any] = {}
+        self._embedders: Dict[tuple, Any] = {}
+        self._batchers: Dict[tuple, EmbeddingBatcher] = {}
+        self._state: Dict[StoreKey, str] = {}
+        self._documents: Dict[StoreKey, Optional[int]] = {}
+        self.warmed = False
+
+    def embedder(self, embedding: str, api_key: Optional[str]):
+        """Return the shared embedding client, or ``None`` if unavailable."""
+        key = (embedding, api_key)
+        with self._lock:
+            if key not in self._embedders:
+                factory = EMBEDDINGS.get(embedding)
+                if factory is None:  # pragma: no cover - unsupported embedding
+                    logger.warning("Unsupported vector_db_embedding %r", embedding)
+                    client = None
+                else:
+                    client = factory(api_key)
+                self._embedders[key] = client
+            return self._embedders[key]
+
+    def batcher(
+        self, embedding: str, api_key: Optional[str], max_batch: int = 64, window: float = 0.005
+    ) -> Optional[EmbeddingBatcher]:
+        """Return the shared batcher around the embedding client, if any."""
+        client = self.embedder(embedding, api_key)
+        if client is None:
+            return None
+        key = (embedding, api_key)
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = self._batchers[key] = EmbeddingBatcher(client, max_batch, window)
+            return batcher
+
+    def get(self, db_type: str, path: str, embedding: str = "openai", api_key: Optional[str] = None):
+        """Return the shared store for this configuration (may be ``None``).
+
+        ``None`` is returned, and not cached, when the store type is unknown
+        or its optional dependencies are missing.
+        """
+        factory = STORES.get(db_type)
+        if factory is None:
+            logger.warning("Unsupported vector_db_type %r", db_type)
+            return None
+        key = StoreKey(db_type, os.path.abspath(path), embedding, api_key)
+        with self._lock:
+            store = self._stores.get(key)
+        if store is not None:
+            CACHE_HITS.inc("vector_db")
+            return store
+        CACHE_MISSES.inc("vector_db")
+        try:
+            embeddings = self.embedder(embedding, api_key)
+            store = factory(path, embeddings)
+        except ImportError:  # pragma: no cover - optional deps
+            logger.debug("Dependencies for %s vector stores are not installed", db_type)
+            return None
+        with self._lock:
+            # another thread may have opened the same store meanwhile
+            store = self._stores.setdefault(key, store)
+            self._state.setdefault(key, "cold")
+        return store
+
+    def _warm(self, key: StoreKey, store) -> None:
+        self._state[key] = "warming"
+        start = perf_counter()
+        try:
+            collection = getattr(store, "_collection", None)
+            count = collection.count() if collection is not None else None
+            if count != 0:
+                # loads the index and opens the embedding client's connection
+                store.similarity_search("warm-up", k=1)
+        except Exception:
+            self._state[key] = "failed"
+            logger.exception("Warm-up of vector store %s failed", key.path)
+            return
+        self._documents[key] = count
+        self._state[key] = "ready"
+        logger.info(
+            "Vector store warm",
+            extra={"path": key.path, "documents": count, "seconds": round(perf_counter() - start, 3)},
+        )
+
+    async def warm_up(self) -> None:
+        """Open and query every pooled store concurrently in worker threads."""
+        with self._lock:
+            stores = list(self._stores.items())
+        try:
+            await asyncio.gather(*(asyncio.to_thread(self._warm, key, store) for key, store in stores))
+        finally:
+            self.warmed = True
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Describe each pooled store without exposing credentials."""
+        with self._lock:
+            keys = list(self._stores)
+        return [
+            {
+                "type": key.db_type,
+                "path": key.path,
+                "embedding": key.embedding,
+                "state": self._state.get(key, "cold"),
+                "documents": self._documents.get(key),
+            }
+            for key in keys
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stores.clear()
+            self._embedders.clear()
+            self._batchers.clear()
+            self._state.clear()
+            self._documents.clear()
+        self.warmed = False
+
+
+vector_stores = VectorStorePool()
@@ -2,13 +2,15 @@
 
 """FastAPI application wiring and route registration."""
 
+import asyncio
 import json
+import logging
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
 
 from fastapi import APIRouter, Depends, Form, Request, FastAPI
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession # Ensure AsyncSession is imported
 from sqlalchemy.future import select
@@ -17,30 +19,97 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.exceptions import RequestValidationError
 
 
-from .db import engine, Base
+from .agents import watch_config
+from .assets import EMOJI_SPRITE, AssetStaticFiles, manifest
+from .cache import cache
+from .db import engine
+from .log import RequestIdMiddleware, configure_logging, shutdown_logging
+from .metrics import CONTENT_TYPE, QUEUE_DEPTH, REGISTRY, MetricsMiddleware
+from .migrations import upgrade_database
 from .models import User
-from .shared import templates, HOME_PANELS, get_db, get_current_user # get_current_user is now a direct async function
+from .settings import settings
+from .tasks import TaskManager, get_task_manager
+from .vectorstores import vector_stores
+from .shared import templates, HOME_PANELS, get_db, get_current_user, precompile_templates # get_current_user is now a direct async function
+from .conversations.archive import archive_periodically
+from .conversations.prefetch import prefetcher
 from .conversations.routers import router as conversations_router
+from .conversations.middleware import stream_broker
+from .conversations.store import write_behind
+
+#: Whether this process runs periodic maintenance: archiving and the task
+#: sweeper.  The pre-fork server clears it in all workers but one.
+maintenance_enabled = True
+
+_task_manager: Optional[TaskManager] = None
+
+
+def task_manager() -> TaskManager:
+    """Return this process's task manager, created on first use."""
+    global _task_manager
+    if _task_manager is None:
+        _task_manager = get_task_manager()
+    return _task_manager
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("Lifespan start, attempting to create tables.")
+    configure_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_DEBUG_SAMPLE_RATE)
+    watcher = None
+    if settings.CONFIG_WATCH_INTERVAL > 0:
+        watcher = asyncio.create_task(watch_config(settings.CONFIG_WATCH_INTERVAL))
+    logger.info("Precompiled templates", extra={"count": precompile_templates()})
+    schema_ready = False
     try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        print("Tables should be created.")
-    except Exception as e:
-        print(f"Error during table creation: {e}")
+        old, new = await upgrade_database(engine)
+        logger.info("Database schema ready", extra={"from_version": old, "version": new})
+        schema_ready = True
+    except Exception:
+        logger.exception("Error during schema upgrade")
+    archiver = None
+    if settings.ARCHIVE_AFTER_DAYS > 0 and schema_ready and maintenance_enabled:
+        archiver = asyncio.create_task(archive_periodically(settings.ARCHIVE_INTERVAL, settings.ARCHIVE_AFTER_DAYS))
+    sweeper = None
+    if settings.TASK_GC_INTERVAL > 0 and schema_ready and maintenance_enabled:
+        sweeper = asyncio.create_task(task_manager().sweep_periodically(settings.TASK_GC_INTERVAL))
+    if settings.EMOJI_MODE == "sprite" and EMOJI_SPRITE not in manifest.load():
+        logger.warning("emoji_mode is 'sprite' but no sprite was built; run `bobbing assets build`")
+    if settings.MESSAGE_WRITE_BEHIND:
+        write_behind.start()
+    await cache.start()
+    warmer = None
+    if settings.VECTOR_WARMUP:
+        # agents registered their stores on import; /ready reports progress
+        warmer = asyncio.create_task(vector_stores.warm_up())
+    else:
+        vector_stores.warmed = True
     yield
-    print("Lifespan end, disposing engine.")
+    if warmer:
+        warmer.cancel()
+    if watcher:
+        watcher.cancel()
+    if archiver:
+        archiver.cancel()
+    if sweeper:
+        sweeper.cancel()
+    prefetcher.clear()
+    await cache.stop()
+    await stream_broker.close()
+    await write_behind.stop()
+    logger.info("Shutting down, disposing engine")
     await engine.dispose()
+    shutdown_logging()
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(SessionMiddleware, secret_key="change-me")
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", AssetStaticFiles(directory="static"), name="static")
 
 
 @app.exception_handler(StarletteHTTPException)
@@ -100,6 +169,29 @@ async def logout(request: Request):
     return RedirectResponse("/login")
 
 
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Expose process metrics in Prometheus text format to local scrapers."""
+    client = request.client.host if request.client else None
+    if not settings.METRICS_ENABLED or (
+        not settings.METRICS_ALLOW_REMOTE and client not in ("127.0.0.1", "::1", "localhost")
+    ):
+        raise StarletteHTTPException(status_code=404)
+    # counted in the shared store: jobs are queued and claimed by different processes
+    try:
+        QUEUE_DEPTH.set(await task_manager().depth(), settings.TASK_BACKEND)
+    except Exception:
+        logger.warning("Could not read the task queue depth", exc_info=True)
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once vector stores are warm, 503 before."""
+    body = {"ready": vector_stores.warmed, "vector_stores": vector_stores.status()}
+    return JSONResponse(body, status_code=200 if vector_stores.warmed else 503)
+
+
 @app.get("/debug", response_class=HTMLResponse)
 async def debug(request: Request, db: AsyncSession = Depends(get_db)):
     user = await get_current_user(request, db)
@@ -0,0 +1,133 @@
+"""Retrieval latency and recall benchmark for vector stores.
+
+A query set is a JSON lines file with one object per query::
+
+    {"query": "How do I reset my password?", "expected": ["docs/account.pdf"]}
+
+``expected`` lists the sources (as stored by ``bobbing vectordb add``, or
+just their file names) that a good answer should retrieve; queries without
+it only count towards latency.  Recall@k is the fraction of expected sources
+found among the ``k`` retrieved documents, averaged over those queries.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class BenchQuery:
+    query: str
+    expected: List[str] = field(default_factory=list)
+
+
+def load_queries(path: Path) -> List[BenchQuery]:
+    """Read a JSON lines query set; bare JSON strings are queries too."""
+    queries = []
+    with open(path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                queries.append(BenchQuery(record))
+            elif isinstance(record, dict) and "query" in record:
+                queries.append(BenchQuery(record["query"], [str(s) for s in record.get("expected", [])]))
+            else:
+                raise ValueError(f"line {lineno}: expected a query object or string")
+    return queries
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Return the nearest-rank ``pct`` percentile of ``samples``."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _sources(docs: List[Any]) -> set:
+    found = set()
+    for doc in docs:
+        source = (getattr(doc, "metadata", None) or {}).get("source")
+        if source:
+            found.add(str(source))
+            found.add(Path(str(source)).name)
+    return found
+
+
+async def run_bench(
+    store: Any, queries: List[BenchQuery], k: int = 4, concurrency: int = 4, repeat: int = 1
+) -> Dict[str, Any]:
+    """Run every query ``repeat`` times with ``concurrency`` in flight.
+
+    ``store`` needs a blocking ``similarity_search(query, k=k)``; searches
+    run in a thread pool sized to ``concurrency``.
+    """
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    recalls: List[float] = []
+    errors = 0
+
+    async def one(item: BenchQuery, first: bool) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                docs = await loop.run_in_executor(pool, lambda: store.similarity_search(item.query, k=k))
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+        if first and item.expected:
+            found = _sources(docs)
+            recalls.append(sum(1 for s in item.expected if s in found) / len(item.expected))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(item, rnd == 0) for rnd in range(repeat) for item in queries))
+        duration = time.perf_counter() - start
+
+    ms = [value * 1000 for value in latencies]
+    return {
+        "k": k,
+        "concurrency": concurrency,
+        "queries": len(queries) * repeat,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "qps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "mean": round(sum(ms) / len(ms), 2) if ms else 0.0,
+            "p50": round(percentile(ms, 50), 2),
+            "p95": round(percentile(ms, 95), 2),
+            "p99": round(percentile(ms, 99), 2),
+        },
+        "recall_at_k": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "recall_queries": len(recalls),
+    }
+
+
+def format_summary(result: Dict[str, Any], label: Optional[str] = None) -> str:
+    """One human readable line for ``result``."""
+    latency = result["latency_ms"]
+    recall = result["recall_at_k"]
+    parts = [
+        f"{result['queries']} queries",
+        f"{result['qps']} q/s",
+        f"p50 {latency['p50']} ms",
+        f"p95 {latency['p95']} ms",
+        f"recall@{result['k']} {'n/a' if recall is None else recall}",
+    ]
+    if result["errors"]:
+        parts.append(f"{result['errors']} errors")
+    return (f"[{label}] " if label else "") + ", ".join(parts)
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 from typing import Optional, List
 import typer
@@ -65,6 +66,14 @@ def _init_store(cfg: Config):
 app = typer.Typer(help="Admin utility for Bob")
 vectordb_app = typer.Typer(help="Manage vector databases")
 app.add_typer(vectordb_app, name="vectordb")
+assets_app = typer.Typer(help="Build static assets")
+app.add_typer(assets_app, name="assets")
+db_app = typer.Typer(help="Manage the application database")
+app.add_typer(db_app, name="db")
+conversations_app = typer.Typer(help="Export and import conversations")
+app.add_typer(conversations_app, name="conversations")
+tasks_app = typer.Typer(help="Manage background jobs")
+app.add_typer(tasks_app, name="tasks")
 
 
 @vectordb_app.command()
@@ -111,6 +120,7 @@ def add(
         cfg.db_dir = db_dir
     store = _init_store(cfg)
     texts = []
+    metadatas = []
     for p in files:
         ext = p.suffix.lower()
         text = None
@@ -147,7 +157,8 @@ def add(
             continue
         if text:
             texts.append(text)
-    store.add_texts(texts)
+            metadatas.append({"source": str(p)})
+    store.add_texts(texts, metadatas=metadatas)
     store.persist()
     typer.echo(f"Added {len(texts)} documents to {cfg.db_dir}")
 
@@ -166,3 +177,277 @@ def remove(
     store.delete(ids)
     store.persist()
     typer.echo(f"Removed {len(ids)} documents from {cfg.db_dir}")
+
+
+def _persist(store) -> None:
+    # Chroma before 0.4 only writes to disk on persist()
+    persist = getattr(store, "persist", None)
+    if persist is not None:
+        persist()
+
+
+@vectordb_app.command("export")
+def vectordb_export(
+    output: Path = typer.Argument(..., help="Snapshot file to write (.npz)"),
+    uncompressed: bool = typer.Option(False, help="Skip compression for faster export and import"),
+    db_dir: Optional[str] = typer.Option(None, help="Directory for the database"),
+    config: Optional[str] = typer.Option(None, "--config", "-c", help="Config file"),
+) -> None:
+    """Write embeddings, texts, IDs and metadata to a snapshot."""
+    from .snapshot import export_snapshot
+
+    cfg = load_config(config)
+    if db_dir:
+        cfg.db_dir = db_dir
+    store = _init_store(cfg)
+    count = export_snapshot(store._collection, output, compress=not uncompressed)
+    typer.echo(f"Exported {count} entries from {cfg.db_dir} to {output}")
+
+
+@vectordb_app.command("import")
+def vectordb_import(
+    snapshot: Path = typer.Argument(..., help="Snapshot written by vectordb export"),
+    db_dir: Optional[str] = typer.Option(None, help="Directory for the database"),
+    config: Optional[str] = typer.Option(None, "--config", "-c", help="Config file"),
+) -> None:
+    """Load a snapshot without re-embedding; existing IDs are replaced."""
+    from .snapshot import import_snapshot
+
+    cfg = load_config(config)
+    if db_dir:
+        cfg.db_dir = db_dir
+    store = _init_store(cfg)
+    count = import_snapshot(store._collection, snapshot)
+    _persist(store)
+    typer.echo(f"Imported {count} entries into {cfg.db_dir}")
+
+
+@vectordb_app.command("compact")
+def vectordb_compact(
+    keep_snapshot: Optional[Path] = typer.Option(None, help="Keep the intermediate snapshot here"),
+    db_dir: Optional[str] = typer.Option(None, help="Directory for the database"),
+    config: Optional[str] = typer.Option(None, "--config", "-c", help="Config file"),
+) -> None:
+    """Rebuild the collection from its live entries to drop deleted ones."""
+    from .snapshot import compact_collection, directory_size
+
+    cfg = load_config(config)
+    if db_dir:
+        cfg.db_dir = db_dir
+    store = _init_store(cfg)
+    before = directory_size(cfg.db_dir)
+    store._collection, count = compact_collection(store._client, store._collection, keep_snapshot)
+    _persist(store)
+    after = directory_size(cfg.db_dir)
+    typer.echo(f"Compacted {count} entries in {cfg.db_dir}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+
+@vectordb_app.command()
+def bench(
+    queries: Path = typer.Argument(..., help="JSON lines query set with optional expected sources"),
+    k: int = typer.Option(4, help="Documents retrieved per query"),
+    concurrency: int = typer.Option(4, help="Queries in flight at once"),
+    repeat: int = typer.Option(1, help="Run the query set this many times"),
+    output: Optional[Path] = typer.Option(None, "--output", "-o", help="Write the JSON result here"),
+    label: Optional[str] = typer.Option(None, help="Name of this run, stored in the result"),
+    agent: Optional[str] = typer.Option(None, help="Use the vector DB of this agent from bob-config.toml"),
+    db_dir: Optional[str] = typer.Option(None, help="Directory for the database"),
+    config: Optional[str] = typer.Option(None, "--config", "-c", help="Config file"),
+) -> None:
+    """Measure retrieval latency, throughput and recall@k."""
+    import asyncio
+    import json
+
+    from .bench import format_summary, load_queries, run_bench
+
+    if agent:
+        from bob.settings import settings
+
+        store = settings.get_vector_db(agent)
+        if store is None:
+            typer.echo(f"Agent {agent} has no usable vector database", err=True)
+            raise typer.Exit(1)
+        target = {"agent": agent, "db_dir": settings.get_agent_param(agent, "vector_db_path")}
+    else:
+        cfg = load_config(config)
+        if db_dir:
+            cfg.db_dir = db_dir
+        store = _init_store(cfg)
+        target = {"db_dir": cfg.db_dir}
+
+    result = asyncio.run(run_bench(store, load_queries(queries), k, concurrency, repeat))
+    result = {"label": label, **target, **result}
+    typer.echo(format_summary(result, label), err=True)
+    if output:
+        output.write_text(json.dumps(result, indent=2) + "\n")
+    else:
+        typer.echo(json.dumps(result, indent=2))
+
+
+@assets_app.command("build")
+def assets_build(
+    src: Path = typer.Option(Path("static"), help="Static source directory"),
+    dest: Optional[Path] = typer.Option(None, help="Output directory (default: SRC/dist)"),
+) -> None:
+    """Build content-hashed, precompressed assets and the emoji sprite."""
+    from bob.assets import build_assets, brotli
+
+    manifest = build_assets(src, dest)
+    typer.echo(f"Built {len(manifest)} assets into {dest or src / 'dist'}")
+    if brotli is None:
+        typer.echo("brotli is not installed; only gzip variants were written", err=True)
+
+
+def _run_db(database_url: Optional[str], func):
+    """Run ``func(engine)`` on an async engine for ``database_url``."""
+    import asyncio
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from bob.settings import settings
+
+    async def _run():
+        engine = create_async_engine(database_url or settings.DATABASE_URL)
+        try:
+            return await func(engine)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(_run())
+
+
+def _session(engine):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+
+    return sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)()
+
+
+DatabaseUrl = typer.Option(None, help="Database URL (default: from bob-config.toml)")
+
+
+@db_app.command("upgrade")
+def db_upgrade(database_url: Optional[str] = DatabaseUrl) -> None:
+    """Apply pending schema migrations."""
+    from bob.migrations import upgrade_database
+
+    old, new = _run_db(database_url, upgrade_database)
+    if old == new:
+        typer.echo(f"Database is up to date (version {new})")
+    else:
+        typer.echo(f"Upgraded database from version {old} to {new}")
+
+
+@db_app.command("archive")
+def db_archive(
+    older_than_days: float = typer.Option(..., help="Archive conversations idle for this many days"),
+    limit: Optional[int] = typer.Option(None, help="Archive at most this many conversations"),
+    database_url: Optional[str] = DatabaseUrl,
+) -> None:
+    """Move idle conversations into compressed archive blobs."""
+    from bob.conversations.archive import archive_idle
+
+    async def _archive(engine):
+        async with _session(engine) as session:
+            return await archive_idle(session, older_than_days, limit)
+
+    conversations, messages = _run_db(database_url, _archive)
+    typer.echo(f"Archived {conversations} conversations ({messages} messages)")
+
+
+@db_app.command("restore")
+def db_restore(
+    conversation_ids: List[int] = typer.Argument(None, help="Conversations to restore"),
+    all_: bool = typer.Option(False, "--all", help="Restore every archived conversation"),
+    database_url: Optional[str] = DatabaseUrl,
+) -> None:
+    """Move archived conversations back into the messages table."""
+    from sqlalchemy.future import select
+
+    from bob.conversations.archive import restore_conversation
+    from bob.models import ConversationArchive
+
+    if not conversation_ids and not all_:
+        typer.echo("Pass conversation IDs or --all", err=True)
+        raise typer.Exit(1)
+
+    async def _restore(engine):
+        async with _session(engine) as session:
+            ids = conversation_ids
+            if all_:
+                ids = (await session.execute(select(ConversationArchive.conversation_id))).scalars().all()
+            restored = 0
+            for conv_id in ids:
+                if await restore_conversation(session, conv_id) >= 0:
+                    restored += 1
+            return restored
+
+    typer.echo(f"Restored {_run_db(database_url, _restore)} conversations")
+
+
+@db_app.command("vacuum")
+def db_vacuum(database_url: Optional[str] = DatabaseUrl) -> None:
+    """Run VACUUM and ANALYZE to reclaim space and refresh statistics."""
+    from bob.conversations.archive import optimize
+
+    _run_db(database_url, optimize)
+    typer.echo("Database vacuumed and analyzed")
+
+
+@conversations_app.command("export")
+def conversations_export(
+    output: str = typer.Option("-", "--output", "-o", help="NDJSON file (.gz/.zst compress), - for stdout"),
+    user: Optional[str] = typer.Option(None, help="Only conversations of this username"),
+    since: Optional[datetime] = typer.Option(None, help="Only conversations created on or after this time"),
+    until: Optional[datetime] = typer.Option(None, help="Only conversations created before this time"),
+    database_url: Optional[str] = DatabaseUrl,
+) -> None:
+    """Stream conversations and their messages as NDJSON."""
+    from bob.conversations.transfer import export_conversations, open_ndjson
+
+    with open_ndjson(output, "w") as out:
+        conversations, messages = _run_db(
+            database_url, lambda engine: export_conversations(engine, out, user, since, until)
+        )
+    typer.echo(f"Exported {conversations} conversations ({messages} messages)", err=True)
+
+
+@conversations_app.command("import")
+def conversations_import(
+    source: str = typer.Argument(..., help="NDJSON file (.gz/.zst decompress), - for stdin"),
+    database_url: Optional[str] = DatabaseUrl,
+) -> None:
+    """Load conversations from an NDJSON export."""
+    from bob.conversations.transfer import import_conversations, open_ndjson
+
+    with open_ndjson(source, "r") as fh:
+        conversations, messages = _run_db(database_url, lambda engine: import_conversations(engine, fh))
+    typer.echo(f"Imported {conversations} conversations ({messages} messages)")
+
+
+@tasks_app.command("gc")
+def tasks_gc(
+    backend: Optional[str] = typer.Option(None, help="sqlite or redis (default: task_backend from bob-config.toml)"),
+    database_url: Optional[str] = DatabaseUrl,
+) -> None:
+    """Delete expired jobs and their stored results."""
+    import asyncio
+
+    from bob.settings import settings
+
+    if (backend or settings.TASK_BACKEND) == "redis":
+        from bob.tasks.redis_manager import RedisTasksManager
+
+        async def _gc_redis():
+            manager = RedisTasksManager()
+            try:
+                return await manager.gc()
+            finally:
+                await manager.redis.aclose()
+
+        typer.echo(f"Set an expiry on {asyncio.run(_gc_redis())} job keys")
+        return
+    from bob.tasks.sqlite_manager import SingletonTasksManager
+
+    removed = _run_db(database_url, lambda engine: SingletonTasksManager(engine).gc())
+    typer.echo(f"Removed {removed} expired jobs")
@@ -0,0 +1,172 @@
+"""Vector database snapshots that can be restored without re-embedding.
+
+A snapshot is a NumPy ``.npz`` archive with one column per field:
+
+``embeddings``
+    ``float32`` matrix, one row per entry.
+``ids``, ``documents``, ``metadatas``
+    UTF-8 strings (metadata as JSON) packed into one ``uint8`` buffer per
+    column, with an ``int64`` offsets array (``<name>_offsets``) marking
+    where each row ends.  ``documents_null`` and ``metadatas_null`` flag
+    missing values.
+``collection``
+    JSON with the collection name and metadata (such as ``hnsw:space``).
+
+Nothing is pickled, so loading a snapshot never executes code.  Entries are
+read from and written to the Chroma collection in large pages, and only live
+entries are exported, so :func:`compact_collection` rebuilds a collection
+without the space held by deleted entries.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+FORMAT_VERSION = 1
+#: Entries per ``get``/``add`` call; Chroma caps batches at a few thousand
+BATCH_SIZE = 4096
+
+
+def _pack(values: List[Optional[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    nulls = np.array([v is None for v in values], dtype=bool)
+    return data, offsets, nulls
+
+
+def _unpack(data: np.ndarray, offsets: np.ndarray, nulls: Optional[np.ndarray] = None) -> List[Optional[str]]:
+    raw = data.tobytes()
+    values: List[Optional[str]] = []
+    start = 0
+    for i, end in enumerate(offsets.tolist()):
+        values.append(None if nulls is not None and nulls[i] else raw[start:end].decode("utf-8"))
+        start = end
+    return values
+
+
+def _pages(collection: Any, page_size: int) -> Iterator[Dict[str, Any]]:
+    offset = 0
+    while True:
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset
+        )
+        if not page["ids"]:
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def export_snapshot(collection: Any, path: Path, page_size: int = BATCH_SIZE, compress: bool = True) -> int:
+    """Write every entry of ``collection`` to ``path``; return the count."""
+    ids: List[str] = []
+    documents: List[Optional[str]] = []
+    metadatas: List[Optional[str]] = []
+    blocks: List[np.ndarray] = []
+    for page in _pages(collection, page_size):
+        ids.extend(page["ids"])
+        documents.extend(page["documents"] or [None] * len(page["ids"]))
+        metadatas.extend(json.dumps(m, ensure_ascii=False) if m else None for m in (page["metadatas"] or [None] * len(page["ids"])))
+        blocks.append(np.asarray(page["embeddings"], dtype=np.float32))
+
+    embeddings = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+    columns: Dict[str, np.ndarray] = {"embeddings": embeddings}
+    for name, values in (("ids", ids), ("documents", documents), ("metadatas", metadatas)):
+        columns[name], columns[f"{name}_offsets"], nulls = _pack(values)
+        if name != "ids":
+            columns[f"{name}_null"] = nulls
+    info = {"version": FORMAT_VERSION, "name": collection.name, "metadata": collection.metadata}
+    columns["collection"] = np.frombuffer(json.dumps(info).encode("utf-8"), dtype=np.uint8)
+
+    save = np.savez_compressed if compress else np.savez
+    with open(path, "wb") as fh:  # savez would append .npz to a str path
+        save(fh, **columns)
+    return len(ids)
+
+
+def read_snapshot_info(path: Path) -> Dict[str, Any]:
+    """Return the collection name, metadata and entry count of ``path``."""
+    with np.load(path, allow_pickle=False) as snap:
+        info = json.loads(snap["collection"].tobytes())
+        info["count"] = len(snap["ids_offsets"])
+    return info
+
+
+def import_snapshot(collection: Any, path: Path, batch_size: int = BATCH_SIZE) -> int:
+    """Load ``path`` into ``collection``; existing IDs are overwritten."""
+    with np.load(path, allow_pickle=False) as snap:
+        info = json.loads(snap["collection"].tobytes())
+        if info.get("version", 0) > FORMAT_VERSION:
+            raise ValueError(f"{path} uses snapshot format {info['version']}, newer than supported")
+        ids = _unpack(snap["ids"], snap["ids_offsets"])
+        documents = _unpack(snap["documents"], snap["documents_offsets"], snap["documents_null"])
+        metadatas = [
+            json.loads(m) if m is not None else None
+            for m in _unpack(snap["metadatas"], snap["metadatas_offsets"], snap["metadatas_null"])
+        ]
+        embeddings = snap["embeddings"]
+
+    write = getattr(collection, "upsert", None) or collection.add
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        rows = range(start, end if end < len(ids) else len(ids))
+        # Chroma rejects batches that mix entries with and without metadata
+        with_meta = [i for i in rows if metadatas[i]]
+        without = [i for i in rows if not metadatas[i]]
+        for group, has_meta in ((with_meta, True), (without, False)):
+            if not group:
+                continue
+            write(
+                ids=[ids[i] for i in group],
+                embeddings=embeddings[group].tolist(),
+                documents=[documents[i] or "" for i in group],
+                metadatas=[metadatas[i] for i in group] if has_meta else None,
+            )
+    return len(ids)
+
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of the files below ``path``."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def compact_collection(client: Any, collection: Any, keep: Optional[Path] = None) -> Tuple[Any, int]:
+    """Rebuild ``collection`` from its live entries.
+
+    The entries are first written to a snapshot (``keep``, or a temporary
+    file removed afterwards), then the collection is dropped, recreated with
+    the same metadata and loaded from the snapshot.  If loading fails the
+    snapshot is kept and its path is in the raised error.  Returns the new
+    collection and the number of entries.
+    """
+
+    if keep is None:
+        fd, tmp = tempfile.mkstemp(suffix=".npz")
+        os.close(fd)
+        path = Path(tmp)
+    else:
+        path = keep
+    count = export_snapshot(collection, path, compress=False)
+    name, metadata = collection.name, collection.metadata
+    client.delete_collection(name)
+    try:
+        fresh = client.create_collection(name, metadata=metadata)
+        import_snapshot(fresh, path)
+    except Exception as exc:
+        raise RuntimeError(f"Rebuilding {name} failed; restore it with: bobbing vectordb import {path}") from exc
+    if keep is None:
+        path.unlink()
+    return fresh, count
@@ -19,23 +19,63 @@ function startStream(convId, msgId, agent) {
   container.appendChild(wrapper);
   const textSpan = wrapper.querySelector('.bob-text');
   const source = new EventSource(`/${convId}/stream?user_msg_id=${msgId}&agent=${agent}`);
-  let fullText = '';
+  // Text since the last component is re-parsed as it grows; components
+  // arrive rendered and sanitized and are appended once, so earlier parts of
+  // the reply are never rendered again.
+  let segment = null;
+  let segmentText = '';
   source.onmessage = (event) => {
     if (event.data === '[DONE]') {
       source.close();
     } else {
-      fullText += event.data;
-      textSpan.innerHTML = marked.parse(fullText);
+      if (!segment) {
+        segment = document.createElement('div');
+        segment.className = 'bob-segment';
+        textSpan.appendChild(segment);
+        segmentText = '';
+      }
+      segmentText += event.data;
+      segment.innerHTML = marked.parse(segmentText);
     }
   };
+  // After a reconnect the server replays missed events by Last-Event-ID, or
+  // sends the whole reply so far when they are no longer buffered.
+  source.addEventListener('reset', (event) => {
+    textSpan.innerHTML = '';
+    segment = document.createElement('div');
+    segment.className = 'bob-segment';
+    textSpan.appendChild(segment);
+    segmentText = event.data;
+    segment.innerHTML = marked.parse(segmentText);
+  });
+  source.addEventListener('component', (event) => {
+    const holder = document.createElement('span');
+    holder.className = 'bob-component';
+    holder.innerHTML = event.data;
+    textSpan.appendChild(holder);
+    segment = null;
+  });
+  source.addEventListener('notice', (event) => {
+    textSpan.textContent = event.data;
+  });
 }
 
 document.addEventListener('DOMContentLoaded', function() {
   document.querySelectorAll('.markdown-body').forEach(el => {
     el.innerHTML = marked.parse(el.textContent);
   });
+  loadEmojiSprite();
 });
 
+// In sprite mode emoji are <use href="#emoji-NAME"> references; fetch the
+// sprite once (it is cached as immutable) and inline its symbols.
+async function loadEmojiSprite() {
+  const holder = document.getElementById('emoji-sprite');
+  if (!holder || !holder.dataset.src) return;
+  const resp = await fetch(holder.dataset.src);
+  if (resp.ok) holder.innerHTML = await resp.text();
+}
+
 function openRenameModal(convId, currentTitle) {
   const modal = document.getElementById('rename-modal');
   const input = document.getElementById('rename-input');
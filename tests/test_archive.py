@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from bob.conversations.archive import archive_conversation, archive_idle, compress, decompress, optimize, restore_conversation
+from bob.conversations.middleware import get_conversation
+from bob.conversations.store import add_user_message, load_context
+from bob.migrations import upgrade_database
+from bob.models import User, Conversation, ConversationArchive, Message
+
+
+async def _setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'archive.db'}")
+    await upgrade_database(engine)
+    async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    old = datetime.utcnow() - timedelta(days=400)
+    async with async_session() as session:
+        user = User(name="u", username="u", password="pw")
+        session.add(user)
+        await session.flush()
+        idle = Conversation(title="idle", user_id=user.id, created_at=old, last_message_at=old)
+        fresh = Conversation(title="fresh", user_id=user.id)
+        session.add_all([idle, fresh])
+        await session.flush()
+        session.add_all(
+            Message(conversation_id=idle.id, sender="user" if i % 2 == 0 else "bob", text=f"m{i}", created_at=old + timedelta(seconds=i))
+            for i in range(10)
+        )
+        session.add(Message(conversation_id=fresh.id, sender="user", text="hi"))
+        await session.commit()
+    return engine, async_session, user, idle, fresh
+
+
+def test_codec_roundtrip():
+    codec, blob = compress(b"hello" * 100)
+    assert decompress(codec, blob) == b"hello" * 100
+
+
+@pytest.mark.asyncio
+async def test_archive_and_transparent_restore(tmp_path):
+    engine, async_session, user, idle, fresh = await _setup(tmp_path)
+    async with async_session() as session:
+        assert await archive_idle(session, older_than_days=30) == (1, 10)
+        assert await archive_idle(session, older_than_days=30) == (0, 0)
+        remaining = (await session.execute(select(Message.conversation_id))).scalars().all()
+        assert remaining == [fresh.id]
+        stub = await session.get(Conversation, idle.id)
+        assert stub.archived_at is not None and stub.title == "idle"
+
+    async with async_session() as session:
+        conv = await get_conversation(session, user, idle.id)
+        assert [m.text for m in conv.messages] == [f"m{i}" for i in range(10)]
+        assert conv.archived_at is None
+        assert (await session.execute(select(func.count()).select_from(ConversationArchive))).scalar() == 0
+
+    await optimize(engine)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reply_to_archived_conversation_restores_history(tmp_path):
+    engine, async_session, user, idle, fresh = await _setup(tmp_path)
+    async with async_session() as session:
+        await archive_idle(session, older_than_days=30)
+        msg = await add_user_message(session, user.id, idle.id, "back again")
+        history = await load_context(session, user.id, idle.id, msg.id, limit=20)
+    assert len(history) == 11
+    assert history[0].text == "m0" and history[-1].text == "back again"
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_restore_after_newer_message_keeps_ids_unique(tmp_path):
+    engine, async_session, user, idle, fresh = await _setup(tmp_path)
+    async with async_session() as session:
+        # fresh holds the highest message ID when it is archived
+        assert await archive_conversation(session, fresh.id) == 1
+        posted = await add_user_message(session, user.id, idle.id, "newer")
+        assert posted.id > 11
+        conv = await get_conversation(session, user, fresh.id)
+    assert [(m.id, m.text) for m in conv.messages] == [(11, "hi")]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_restores_both_succeed(tmp_path):
+    engine, async_session, user, idle, fresh = await _setup(tmp_path)
+    async with async_session() as session:
+        await archive_idle(session, older_than_days=30)
+
+    async with async_session() as first, async_session() as second:
+        # the second request has read the archive before the first restores it
+        stale = await second.get(ConversationArchive, idle.id)
+        assert await restore_conversation(first, idle.id) == 10
+        assert await restore_conversation(second, idle.id) == 0
+        conv = await get_conversation(second, user, idle.id)
+    assert [m.text for m in conv.messages] == [f"m{i}" for i in range(10)]
+    await engine.dispose()
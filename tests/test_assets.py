@@ -0,0 +1,63 @@
+import gzip
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from bob import components
+from bob.assets import AssetManifest, AssetStaticFiles, build_assets
+from bob.token_expander import expand_tokens
+
+SVG = '<svg xmlns="http://www.w3.org/2000/svg" width="32" height="32"><defs><linearGradient id="a"/></defs><path fill="url(#a)"/></svg>'
+
+
+def _static(tmp_path):
+    src = tmp_path / "static"
+    (src / "emoji").mkdir(parents=True)
+    (src / "app.js").write_text("console.log('hi');" * 50)
+    (src / "emoji" / "smile.svg").write_text(SVG)
+    return src
+
+
+def test_build_writes_hashed_files_and_sprite(tmp_path):
+    src = _static(tmp_path)
+    manifest = build_assets(src)
+
+    hashed = manifest["app.js"]
+    assert hashed.startswith("app.") and hashed != "app.js"
+    dist = src / "dist"
+    assert gzip.decompress((dist / (hashed + ".gz")).read_bytes()) == (src / "app.js").read_bytes()
+    assert json.loads((dist / "manifest.json").read_text()) == manifest
+
+    sprite = (dist / manifest["emoji/sprite.svg"]).read_text()
+    assert '<symbol id="emoji-smile" viewBox="0 0 32 32">' in sprite
+    assert 'id="smile-a"' in sprite and "url(#smile-a)" in sprite
+
+    urls = AssetManifest(src)
+    assert urls.url("app.js") == f"/static/dist/{hashed}"
+    assert urls.url("missing.png") == "/static/missing.png"
+
+
+def test_static_files_negotiate_encoding(tmp_path):
+    src = _static(tmp_path)
+    hashed = build_assets(src)["app.js"]
+    app = FastAPI()
+    app.mount("/static", AssetStaticFiles(directory=str(src)), name="static")
+    client = TestClient(app)
+
+    resp = client.get(f"/static/dist/{hashed}", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["cache-control"].endswith("immutable")
+    assert resp.headers["content-type"].startswith(("application/javascript", "text/javascript"))
+    assert resp.text == (src / "app.js").read_text()
+
+    resp = client.get(f"/static/dist/{hashed}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    assert "cache-control" not in client.get("/static/app.js").headers
+
+
+def test_sprite_mode_references_symbol(monkeypatch):
+    monkeypatch.setattr(components.settings, "EMOJI_MODE", "sprite")
+    html = expand_tokens("[[component:emoji name=thumbs_up]]")
+    assert '<use href="#emoji-thumbs_up"></use>' in html
+    assert "<img" not in html
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from bob.conversations.broker import LocalReplyLog, StreamBroker
+
+KEY = (1, 10)
+
+
+class Source:
+    """A reply of ``n`` chunks that records how far it got."""
+
+    def __init__(self, n=5, delay=0.005):
+        self.n = n
+        self.delay = delay
+        self.produced = 0
+        self.starts = 0
+        self.cancelled = False
+
+    async def start(self):
+        self.starts += 1
+        return self.events()
+
+    async def events(self):
+        try:
+            for i in range(self.n):
+                await asyncio.sleep(self.delay)
+                self.produced += 1
+                yield None, f"c{i} "
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(events, limit=None):
+    seen = []
+    async for event in events:
+        seen.append(event)
+        if limit and len(seen) == limit:
+            break
+    return seen
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_one_producer():
+    broker = StreamBroker(linger=0)
+    source = Source()
+    first, second, other = await asyncio.gather(
+        collect(broker.subscribe(KEY, 1, source.start)),
+        collect(broker.subscribe(KEY, 1, source.start)),
+        collect(broker.subscribe(KEY, 2, source.start)),
+    )
+    assert source.starts == 1
+    assert [e.data for e in first] == [e.data for e in second] == [f"c{i} " for i in range(5)]
+    assert [e.seq for e in first] == [1, 2, 3, 4, 5]
+    # other users never see the reply
+    assert other == []
+
+
+@pytest.mark.asyncio
+async def test_reconnect_resumes_after_last_event_id():
+    broker = StreamBroker(linger=1)
+    source = Source(n=8)
+    events = broker.subscribe(KEY, 1, source.start)
+    head = await collect(events, limit=3)
+    await events.aclose()
+    assert await broker.active(KEY[0]) == KEY[1]
+
+    tail = await collect(broker.subscribe(KEY, 1, source.start, last_event_id=head[-1].seq))
+    assert [e.seq for e in tail] == [4, 5, 6, 7, 8]
+    assert source.starts == 1 and not source.cancelled
+    assert await broker.active(KEY[0]) is None
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_gets_reset_when_buffer_moved_on():
+    broker = StreamBroker(LocalReplyLog(buffer_size=4), linger=1)
+    source = Source(n=10, delay=0)
+    await collect(broker.subscribe(KEY, 1, source.start))
+
+    # the reply is finished but still retained for a moment
+    replay = await collect(broker.subscribe(KEY, 1, source.start, last_event_id=2))
+    assert replay[0].event == "reset"
+    assert replay[0].data == "".join(f"c{i} " for i in range(10))
+    assert replay[1:] == []
+    await broker.close()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_reply_is_cancelled_after_linger():
+    broker = StreamBroker(linger=0.05, poll=0.01)
+    source = Source(n=1000)
+    events = broker.subscribe(KEY, 1, source.start)
+    await collect(events, limit=1)
+    await events.aclose()
+    await asyncio.sleep(0.15)
+    assert source.cancelled and source.produced < 1000
+    assert await broker.active(KEY[0]) is None
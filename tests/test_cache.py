@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from bob.cache import LocalBackend, TieredCache, dumps, loads
+
+
+def test_serialization_is_compact_and_round_trips():
+    value = {"title": "x" * 5000, "ids": [1, 2, 3], "pair": (None, 1.5)}
+    data = dumps(value)
+    assert data[:1] == b"z" and len(data) < 200
+    assert loads(data) == value
+    assert dumps("short")[:1] == b"m"
+    with pytest.raises(ValueError):
+        dumps(object())
+
+
+@pytest_asyncio.fixture
+async def workers():
+    backend = LocalBackend()
+    a, b = TieredCache(backend), TieredCache(backend)
+    await a.start()
+    await b.start()
+    yield a, b
+    await a.stop()
+    await b.stop()
+
+
+@pytest.mark.asyncio
+async def test_values_are_shared_through_l2(workers):
+    a, b = workers
+    await a.set("fragment:1", ("sidebar", None), "<ul></ul>")
+    assert await b.get("fragment:1", ("sidebar", None)) == "<ul></ul>"
+    assert await b.get("fragment:2", ("sidebar", None)) is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(workers):
+    a, b = workers
+    await a.set("fragment:1", "sidebar", "old")
+    assert await b.get("fragment:1", "sidebar") == "old"  # now in b's L1
+
+    await a.invalidate("fragment:1")
+    await asyncio.sleep(0)  # deliver the broadcast
+    assert await b.get("fragment:1", "sidebar") is None
+    assert await a.get("fragment:1", "sidebar") is None
+
+    await b.set("component:x", "k", "v")
+    assert await a.get("component:x", "k") == "v"
+    await b.delete("component:x", "k")
+    await asyncio.sleep(0)
+    assert await a.get("component:x", "k") is None
+
+
+@pytest.mark.asyncio
+async def test_single_flight_across_callers_and_workers(workers):
+    a, b = workers
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    results = await asyncio.gather(
+        *(a.get_or_set("component:slow", "k", compute) for _ in range(10)),
+        *(b.get_or_set("component:slow", "k", compute) for _ in range(10)),
+    )
+    assert results == ["value"] * 20
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_errors():
+    cache = TieredCache(LocalBackend())
+    await cache.set("ns", "k", 1, ttl=0.02)
+    await asyncio.sleep(0.03)
+    assert await cache.get("ns", "k") is None
+
+    async def boom():
+        raise RuntimeError("render failed")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_set("ns", "k", boom)
+    assert await cache.get_or_set("ns", "k", lambda: 2) == 2
+
+
+@pytest.mark.asyncio
+async def test_undecodable_l2_entries_are_recomputed():
+    backend = LocalBackend()
+    cache = TieredCache(backend)
+    bad = ["z not zlib", "x unknown tag", "m\xff\x00"]
+    for i, garbage in enumerate(bad):
+        await backend.set(await cache._key("ns", i), garbage.encode("latin-1"))
+    assert await cache.get("ns", 0) is None
+    assert await cache.get_or_set("ns", 1, lambda: "fresh") == "fresh"
+    assert await cache.get_or_set("ns", 2, lambda: "fresh") == "fresh"
+
+    assert await backend.get(await cache._key("ns", 0)) is None
+    assert loads(await backend.get(await cache._key("ns", 1))) == "fresh"
+
+
+class BrokenBackend(LocalBackend):
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+    async def set(self, key, data, ttl=None):
+        raise ConnectionError("redis is down")
+
+
+@pytest.mark.asyncio
+async def test_backend_failures_fall_back_to_l1():
+    cache = TieredCache(BrokenBackend())
+    assert await cache.get_or_set("ns", "k", lambda: "computed") == "computed"
+    assert await cache.get("ns", "k") == "computed"
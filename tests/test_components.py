@@ -1,6 +1,14 @@
+import asyncio
 import re
+import time
 
-from bob.token_expander import expand_tokens
+import pytest
+from pydantic import BaseModel
+
+from bob import components
+from bob.cache import TieredCache
+from bob.components import COMPONENTS, Component
+from bob.token_expander import StreamingExpander, expand_many, expand_tokens, expand_tokens_async
 
 
 def test_happy_path():
@@ -17,3 +25,74 @@ def test_unknown_component():
 def test_schema_failure():
     html = expand_tokens("[[component:emoji name=ok size=9999]]")
     assert "⚠" in html
+
+
+def test_params_model_validates_pattern():
+    html = expand_tokens("[[component:emoji name=Bad!]]")
+    assert "⚠" in html and "<img" not in html
+
+
+class WordParams(BaseModel):
+    word: str
+
+
+@pytest.fixture
+def slow_component(monkeypatch):
+    calls = []
+
+    async def render(params):
+        calls.append(params.word)
+        await asyncio.sleep(0.1)
+        return f'<img alt="{params.word}">'
+
+    monkeypatch.setattr(components, "cache", TieredCache())
+    monkeypatch.setitem(COMPONENTS, "slow", Component("slow", render, WordParams, ttl=60))
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_async_components_render_concurrently_once(slow_component):
+    texts = ["[[component:slow word=a]] [[component:slow word=b]]", "[[component:slow word=a]]", "plain"]
+    start = time.perf_counter()
+    html = await expand_many(texts)
+    assert time.perf_counter() - start < 0.18
+    assert html == ['<img alt="a"> <img alt="b">', '<img alt="a">', "plain"]
+    assert sorted(slow_component) == ["a", "b"]
+
+    # served from the component's TTL cache
+    assert await expand_tokens_async("[[component:slow word=b]]") == '<img alt="b">'
+    assert sorted(slow_component) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_components_without_params_reject_unknown_ones(monkeypatch):
+    monkeypatch.setitem(COMPONENTS, "rule", Component("rule", lambda params: "<hr>"))
+    assert "⚠" in await expand_tokens_async("[[component:rule width=3]]")
+
+
+async def stream_through(text, size, lookahead=256):
+    expander = StreamingExpander(lookahead)
+    events = []
+    for i in range(0, len(text), size):
+        events += await expander.feed(text[i : i + size])
+    return events + expander.flush()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+async def test_streaming_expander_handles_split_tokens(size):
+    text = "Hi [x] [[component:emoji name=thumbs_up]] and [[component:emoji name=Bad!]] end [[comp"
+    events = await stream_through(text, size)
+    components = [data for event, data in events if event == "component"]
+    assert len(components) == 2 and "thumbs_up.svg" in components[0] and "⚠" in components[1]
+    plain = "".join(data for event, data in events if event is None)
+    assert plain == "Hi [x]  and  end [[comp"
+
+
+@pytest.mark.asyncio
+async def test_streaming_expander_sends_text_without_waiting():
+    expander = StreamingExpander(lookahead=32)
+    assert await expander.feed("Hello [[component:emo") == [(None, "Hello ")]
+    assert await expander.feed("ji name=") == []
+    # an unterminated token longer than the lookahead is plain text after all
+    assert await expander.feed("x" * 40) == [(None, "[[component:emoji name=" + "x" * 40)]
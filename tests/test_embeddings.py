@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pytest
+
+from bob.embeddings import EmbeddingBatcher
+
+
+class FakeEmbeddings:
+    """Blocking embedder that costs ``latency`` seconds per call."""
+
+    def __init__(self, latency=0.02, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return [[float(len(t)), float(sum(map(ord, t)))] for t in texts]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_share_one_call():
+    fake = FakeEmbeddings()
+    batcher = EmbeddingBatcher(fake, max_batch=64, window=0.01)
+    texts = [f"question {i}" for i in range(50)] + ["question 1"]
+    start = time.perf_counter()
+    vectors = await asyncio.gather(*(batcher.embed(t) for t in texts))
+    elapsed = time.perf_counter() - start
+
+    assert vectors == fake.embed_documents(texts)
+    assert len(fake.calls) == 2  # one batch plus the reference call above
+    assert len(fake.calls[0]) == 50  # the duplicate was embedded once
+    assert elapsed < 50 * fake.latency / 4
+
+
+@pytest.mark.asyncio
+async def test_full_batches_are_sent_without_waiting():
+    fake = FakeEmbeddings(latency=0)
+    batcher = EmbeddingBatcher(fake, max_batch=8, window=10)
+    await asyncio.wait_for(asyncio.gather(*(batcher.embed(str(i)) for i in range(16))), 1)
+    assert [len(call) for call in fake.calls] == [8, 8]
+
+
+@pytest.mark.asyncio
+async def test_failures_reach_every_waiter():
+    batcher = EmbeddingBatcher(FakeEmbeddings(latency=0, fail=True), window=0.001)
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    # the batcher keeps working afterwards
+    batcher.embeddings.fail = False
+    assert await batcher.embed("ok") == [2.0, float(ord("o") + ord("k"))]
@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+import pytest
+
+from bob import agents
+from bob.agents import BaseAgent, FanoutAgent
+from bob.settings import Settings
+
+
+class DummyProvider:
+    def __init__(self, data):
+        self.data = data
+
+    def load(self, path):
+        return self.data
+
+
+class ScriptedAgent(BaseAgent):
+    """Waits ``delay`` seconds, then yields ``reply`` word by word."""
+
+    def __init__(self, agent_name):
+        config = agents.settings.get_agent_config(agent_name)
+        self.delay = config.get("delay", 0)
+        self.pause = config.get("pause", 0)
+        self.reply = config.get("reply", agent_name)
+        self.fail = config.get("fail", False)
+        self.closed = False
+
+    async def stream(self, messages):
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("provider error")
+            for word in self.reply.split():
+                yield word + " "
+                await asyncio.sleep(self.pause)
+        finally:
+            self.closed = True
+
+
+class EchoJudge(BaseAgent):
+    async def stream(self, messages):
+        yield messages[-1]["content"]
+
+
+def load(monkeypatch, fanout, **branches):
+    data = {"agents": {name: {"agent_type": "scripted", **cfg} for name, cfg in branches.items()}}
+    data["agents"]["judge"] = {"agent_type": "echojudge"}
+    data["agents"]["combo"] = {"agent_type": "fanout", **fanout}
+    monkeypatch.setitem(agents._AGENT_TYPES, "scripted", ScriptedAgent)
+    monkeypatch.setitem(agents._AGENT_TYPES, "echojudge", EchoJudge)
+    monkeypatch.setattr(agents, "settings", Settings(provider=DummyProvider(data), path="dummy"))
+    monkeypatch.setattr(agents, "_AGENT_INSTANCES", {})
+    monkeypatch.setattr(agents, "_SELECTOR_CHOICES", [])
+    agents.load_agents()
+    return agents.get_agent("combo")
+
+
+async def reply(agent):
+    return "".join([t async for t in agent.stream([{"role": "user", "content": "hi"}])])
+
+
+@pytest.mark.asyncio
+async def test_race_streams_first_branch_and_cancels_others(monkeypatch):
+    combo = load(
+        monkeypatch,
+        {"branches": ["fast", "slow"], "strategy": "race"},
+        fast={"delay": 0.01, "reply": "quick answer"},
+        slow={"delay": 1, "reply": "late answer"},
+    )
+    assert isinstance(combo, FanoutAgent)
+    start = time.perf_counter()
+    assert await reply(combo) == "quick answer "
+    assert time.perf_counter() - start < 0.5
+    assert agents.get_agent("slow").closed
+
+
+@pytest.mark.asyncio
+async def test_first_waits_for_a_complete_reply(monkeypatch):
+    branches = dict(
+        chatty={"delay": 0, "pause": 0.1, "reply": "one two three"},
+        steady={"delay": 0.05, "reply": "done"},
+    )
+    race = load(monkeypatch, {"branches": ["chatty", "steady"], "strategy": "race"}, **branches)
+    assert await reply(race) == "one two three "
+    first = load(monkeypatch, {"branches": ["chatty", "steady"], "strategy": "first"}, **branches)
+    assert await reply(first) == "done "
+
+
+@pytest.mark.asyncio
+async def test_failed_and_timed_out_branches_are_dropped(monkeypatch):
+    combo = load(
+        monkeypatch,
+        {"branches": ["broken", "stuck", "ok"], "strategy": "race", "branch_timeout": 0.2},
+        broken={"fail": True},
+        stuck={"delay": 5},
+        ok={"delay": 0.1, "reply": "fine"},
+    )
+    assert await reply(combo) == "fine "
+
+    combo = load(
+        monkeypatch,
+        {"branches": ["broken", "stuck"], "strategy": "first", "branch_timeout": 0.05},
+        broken={"fail": True},
+        stuck={"delay": 5},
+    )
+    with pytest.raises(RuntimeError, match="All branches"):
+        await reply(combo)
+
+
+@pytest.mark.asyncio
+async def test_judge_merges_all_answers(monkeypatch):
+    combo = load(
+        monkeypatch,
+        {"branches": ["a", "b", "c"], "strategy": "judge", "judge": "judge", "branch_timeout": 0.2},
+        a={"reply": "alpha"},
+        b={"delay": 0.05, "reply": "beta"},
+        c={"delay": 5},
+    )
+    merged = await reply(combo)
+    assert merged.startswith(FanoutAgent.JUDGE_PROMPT)
+    assert "Answer 1:\nalpha" in merged and "Answer 2:\nbeta" in merged
+    assert "Answer 3" not in merged
+
+
+def test_invalid_configuration_is_rejected(monkeypatch):
+    with pytest.raises(ValueError, match="cannot include itself"):
+        load(monkeypatch, {"branches": ["combo", "x"]}, x={})
+    with pytest.raises(ValueError, match="without a judge"):
+        load(monkeypatch, {"branches": ["x"], "strategy": "judge"}, x={})
+    with pytest.raises(ValueError, match="unknown agents: missing"):
+        load(monkeypatch, {"branches": ["x", "missing"]}, x={})
+    with pytest.raises(ValueError, match="unknown agents: nobody"):
+        load(monkeypatch, {"branches": ["x"], "strategy": "judge", "judge": "nobody"}, x={})
+    with pytest.raises(ValueError, match="cycle: inner -> combo -> inner"):
+        load(monkeypatch, {"branches": ["x", "inner"]}, x={}, inner={"agent_type": "fanout", "branches": ["combo"]})
+    with pytest.raises(ValueError, match="cycle: inner -> combo -> merge -> inner"):
+        load(
+            monkeypatch,
+            {"branches": ["x"], "strategy": "judge", "judge": "merge"},
+            x={},
+            inner={"agent_type": "fanout", "branches": ["combo"]},
+            merge={"agent_type": "fanout", "branches": ["inner"]},
+        )
@@ -0,0 +1,43 @@
+import pytest
+
+from bob.cache import TieredCache
+from bob.fragments import FragmentCache
+
+
+@pytest.mark.asyncio
+async def test_bump_invalidates_owner_only():
+    cache = FragmentCache(TieredCache(maxsize=8))
+    await cache.put(1, "sidebar", "<a>one</a>", None)
+    await cache.put(2, "sidebar", "<a>two</a>", None)
+    assert await cache.get(1, "sidebar", None) == "<a>one</a>"
+
+    await cache.bump(1)
+    assert await cache.get(1, "sidebar", None) is None
+    assert await cache.get(2, "sidebar", None) == "<a>two</a>"
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_disabled_cache():
+    cache = FragmentCache(TieredCache(maxsize=2))
+    for i in range(3):
+        await cache.put(i, "sidebar", f"<p>{i}</p>")
+    assert await cache.get(0, "sidebar") is None
+    assert await cache.get(2, "sidebar") == "<p>2</p>"
+
+    disabled = FragmentCache(TieredCache(), enabled=False)
+    await disabled.put(1, "sidebar", "<p>x</p>")
+    assert await disabled.get(1, "sidebar") is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_render_renders_once():
+    cache = FragmentCache(TieredCache())
+    calls = []
+
+    async def render():
+        calls.append(1)
+        return "<ul></ul>"
+
+    assert await cache.get_or_render(1, "sidebar", render) == "<ul></ul>"
+    assert await cache.get_or_render(1, "sidebar", render) == "<ul></ul>"
+    assert len(calls) == 1
@@ -0,0 +1,37 @@
+import io
+import json
+import logging
+
+from fastapi.testclient import TestClient
+
+from bob import web
+from bob.log import SamplingFilter, configure_logging, shutdown_logging
+
+
+def _record(lineno):
+    return logging.LogRecord("bob.test", logging.DEBUG, "x.py", lineno, "m", (), None)
+
+
+def test_sampling_filter_keeps_every_nth_debug_record():
+    sampler = SamplingFilter(0.25)
+    kept = [sampler.filter(_record(1)) for _ in range(8)]
+    assert kept == [True, False, False, False, True, False, False, False]
+    assert sampler.filter(_record(2))  # separate call site
+    warning = _record(1)
+    warning.levelno = logging.WARNING
+    assert sampler.filter(warning)
+
+
+def test_json_records_carry_request_id():
+    stream = io.StringIO()
+    configure_logging("DEBUG", "json", stream=stream)
+    try:
+        client = TestClient(web.app)
+        resp = client.get("/", headers={"X-Request-ID": "req-123"}, follow_redirects=False)
+        assert resp.headers["x-request-id"] == "req-123"
+    finally:
+        shutdown_logging()
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert records
+    assert {r["request_id"] for r in records} == {"req-123"}
+    assert any(r["msg"] == "db session opened" for r in records)
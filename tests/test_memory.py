@@ -32,3 +32,4 @@ async def test_get_history_limit():
         assert len(history) == HISTORY_LIMIT
         assert history[0].text == "m5"
         assert history[-1].text == "m24"
+    await engine.dispose()
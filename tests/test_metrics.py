@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+
+from bob import web
+from bob.metrics import Counter, Histogram, REGISTRY
+
+
+def test_histogram_render():
+    hist = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "/a")
+    hist.observe(0.5, "/a")
+    hist.observe(5.0, "/a")
+    text = hist.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{route="/a"} 3' in text
+
+
+def test_counter_labels():
+    counter = Counter("demo_total", "Demo.", ("cache",))
+    counter.inc("llm")
+    counter.inc("llm", amount=2)
+    assert counter.value("llm") == 3
+    assert 'demo_total{cache="llm"} 3' in counter.render()
+
+
+class FixedDepthTasks:
+    async def depth(self):
+        return 7
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(web.settings, "METRICS_ALLOW_REMOTE", True)
+    monkeypatch.setattr(web, "_task_manager", FixedDepthTasks())
+    client = TestClient(web.app)
+    client.get("/login")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'bob_request_duration_seconds_count{method="GET",route="/login"}' in resp.text
+    assert f'bob_task_queue_depth{{backend="{web.settings.TASK_BACKEND}"}} 7' in resp.text
+
+
+def test_metrics_endpoint_is_local_only(monkeypatch):
+    monkeypatch.setattr(web.settings, "METRICS_ALLOW_REMOTE", False)
+    client = TestClient(web.app)
+    assert client.get("/metrics").status_code == 404
+    assert "bob_active_streams" in REGISTRY.render()
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.future import select
+
+from bob.conversations.archive import compress
+from bob.migrations import LATEST, upgrade_database
+from bob.models import Conversation, Message
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, name VARCHAR, username VARCHAR, password VARCHAR)",
+    "CREATE TABLE conversations (id INTEGER PRIMARY KEY, title VARCHAR, created_at DATETIME, user_id INTEGER)",
+    "CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id INTEGER, sender VARCHAR, text TEXT, created_at DATETIME)",
+    "INSERT INTO users VALUES (1, 'u', 'u', 'pw')",
+    "INSERT INTO conversations VALUES (1, 't', '2025-01-01 00:00:00', 1)",
+    "INSERT INTO messages VALUES (1, 1, 'user', 'a', '2025-01-01 00:00:01')",
+    "INSERT INTO messages VALUES (2, 1, 'bob', 'b', '2025-01-01 00:00:02')",
+]
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.asyncio
+async def test_upgrade_backfills_legacy_database(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}")
+    async with engine.begin() as conn:
+        for stmt in LEGACY_SCHEMA:
+            await conn.execute(text(stmt))
+
+    assert await upgrade_database(engine) == (0, LATEST)
+    assert await upgrade_database(engine) == (LATEST, LATEST)
+    async with engine.connect() as conn:
+        row = (await conn.execute(text("SELECT message_count, last_message_at FROM conversations"))).one()
+        links = (await conn.execute(text("SELECT id, reply_to_id FROM messages ORDER BY id"))).all()
+        indexes = {r[1] for r in await conn.execute(text("PRAGMA index_list(messages)"))}
+        indexes |= {r[1] for r in await conn.execute(text("PRAGMA index_list(conversations)"))}
+    assert row == (2, "2025-01-01 00:00:02")
+    assert links == [(1, None), (2, 1)]
+    assert {"ix_messages_conversation_created", "ix_conversations_user_created"} <= indexes
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_hot_queries_use_indexes(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'plan.db'}")
+    await upgrade_database(engine)
+    hot_queries = {
+        "ix_messages_conversation_created": select(Message)
+        .where(Message.conversation_id == 1)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(20),
+        "ix_conversations_user_created": select(Conversation)
+        .where(Conversation.user_id == 1)
+        .order_by(Conversation.created_at.desc()),
+    }
+    async with engine.connect() as conn:
+        for index, query in hot_queries.items():
+            plan = " ".join(
+                row[-1] for row in await conn.execute(text("EXPLAIN QUERY PLAN " + _sql(query)))
+            )
+            assert f"USING INDEX {index}" in plan, plan
+            assert "TEMP B-TREE" not in plan, plan
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_upgrade_adds_task_columns_and_indexes(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(
+                "CREATE TABLE bob_tasks (id VARCHAR PRIMARY KEY, payload JSON, status VARCHAR, result JSON, "
+                "error VARCHAR, created_at DATETIME, updated_at DATETIME)"
+            )
+        )
+        await conn.execute(text("INSERT INTO bob_tasks VALUES ('a', '{}', 'PENDING', NULL, NULL, '2025-01-01 00:00:00', NULL)"))
+
+    await upgrade_database(engine)
+    async with engine.connect() as conn:
+        row = (await conn.execute(text("SELECT lane, run_at, result_chunks FROM bob_tasks"))).one()
+        indexes = {r[1] for r in await conn.execute(text("PRAGMA index_list(bob_tasks)"))}
+    assert row == ("default", "2025-01-01 00:00:00", 0)
+    assert {"ix_bob_tasks_claim", "ix_bob_tasks_expires_at", "ux_bob_tasks_dedupe"} <= indexes
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_message_ids_start_above_archived_ids(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ids.db'}")
+    async with engine.begin() as conn:
+        for stmt in LEGACY_SCHEMA:
+            await conn.execute(text(stmt))
+    # stop before the migration that rebuilds messages
+    await upgrade_database(engine, target=5)
+    _, blob = compress(b'[{"id": 7, "sender": "user", "text": "old", "created_at": "2024-01-01T00:00:00"}]')
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("INSERT INTO conversation_archives VALUES (1, :codec, :blob, 1, NULL)"),
+            {"codec": compress(b"")[0], "blob": blob},
+        )
+
+    await upgrade_database(engine)
+    async with engine.begin() as conn:
+        result = await conn.execute(text("INSERT INTO messages (conversation_id, sender) VALUES (1, 'user')"))
+        ddl = (await conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'messages'"))).scalar()
+        texts = (await conn.execute(text("SELECT text FROM messages ORDER BY id"))).scalars().all()
+    assert result.lastrowid == 8
+    assert "AUTOINCREMENT" in ddl and texts == ["a", "b", None]
+    await engine.dispose()
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from bob.agents import BaseAgent
+from bob.conversations import middleware
+from bob.conversations.prefetch import PromptPrefetcher
+from bob.models import Base, User, Conversation
+
+
+class RecordingAgent(BaseAgent):
+    def __init__(self):
+        self.prepared = []
+
+    async def prepare(self, messages):
+        self.prepared.append(messages[-1]["content"])
+        return messages + [{"role": "system", "content": "context"}]
+
+    async def stream(self, messages):
+        yield f"{len(messages)} messages"
+
+
+async def _answer():
+    return "ready"
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_matches_and_expires():
+    prefetcher = PromptPrefetcher(ttl=0.05)
+    prefetcher.start((1, 2), 7, "default", _answer())
+    assert prefetcher.take((1, 2), 8, "default") is None  # other user
+    prefetcher.start((1, 2), 7, "default", _answer())
+    assert await prefetcher.take((1, 2), 7, "default") == "ready"
+
+    prefetcher.start((1, 3), 7, "default", _answer())
+    await asyncio.sleep(0.1)
+    assert len(prefetcher) == 0
+    assert prefetcher.take((1, 3), 7, "default") is None
+
+
+@pytest.mark.asyncio
+async def test_stream_uses_prefetched_prompt(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'prefetch.db'}")
+    async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    agent = RecordingAgent()
+    monkeypatch.setattr(middleware, "SessionLocal", async_session)
+    monkeypatch.setattr(middleware, "get_agent", lambda name: agent)
+    monkeypatch.setattr(middleware, "prefetcher", PromptPrefetcher(ttl=5))
+    saved = []
+
+    async def fake_save_reply(conv_id, reply_to_id, text):
+        saved.append(text)
+
+    monkeypatch.setattr(middleware, "save_reply", fake_save_reply)
+
+    async with async_session() as session:
+        user = User(name="u", username="u", password="pw")
+        session.add(user)
+        await session.flush()
+        conv = Conversation(title="t", user_id=user.id)
+        session.add(conv)
+        await session.commit()
+
+        msg = await middleware.save_user_message(session, user, conv.id, "question")
+        middleware.prefetch_reply(user, conv.id, msg.id, "default")
+        await asyncio.sleep(0.05)
+        assert agent.prepared == ["question"]
+
+        events = [e async for e in middleware.stream_agent_response(session, user, conv.id, msg.id, "default")]
+    # persona + question + context, prepared exactly once
+    assert events == ["id: 1\ndata: 3 messages\n\n", "data: [DONE]\n\n"]
+    assert agent.prepared == ["question"]
+    assert saved == ["3 messages"]
+    await engine.dispose()
@@ -0,0 +1,89 @@
+import dataclasses
+import os
+
+import pytest
+
+from bob import agents
+from bob.settings import Settings
+
+CONFIG = """
+[global]
+shared_key = "from-global"
+
+[agents.foo]
+agent_type = "default"
+home_selector = "{label}"
+openai_api_key = "@shared_key"
+openai_model = "@BOB_TEST_MODEL"
+vector_db_path = "@undefined_variable"
+"""
+
+
+def _write(path, label, mtime):
+    path.write_text(CONFIG.format(label=label))
+    os.utime(path, (mtime, mtime))
+
+
+def test_resolved_config_is_immutable(tmp_path, monkeypatch):
+    monkeypatch.setenv("BOB_TEST_MODEL", "gpt-test")
+    cfg_path = tmp_path / "bob-config.toml"
+    _write(cfg_path, "Foo", 1_000_000)
+    s = Settings(path=str(cfg_path))
+
+    cfg = s.get_agent_config("foo")
+    assert cfg.get("openai_api_key") == "from-global"
+    assert s.get_agent_param("foo", "openai_model") == "gpt-test"
+    assert s.get_agent_param("foo", "vector_db_path", "chroma") == "chroma"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        cfg.id = "bar"
+    with pytest.raises(TypeError):
+        cfg.params["openai_model"] = "other"
+
+
+def test_reload_swaps_agent_registry(tmp_path, monkeypatch):
+    cfg_path = tmp_path / "bob-config.toml"
+    _write(cfg_path, "Foo", 1_000_000)
+    s = Settings(path=str(cfg_path))
+    monkeypatch.setattr(agents, "settings", s)
+    # load_agents rebinds these; restore the registry other tests see
+    monkeypatch.setattr(agents, "_AGENT_INSTANCES", agents._AGENT_INSTANCES)
+    monkeypatch.setattr(agents, "_SELECTOR_CHOICES", agents._SELECTOR_CHOICES)
+    agents.load_agents()
+    old = agents.get_agent("foo")
+
+    assert not s.reload_if_changed()
+    _write(cfg_path, "Renamed", 1_000_100)
+    assert s.reload_if_changed()
+    agents.load_agents()
+
+    assert agents.get_selector_choices() == [("foo", "Renamed")]
+    assert agents.get_agent("foo") is not old
+    # an in-flight stream keeps using the instance it already holds
+    assert isinstance(old, agents.DefaultAgent)
+
+
+def test_failed_reload_keeps_settings_and_agents(tmp_path, monkeypatch):
+    cfg_path = tmp_path / "bob-config.toml"
+    _write(cfg_path, "Foo", 1_000_000)
+    s = Settings(path=str(cfg_path))
+    monkeypatch.setattr(agents, "settings", s)
+    monkeypatch.setattr(agents, "_AGENT_INSTANCES", agents._AGENT_INSTANCES)
+    monkeypatch.setattr(agents, "_SELECTOR_CHOICES", agents._SELECTOR_CHOICES)
+    agents.load_agents()
+    old = agents.get_agent("foo")
+
+    cfg_path.write_text(
+        CONFIG.format(label="Broken")
+        + '\n[agents.combo]\nagent_type = "fanout"\nbranches = ["foo", "missing"]\n'
+    )
+    os.utime(cfg_path, (1_000_100, 1_000_100))
+    with pytest.raises(ValueError, match="missing"):
+        s.reload_if_changed(validate=agents.load_agents)
+
+    assert s.get_agent_names() == ["foo"]
+    assert s.get_agent_config("foo").home_selector == "Foo"
+    assert agents.get_selector_choices() == [("foo", "Foo")]
+    assert agents.get_agent("foo") is old
+    # the bad file was not recorded as loaded, so the next poll retries it
+    with pytest.raises(ValueError):
+        s.reload_if_changed(validate=agents.load_agents)
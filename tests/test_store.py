@@ -0,0 +1,154 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from bob.models import Base, User, Conversation, Message
+from bob.conversations import middleware
+from bob.conversations.broker import StreamBroker
+from bob.conversations.middleware import get_conversation, get_conversations, save_user_message
+from bob.conversations.store import WriteBehindQueue, add_user_message, load_context, load_reply
+from bob.conversations.views import ConversationView, MessageView
+
+
+async def _setup(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'store.db'}")
+    async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session() as session:
+        owner = User(name="o", username="owner", password="pw")
+        other = User(name="x", username="other", password="pw")
+        session.add_all([owner, other])
+        await session.flush()
+        conv = Conversation(title="t", user_id=owner.id)
+        session.add(conv)
+        await session.commit()
+    return engine, async_session, owner, other, conv
+
+
+@pytest.mark.asyncio
+async def test_add_user_message_checks_owner(tmp_path):
+    engine, async_session, owner, other, conv = await _setup(tmp_path)
+    async with async_session() as session:
+        assert await add_user_message(session, other.id, conv.id, "nope") is None
+        assert await add_user_message(session, owner.id, conv.id + 1, "nope") is None
+        msg = await add_user_message(session, owner.id, conv.id, "hello")
+        assert msg.id and msg.text == "hello"
+
+        stored = (await session.execute(select(Message))).scalars().all()
+        assert [(m.id, m.text, m.sender) for m in stored] == [(msg.id, "hello", "user")]
+        stats = (await session.execute(select(Conversation.message_count, Conversation.last_message_at))).one()
+        assert stats == (1, msg.created_at)
+
+        history = await load_context(session, owner.id, conv.id, msg.id, limit=20)
+        assert [h.text for h in history] == ["hello"]
+        assert await load_context(session, other.id, conv.id, msg.id, limit=20) is None
+        assert await load_context(session, owner.id, conv.id, msg.id + 1, limit=20) is None
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_batches_in_one_flush(tmp_path):
+    engine, async_session, owner, other, conv = await _setup(tmp_path)
+    writer = WriteBehindQueue(session_factory=async_session)
+    for i in range(5):
+        writer.add_message(conv.id, "bob", f"reply {i}")
+    assert await writer.flush() == 5
+    assert await writer.flush() == 0
+
+    async with async_session() as session:
+        texts = (await session.execute(select(Message.text).order_by(Message.id))).scalars().all()
+        assert texts == [f"reply {i}" for i in range(5)]
+        count = (await session.execute(select(Conversation.message_count))).scalar_one()
+        assert count == 5
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_read_paths_return_views_not_orm_objects(tmp_path):
+    engine, async_session, owner, other, conv = await _setup(tmp_path)
+    async with async_session() as session:
+        first = await save_user_message(session, owner, conv.id, "hi [[component:emoji name=wave]]")
+        assert isinstance(first, MessageView) and "wave.svg" in first.html
+        await add_user_message(session, owner.id, conv.id, "second")
+
+    async with async_session() as session:
+        listed = await get_conversations(session, owner)
+        view = await get_conversation(session, owner, conv.id)
+        assert await get_conversation(session, other, conv.id) is None
+        assert not session.identity_map
+    assert listed == [ConversationView(conv.id, "t", conv.created_at, 2, view.last_message_at, None)]
+    assert [(m.id, m.text) for m in view.messages] == [(first.id, first.text), (first.id + 1, "second")]
+    assert view.messages[0].html == first.html and view.messages[1].interrupted is False
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_keeps_batch_when_flush_fails(tmp_path):
+    engine, async_session, owner, other, conv = await _setup(tmp_path)
+    calls = []
+
+    def flaky_session():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return async_session()
+
+    writer = WriteBehindQueue(session_factory=flaky_session)
+    writer.add_message(conv.id, "bob", "first")
+    with pytest.raises(RuntimeError):
+        await writer.flush()
+    writer.add_message(conv.id, "bob", "second")
+    assert await writer.flush() == 2
+
+    async with async_session() as session:
+        texts = (await session.execute(select(Message.text).order_by(Message.id))).scalars().all()
+        assert texts == ["first", "second"]
+        count = (await session.execute(select(Conversation.message_count))).scalar_one()
+        assert count == 2
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_stored_reply_is_replayed_not_generated(tmp_path, monkeypatch):
+    engine, async_session, owner, other, conv = await _setup(tmp_path)
+    monkeypatch.setattr(middleware, "get_agent", lambda name: pytest.fail("agent must not run again"))
+    monkeypatch.setattr(middleware, "stream_broker", StreamBroker(linger=0))
+    async with async_session() as session:
+        question = await add_user_message(session, owner.id, conv.id, "question")
+        assert await load_reply(session, owner.id, conv.id, question.id) is None
+        session.add(
+            Message(
+                conversation_id=conv.id,
+                sender="bob",
+                text="answer [[component:emoji name=ok]]",
+                reply_to_id=question.id,
+            )
+        )
+        await session.commit()
+        assert await load_reply(session, other.id, conv.id, question.id) is None
+
+        events = [e async for e in middleware.stream_agent_response(session, owner, conv.id, question.id, "default")]
+    assert events[0].startswith("event: reset\nid: 1\ndata: answer <img")
+    assert events[1:] == ["data: [DONE]\n\n"]
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_replies_are_found_for_interleaved_turns(tmp_path):
+    engine, async_session, owner, other, conv = await _setup(tmp_path)
+    writer = WriteBehindQueue(session_factory=async_session)
+    async with async_session() as session:
+        first = await add_user_message(session, owner.id, conv.id, "first")
+        second = await add_user_message(session, owner.id, conv.id, "second")
+        # the second turn finishes before the first one
+        writer.add_message(conv.id, "bob", "to second", reply_to_id=second.id)
+        writer.add_message(conv.id, "bob", "to first", reply_to_id=first.id)
+        await writer.flush()
+        third = await add_user_message(session, owner.id, conv.id, "third")
+
+        assert await load_reply(session, owner.id, conv.id, first.id) == "to first"
+        assert await load_reply(session, owner.id, conv.id, second.id) == "to second"
+        assert await load_reply(session, owner.id, conv.id, third.id) is None
+    await engine.dispose()
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from bob.agents import BaseAgent
+from bob.conversations import middleware
+from bob.conversations.broker import StreamBroker
+from bob.conversations.prefetch import PromptPrefetcher
+from bob.conversations.streaming import StreamLimiter, format_sse, relay
+from bob.models import User
+
+
+class SlowAgent(BaseAgent):
+    def __init__(self):
+        self.produced = 0
+        self.closed = False
+
+    async def stream(self, messages):
+        try:
+            for i in range(1000):
+                self.produced += 1
+                yield f"t{i} "
+                await asyncio.sleep(0.001)
+        finally:
+            self.closed = True
+
+
+def test_format_sse_splits_lines():
+    assert format_sse("a\nb") == "data: a\ndata: b\n\n"
+    assert format_sse("x", event="notice") == "event: notice\ndata: x\n\n"
+    assert format_sse("x", event="component", event_id=7) == "event: component\nid: 7\ndata: x\n\n"
+
+
+@pytest.mark.asyncio
+async def test_relay_applies_backpressure():
+    agent = SlowAgent()
+    tokens = relay(agent.stream([]), maxsize=4)
+    assert await tokens.__anext__() == "t0 "
+    await asyncio.sleep(0.05)
+    # one chunk taken, four queued, one waiting to be put
+    assert agent.produced <= 6
+    await tokens.aclose()
+    await asyncio.sleep(0.01)
+    assert agent.closed
+
+
+@pytest.fixture
+def stream_env(monkeypatch):
+    agent = SlowAgent()
+    saved = []
+
+    async def fake_prepare(db, user_id, conv_id, user_msg_id, agent_name):
+        return [{"role": "user", "content": "hi"}]
+
+    async def fake_save_reply(conv_id, reply_to_id, text, interrupted=False):
+        saved.append((text, interrupted))
+
+    async def fake_load_reply(db, user_id, conv_id, user_msg_id):
+        return None
+
+    monkeypatch.setattr(middleware, "get_agent", lambda name: agent)
+    monkeypatch.setattr(middleware, "prepare_reply", fake_prepare)
+    monkeypatch.setattr(middleware, "load_reply", fake_load_reply)
+    monkeypatch.setattr(middleware, "save_reply", fake_save_reply)
+    monkeypatch.setattr(middleware, "prefetcher", PromptPrefetcher(ttl=0))
+    monkeypatch.setattr(middleware, "stream_limiter", StreamLimiter(1))
+    monkeypatch.setattr(middleware, "stream_broker", StreamBroker(linger=0))
+    return agent, saved
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_upstream_and_saves_partial(stream_env):
+    agent, saved = stream_env
+    user = User(id=1)
+    events = middleware.stream_agent_response(None, user, 1, 1, "default")
+    assert await events.__anext__() == "id: 1\ndata: t0 \n\n"
+    assert await events.__anext__() == "id: 2\ndata: t1 \n\n"
+    await events.aclose()  # what the server does when the client goes away
+    await asyncio.sleep(0.01)
+
+    assert agent.closed
+    assert agent.produced < 1000
+    # the reply is generated independently of how fast the client reads
+    [(text, interrupted)] = saved
+    assert text.startswith("t0 t1 ") and interrupted
+    assert middleware.stream_limiter.active(user.id) == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_stream_limit(stream_env):
+    user = User(id=2)
+    first = middleware.stream_agent_response(None, user, 1, 1, "default")
+    await first.__anext__()
+    second = [e async for e in middleware.stream_agent_response(None, user, 1, 2, "default")]
+    assert second[0].startswith("event: notice\n")
+    assert second[-1] == "data: [DONE]\n\n"
+    await first.aclose()
+    await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_components_are_streamed_as_separate_events(stream_env, monkeypatch):
+    class TokenAgent(BaseAgent):
+        async def stream(self, messages):
+            for chunk in ["Nice [[compo", "nent:emoji name=ok", "]]!"]:
+                yield chunk
+
+    _, saved = stream_env
+    monkeypatch.setattr(middleware, "get_agent", lambda name: TokenAgent())
+    events = [e async for e in middleware.stream_agent_response(None, User(id=3), 1, 1, "default")]
+    assert events[0] == "id: 1\ndata: Nice \n\n"
+    assert events[1].startswith("event: component\nid: 2\ndata: <img")
+    assert events[2:] == ["id: 3\ndata: !\n\n", "data: [DONE]\n\n"]
+    # the stored reply keeps the token; it is expanded again when the page loads
+    assert saved == [("Nice [[component:emoji name=ok]]!", False)]
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bob.models import StatusEnum
+from bob.tasks import CHUNK_THRESHOLD, LaneScheduler, next_run, pack_result, unpack_result
+from bob.tasks.sqlite_manager import SingletonTasksManager, SQLiteTask, SQLiteTaskResult
+
+
+@pytest_asyncio.fixture
+async def manager(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+    yield SingletonTasksManager(engine, ttl=60, pending_ttl=3600)
+    await engine.dispose()
+
+
+async def count(manager, model):
+    async with manager.session() as session:
+        return (await session.execute(select(func.count()).select_from(model))).scalar()
+
+
+def test_pack_result_chunks_large_results(monkeypatch):
+    assert pack_result({"a": 1}) == ('{"a": 1}', [])
+    monkeypatch.setattr("bob.tasks.CHUNK_SIZE", 16)
+    big = {"text": "x" * CHUNK_THRESHOLD, "n": list(range(2000))}
+    inline, chunks = pack_result(big)
+    assert inline is None and len(chunks) > 1
+    assert unpack_result(chunks) == big
+
+
+@pytest.mark.asyncio
+async def test_large_result_is_fetched_lazily(manager):
+    job = await manager.enqueue({"q": "big"})
+    big = ["y" * 100] * (CHUNK_THRESHOLD // 50)
+    assert await manager.complete(job.job_id, big)
+
+    summary = await manager.status(job.job_id, fetch_result=False)
+    assert summary.status is StatusEnum.SUCCESS and summary.chunked and summary.result is None
+    assert await manager.fetch_result(job.job_id) == big
+    assert (await manager.status(job.job_id)).result == big
+    assert not await manager.complete("missing", 1)
+
+
+@pytest.mark.asyncio
+async def test_gc_keeps_storage_bounded(manager):
+    ids = [(await manager.enqueue({"n": i})).job_id for i in range(2000)]
+    big = "z" * (CHUNK_THRESHOLD + 1)
+    for i, job_id in enumerate(ids[:1500]):
+        if i % 100 == 0:
+            await manager.complete(job_id, big)
+        elif i % 7 == 0:
+            await manager.fail(job_id, "boom")
+        else:
+            await manager.complete(job_id, {"n": i})
+    assert await count(manager, SQLiteTaskResult) == 15
+
+    # nothing has expired yet
+    assert await manager.gc() == 0
+    assert (await manager.status(ids[0])).result == big
+
+    # finished jobs expire after ttl, pending ones only after pending_ttl
+    assert await manager.gc(now=datetime.utcnow() + timedelta(seconds=120)) == 1500
+    assert await count(manager, SQLiteTask) == 500
+    assert await count(manager, SQLiteTaskResult) == 0
+    assert (await manager.status(ids[-1])).status is StatusEnum.PENDING
+
+    assert await manager.gc(now=datetime.utcnow() + timedelta(hours=2)) == 500
+    assert await count(manager, SQLiteTask) == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_jobs_are_not_found(manager):
+    manager.ttl = 0.001
+    job = await manager.enqueue({}, ttl=-1)
+    await manager.complete(job.job_id, "kept")
+    other = await manager.enqueue({})
+    await manager.complete(other.job_id, "gone")
+    assert (await manager.status(job.job_id)).result == "kept"
+    assert (await manager.status(other.job_id)).error == "Job not found"
+
+
+def test_lane_scheduler_shares_claims_by_weight():
+    scheduler = LaneScheduler()
+    firsts = [scheduler.order()[0] for _ in range(100)]
+    assert {lane: firsts.count(lane) for lane in ("high", "default", "low")} == {"high": 60, "default": 30, "low": 10}
+    # the low lane never waits more than a round of ten claims
+    lows = [n for n, lane in enumerate(firsts) if lane == "low"]
+    assert lows[0] < 10 and max(b - a for a, b in zip(lows, lows[1:])) == 10
+    assert scheduler.order()[1:] in (["default", "low"], ["high", "low"], ["high", "default"])
+
+
+def test_next_run_skips_missed_occurrences():
+    start = datetime(2025, 1, 1)
+    assert next_run(start, 60, now=start) == start + timedelta(seconds=60)
+    assert next_run(start, 60, now=start + timedelta(seconds=150)) == start + timedelta(seconds=180)
+
+
+@pytest.mark.asyncio
+async def test_claim_prefers_high_lane_without_starving_low(manager):
+    for i in range(20):
+        await manager.enqueue({"bulk": i}, lane="low")
+        await manager.enqueue({"title": i}, lane="high")
+    assert await manager.depth() == 40
+    lanes = [(await manager.claim()).lane for _ in range(20)]
+    assert await manager.depth() == 20
+    assert lanes.count("high") > lanes.count("low") >= 2
+    job = await manager.claim()
+    assert (await manager.status(job.job_id)).status is StatusEnum.RUNNING
+    while await manager.claim():
+        pass
+    assert await manager.claim() is None
+
+
+@pytest.mark.asyncio
+async def test_delayed_jobs_wait_until_due(manager):
+    later = await manager.enqueue({"n": 1}, delay=3600)
+    due = await manager.enqueue({"n": 2}, run_at=datetime.utcnow() - timedelta(seconds=1))
+    assert (await manager.claim()).job_id == due.job_id
+    assert await manager.claim() is None
+    assert (await manager.status(later.job_id)).status is StatusEnum.PENDING
+    with pytest.raises(ValueError):
+        await manager.enqueue({}, lane="urgent")
+
+
+@pytest.mark.asyncio
+async def test_dedupe_key_and_recurring_schedule(manager):
+    first = await manager.enqueue({"doc": 1}, dedupe_key="ingest:1")
+    assert (await manager.enqueue({"doc": 1}, dedupe_key="ingest:1")).job_id == first.job_id
+    assert (await manager.claim()).job_id == first.job_id
+    # once claimed, the key is free again
+    assert (await manager.enqueue({"doc": 1}, dedupe_key="ingest:1")).job_id != first.job_id
+
+    start = datetime.utcnow() - timedelta(seconds=1)
+    nightly = await manager.schedule("compact", {"task": "compact"}, every=60, start=start)
+    assert (await manager.schedule("compact", {"task": "compact"}, every=60)).job_id == nightly.job_id
+    claimed = [await manager.claim() for _ in range(3)]
+    assert nightly.job_id in {job.job_id for job in claimed if job}
+    async with manager.session() as session:
+        rows = (await session.execute(select(SQLiteTask).where(SQLiteTask.dedupe_key == "schedule:compact"))).scalars()
+        upcoming = [row for row in rows if row.status == StatusEnum.PENDING.value]
+    assert len(upcoming) == 1 and upcoming[0].run_at == start + timedelta(seconds=60)
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from bob.models import StatusEnum
+from bob.tasks import CHUNK_THRESHOLD
+from bob.tasks.redis_manager import RedisTasksManager
+
+
+@pytest_asyncio.fixture
+async def manager():
+    redis = fakeredis.FakeAsyncRedis()
+    yield RedisTasksManager(redis, ttl=60, pending_ttl=3600)
+    await redis.flushall()
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_jobs_expire_and_large_results_are_chunked(manager):
+    job = await manager.enqueue({"q": "big"})
+    assert 0 < await manager.redis.ttl(f"jobs:{job.job_id}") <= 3600
+    claimed = await manager.claim()
+    assert claimed.job_id == job.job_id and claimed.payload == {"q": "big"}
+    assert (await manager.status(job.job_id)).status is StatusEnum.RUNNING
+
+    big = ["y" * 100] * (CHUNK_THRESHOLD // 50)
+    assert await manager.complete(job.job_id, big)
+    assert 0 < await manager.redis.ttl(f"jobs:{job.job_id}") <= 60
+    assert 0 < await manager.redis.ttl(f"jobs:{job.job_id}:chunks") <= 60
+    summary = await manager.status(job.job_id, fetch_result=False)
+    assert summary.status is StatusEnum.SUCCESS and summary.chunked and summary.result is None
+    assert (await manager.status(job.job_id)).result == big
+
+    kept = await manager.enqueue({}, ttl=-1)
+    assert (await manager.claim()).job_id == kept.job_id
+    await manager.fail(kept.job_id, "boom")
+    assert await manager.redis.ttl(f"jobs:{kept.job_id}") == -1
+    assert (await manager.status(kept.job_id)).error == "boom"
+    assert not await manager.complete("missing", 1)
+
+    # gc upgrades keys written before expiries and lanes existed
+    await manager.redis.hset("jobs:legacy", mapping={"status": "SUCCESS"})
+    await manager.redis.hset("jobs:old", mapping={"status": "PENDING"})
+    await manager.redis.lpush("tasks_queue", '{"job_id": "old", "payload": {"n": 0}}')
+    assert await manager.gc() == 3
+    assert 0 < await manager.redis.ttl("jobs:legacy") <= 60
+    assert await manager.redis.ttl(f"jobs:{kept.job_id}") == -1
+    assert not await manager.redis.exists("tasks_queue")
+    assert (await manager.claim()).payload == {"n": 0}
+
+
+@pytest.mark.asyncio
+async def test_claim_skips_ids_whose_job_expired(manager):
+    stale = await manager.enqueue({"n": 1})
+    live = await manager.enqueue({"n": 2})
+    await manager.redis.delete(f"jobs:{stale.job_id}")
+
+    job = await manager.claim()
+    assert job.job_id == live.job_id and job.payload == {"n": 2}
+    assert not await manager.redis.exists(f"jobs:{stale.job_id}")
+    assert await manager.claim() is None
+
+
+@pytest.mark.asyncio
+async def test_lanes_delays_dedupe_and_schedules(manager):
+    for i in range(20):
+        await manager.enqueue({"bulk": i}, lane="low")
+        await manager.enqueue({"title": i}, lane="high")
+    assert await manager.depth() == 40
+    lanes = [(await manager.claim()).lane for _ in range(20)]
+    assert await manager.depth() == 20
+    assert lanes.count("high") > lanes.count("low") >= 2
+    while await manager.claim():
+        pass
+    with pytest.raises(ValueError):
+        await manager.enqueue({}, lane="urgent")
+
+    later = await manager.enqueue({"n": 1}, delay=3600)
+    assert await manager.claim() is None
+    assert (await manager.status(later.job_id)).status is StatusEnum.PENDING
+
+    first = await manager.enqueue({"doc": 1}, dedupe_key="ingest:1")
+    assert (await manager.enqueue({"doc": 1}, dedupe_key="ingest:1")).job_id == first.job_id
+    assert (await manager.claim()).job_id == first.job_id
+    assert (await manager.enqueue({"doc": 1}, dedupe_key="ingest:1")).job_id != first.job_id
+    await manager.claim()
+
+    start = datetime.utcnow() - timedelta(seconds=1)
+    nightly = await manager.schedule("compact", {"task": "compact"}, every=60, start=start)
+    assert (await manager.schedule("compact", {"task": "compact"}, every=60)).job_id == nightly.job_id
+    assert (await manager.claim()).job_id == nightly.job_id
+    upcoming = await manager.redis.zrange("tasks:low", 0, -1, withscores=True)
+    assert len(upcoming) == 1 and upcoming[0][0].decode() != nightly.job_id
+    assert await manager.claim() is None
@@ -0,0 +1,102 @@
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from bob.cache import TieredCache
+from bob.conversations import transfer
+from bob.conversations.archive import archive_idle
+from bob.conversations.transfer import export_conversations, import_conversations, open_ndjson
+from bob.fragments import FragmentCache
+from bob.migrations import upgrade_database
+from bob.models import User, Conversation, Message
+
+
+async def _engine(tmp_path, name):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}")
+    await upgrade_database(engine)
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_export_import_roundtrip(tmp_path):
+    source = await _engine(tmp_path, "source.db")
+    async_session = sessionmaker(bind=source, class_=AsyncSession, expire_on_commit=False)
+    start = datetime(2025, 1, 1)
+    async with async_session() as session:
+        alice = User(name="Alice", username="alice", password="pw")
+        bob = User(name="Bob", username="bob", password="pw")
+        session.add_all([alice, bob])
+        await session.flush()
+        for i, owner in enumerate([alice, alice, bob]):
+            conv = Conversation(title=f"c{i}", user_id=owner.id, created_at=start + timedelta(days=i))
+            session.add(conv)
+            await session.flush()
+            session.add_all(
+                Message(conversation_id=conv.id, sender="user", text=f"c{i} m{j} ✓", created_at=start + timedelta(days=i, seconds=j))
+                for j in range(5)
+            )
+        await session.commit()
+        # archived conversations are exported from their blobs
+        await archive_idle(session, older_than_days=1, limit=1)
+
+    out = io.StringIO()
+    assert await export_conversations(source, out, page_size=2) == (3, 15)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["type"] for r in records[:6]] == ["conversation"] + ["message"] * 5
+
+    filtered = io.StringIO()
+    assert await export_conversations(source, filtered, username="alice", since=start + timedelta(days=1)) == (1, 5)
+
+    path = str(tmp_path / "export.ndjson.gz")
+    with open_ndjson(path, "w") as fh:
+        fh.write(out.getvalue())
+    target = await _engine(tmp_path, "target.db")
+    with open_ndjson(path, "r") as fh:
+        assert await import_conversations(target, fh, batch_size=4) == (3, 15)
+
+    async with target.connect() as conn:
+        rows = (
+            await conn.execute(
+                select(User.username, Conversation.title, Conversation.message_count)
+                .join(User, User.id == Conversation.user_id)
+                .order_by(Conversation.id)
+            )
+        ).all()
+        texts = (await conn.execute(select(Message.text).order_by(Message.id))).scalars().all()
+    assert rows == [("alice", "c0", 5), ("alice", "c1", 5), ("bob", "c2", 5)]
+    assert texts[0] == "c0 m0 ✓" and len(texts) == 15
+    await source.dispose()
+    await target.dispose()
+
+
+@pytest.mark.asyncio
+async def test_import_maps_ids_into_populated_database(tmp_path, monkeypatch):
+    target = await _engine(tmp_path, "target.db")
+    async_session = sessionmaker(bind=target, class_=AsyncSession, expire_on_commit=False)
+    async with async_session() as session:
+        carol = User(name="Carol", username="carol", password="pw")
+        session.add(carol)
+        await session.flush()
+        session.add(Conversation(id=1, title="existing", user_id=carol.id))
+        await session.commit()
+
+    sidebars = FragmentCache(TieredCache())
+    monkeypatch.setattr(transfer, "fragments", sidebars)
+    await sidebars.put(carol.id, "sidebar", "<li>existing</li>")
+
+    lines = [json.dumps({"type": "conversation", "id": 1, "user": "carol", "title": "imported"})]
+    lines += [
+        json.dumps({"type": "message", "conversation": 1, "sender": "user", "text": f"m{i}"}) for i in range(500)
+    ]
+    assert await import_conversations(target, io.StringIO("\n".join(lines))) == (1, 500)
+
+    async with target.connect() as conn:
+        rows = (await conn.execute(select(Conversation.title, Conversation.message_count).order_by(Conversation.id))).all()
+    assert rows == [("existing", 0), ("imported", 500)]
+    assert await sidebars.get(carol.id, "sidebar") is None
+    await target.dispose()
@@ -0,0 +1,74 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from typer.testing import CliRunner
+
+from bobbing import cli
+from bobbing.bench import BenchQuery, load_queries, percentile, run_bench
+
+
+class KeywordStore:
+    """Returns the documents whose text shares a word with the query."""
+
+    def __init__(self, docs, latency=0.01):
+        self.docs = docs
+        self.latency = latency
+
+    def similarity_search(self, query, k=4):
+        time.sleep(self.latency)
+        words = set(query.lower().split())
+        hits = [doc for doc in self.docs if words & set(doc.page_content.lower().split())]
+        return hits[:k]
+
+
+DOCS = [
+    SimpleNamespace(page_content="reset your password", metadata={"source": "docs/account.pdf"}),
+    SimpleNamespace(page_content="billing and invoices", metadata={"source": "docs/billing.docx"}),
+    SimpleNamespace(page_content="password rules", metadata={"source": "docs/security.md"}),
+]
+
+
+@pytest.mark.asyncio
+async def test_recall_and_latency():
+    queries = [
+        BenchQuery("password reset", ["account.pdf", "security.md"]),
+        BenchQuery("invoices", ["docs/billing.docx"]),
+        BenchQuery("refunds", ["docs/billing.docx"]),
+        BenchQuery("no expectations"),
+    ]
+    result = await run_bench(KeywordStore(DOCS, latency=0.02), queries, k=1, concurrency=4)
+    serial = await run_bench(KeywordStore(DOCS, latency=0.02), queries, k=1, concurrency=1)
+    # 0.5 + 1 + 0 over the three queries with expectations
+    assert result["recall_at_k"] == 0.5
+    assert result["recall_queries"] == 3
+    assert result["queries"] == 4 and result["errors"] == 0
+    assert result["latency_ms"]["p50"] >= 20
+    # four queries in parallel take about one query's time, not four
+    assert result["duration_s"] < serial["duration_s"] / 2
+
+
+def test_percentile_is_nearest_rank():
+    samples = list(range(1, 101))
+    assert [percentile(samples, p) for p in (50, 95, 99, 100)] == [50, 95, 99, 100]
+    assert percentile([4, 1, 3, 2], 50) == 2
+    assert percentile([], 50) == 0.0
+
+
+def test_bench_command_writes_json(tmp_path, monkeypatch):
+    query_file = tmp_path / "queries.jsonl"
+    query_file.write_text('{"query": "billing", "expected": ["billing.docx"]}\n"password"\n')
+    assert [q.query for q in load_queries(query_file)] == ["billing", "password"]
+    monkeypatch.setattr(cli, "_init_store", lambda cfg: KeywordStore(DOCS, latency=0))
+
+    out = tmp_path / "result.json"
+    res = CliRunner().invoke(
+        cli.app, ["vectordb", "bench", str(query_file), "--k", "2", "--repeat", "3", "-o", str(out), "--label", "k2"]
+    )
+    assert res.exit_code == 0, res.output
+    result = json.loads(out.read_text())
+    assert result["label"] == "k2"
+    assert result["queries"] == 6
+    assert result["recall_at_k"] == 1.0
+    assert "recall@2 1.0" in res.output
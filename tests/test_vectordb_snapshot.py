@@ -0,0 +1,88 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from bobbing.snapshot import compact_collection, export_snapshot, import_snapshot, read_snapshot_info
+
+
+class FakeCollection:
+    """The subset of the Chroma collection API used by snapshots."""
+
+    def __init__(self, name="kb", metadata=None):
+        self.name = name
+        self.metadata = metadata
+        self.rows = {}
+        self.writes = []
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        self.writes.append(len(ids))
+        for i, id_ in enumerate(ids):
+            self.rows[id_] = (embeddings[i], documents[i], metadatas[i] if metadatas else None)
+
+    def get(self, include, limit, offset):
+        ids = sorted(self.rows)[offset : offset + limit]
+        return {
+            "ids": ids,
+            "embeddings": [self.rows[i][0] for i in ids],
+            "documents": [self.rows[i][1] for i in ids],
+            "metadatas": [self.rows[i][2] for i in ids],
+        }
+
+    def delete(self, ids):
+        for id_ in ids:
+            del self.rows[id_]
+
+
+class FakeClient:
+    def __init__(self, collection):
+        self.collections = {collection.name: collection}
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+    def create_collection(self, name, metadata=None):
+        self.collections[name] = FakeCollection(name, metadata)
+        return self.collections[name]
+
+
+def filled(n=10):
+    coll = FakeCollection(metadata={"hnsw:space": "cosine"})
+    coll.upsert(
+        ids=[f"id{i}" for i in range(n)],
+        embeddings=[[i / 4, 1.0, -0.5] for i in range(n)],
+        documents=[f"dokument ünïcode {i}" for i in range(n)],
+        metadatas=[{"source": f"f{i}.pdf", "page": i} for i in range(n)],
+    )
+    # entries without metadata, in a separate batch like Chroma requires
+    coll.upsert(ids=["bare"], embeddings=[[0.0, 0.0, 1.0]], documents=["no metadata"])
+    return coll
+
+
+def test_round_trip_without_re_embedding(tmp_path):
+    source = filled()
+    path = tmp_path / "kb.npz"
+    assert export_snapshot(source, path, page_size=3) == 11
+    assert read_snapshot_info(path) == {
+        "version": 1, "name": "kb", "metadata": {"hnsw:space": "cosine"}, "count": 11
+    }
+
+    target = FakeCollection()
+    assert import_snapshot(target, path, batch_size=4) == 11
+    assert target.rows.keys() == source.rows.keys()
+    for key, (emb, doc, meta) in source.rows.items():
+        assert np.allclose(target.rows[key][0], emb)
+        assert target.rows[key][1:] == (doc, meta)
+    assert max(target.writes) <= 4
+
+
+def test_compact_rebuilds_from_live_entries(tmp_path):
+    coll = filled()
+    coll.delete(["id1", "id2"])
+    client = FakeClient(coll)
+    keep = tmp_path / "compact.npz"
+    fresh, count = compact_collection(client, coll, keep)
+    assert count == 9
+    assert fresh is client.collections["kb"] and fresh is not coll
+    assert fresh.metadata == {"hnsw:space": "cosine"}
+    assert sorted(fresh.rows) == sorted(coll.rows)
+    assert keep.exists()
@@ -0,0 +1,93 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from bob import vectorstores, web
+from bob.settings import Settings
+from bob.vectorstores import VectorStorePool
+
+
+class DummyProvider:
+    def __init__(self, data):
+        self.data = data
+
+    def load(self, path):
+        return self.data
+
+
+class FakeCollection:
+    def __init__(self, count):
+        self._count = count
+
+    def count(self):
+        return self._count
+
+
+class FakeStore:
+    def __init__(self, path, embeddings):
+        self.path = path
+        self.embeddings = embeddings
+        self.queries = []
+        self._collection = FakeCollection(0 if "empty" in path else 3)
+
+    def similarity_search(self, query, k=4):
+        if "broken" in self.path:
+            raise RuntimeError("index is corrupt")
+        self.queries.append(query)
+        return []
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = VectorStorePool()
+    monkeypatch.setitem(vectorstores.STORES, "Fake", FakeStore)
+    monkeypatch.setitem(vectorstores.EMBEDDINGS, "fake", lambda api_key: object())
+    monkeypatch.setattr(vectorstores, "vector_stores", pool)
+    return pool
+
+
+def test_agents_with_same_path_share_store_and_embedder(pool):
+    fake = {"vector_db_type": "Fake", "vector_db_embedding": "fake"}
+    data = {
+        "agents": {
+            "bob": {**fake, "vector_db_path": "db/kb"},
+            "tutor": {**fake, "vector_db_path": "./db/kb"},
+            "other": {**fake, "vector_db_path": "db/other"},
+            "plain": {},
+        }
+    }
+    s = Settings(provider=DummyProvider(data), path="dummy")
+    bob, tutor, other = (s.get_vector_db(name) for name in ("bob", "tutor", "other"))
+    assert bob is tutor
+    assert other is not bob
+    assert other.embeddings is bob.embeddings
+    assert s.get_vector_db("plain") is None
+    assert s.get_embedder("bob") is s.get_embedder("other") is not None
+    assert s.get_embedder("plain") is None
+    assert pool.get("Unknown", "db/kb") is None
+
+
+@pytest.mark.asyncio
+async def test_warm_up_queries_each_store_once(pool):
+    kb = pool.get("Fake", "db/kb", "fake")
+    empty = pool.get("Fake", "db/empty", "fake")
+    pool.get("Fake", "db/broken", "fake")
+    assert not pool.warmed
+    await pool.warm_up()
+
+    assert pool.warmed
+    assert kb.queries == ["warm-up"]
+    assert empty.queries == []
+    states = {entry["path"].rsplit("/", 1)[-1]: entry for entry in pool.status()}
+    assert states["kb"]["state"] == "ready" and states["kb"]["documents"] == 3
+    assert states["empty"]["state"] == "ready"
+    assert states["broken"]["state"] == "failed"
+
+
+def test_ready_endpoint(monkeypatch, pool):
+    monkeypatch.setattr(web, "vector_stores", pool)
+    client = TestClient(web.app)
+    assert client.get("/ready").status_code == 503
+    pool.warmed = True
+    resp = client.get("/ready")
+    assert resp.status_code == 200
+    assert resp.json() == {"ready": True, "vector_stores": []}